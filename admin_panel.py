@@ -1,199 +1,491 @@
 import sys
-import sqlite3
+import threading
 from PyQt6.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, 
                              QHBoxLayout, QListWidget, QPushButton, QLineEdit, 
                              QMessageBox, QTabWidget, QLabel, QFrame, QListWidgetItem,
-                             QDialog, QDialogButtonBox, QComboBox)
-from PyQt6.QtCore import Qt, pyqtSignal
-from PyQt6.QtGui import QFont, QIcon, QPixmap
+                             QDialog, QDialogButtonBox, QComboBox, QListView,
+                             QStyledItemDelegate, QStyle)
+from PyQt6.QtCore import (Qt, pyqtSignal, QAbstractListModel, QModelIndex, QRect, QSize, QEvent,
+                          QObject, QRunnable, QThreadPool, QTimer)
+from PyQt6.QtGui import QFont, QIcon, QPixmap, QColor, QPen, QFontMetrics, QShortcut, QKeySequence
 
-DB_NAME = "tasks_bot.db"
+import storage
 
 class DatabaseManager:
     """Класс для работы с базой данных"""
     
     def __init__(self):
+        # seq журнала изменений, записанные самой панелью: окно применяет их сразу, перечитывать не нужно
+        self.own_seqs = set()
+        self._own_lock = threading.Lock()
         self.init_db()
     
     def init_db(self):
         """Инициализация базы данных"""
-        conn = sqlite3.connect(DB_NAME)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS users (
-                user_id INTEGER PRIMARY KEY,
-                username TEXT,
-                first_name TEXT,
-                last_name TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS tasks (
-                task_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER,
-                task_text TEXT NOT NULL,
-                is_done BOOLEAN DEFAULT FALSE,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (user_id) REFERENCES users (user_id)
-            )
-        ''')
-        
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS admins (
-                user_id INTEGER PRIMARY KEY,
-                added_by INTEGER,
-                added_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (user_id) REFERENCES users (user_id)
-            )
-        ''')
-        
-        conn.commit()
-        conn.close()
+        storage.init_db()
     
     def get_connection(self):
-        return sqlite3.connect(DB_NAME)
+        return storage.get_connection()
     
     def ensure_user_exists(self, user_id, username=None, first_name=None, last_name=None):
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute(
-            'INSERT OR IGNORE INTO users (user_id, username, first_name, last_name) VALUES (?, ?, ?, ?)',
-            (user_id, username, first_name, last_name)
-        )
-        conn.commit()
-        conn.close()
+        storage.ensure_user_exists(user_id, username, first_name, last_name)
     
     def get_user_tasks(self, user_id):
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute(
-            'SELECT task_id, task_text, is_done FROM tasks WHERE user_id = ? ORDER BY created_at DESC',
-            (user_id,)
-        )
-        tasks = cursor.fetchall()
-        conn.close()
-        return [{"id": task[0], "text": task[1], "done": bool(task[2])} for task in tasks]
+        return storage.get_user_tasks(user_id)
+    
+    def get_user_tasks_page(self, user_id, cursor=None, limit=200):
+        return storage.get_user_tasks_page(user_id, cursor, limit=limit)
+    
+    def get_user_task_counts(self, user_id):
+        return storage.get_user_task_counts(user_id)
+    
+    def get_user_task_stats(self, user_id):
+        return storage.get_user_task_stats(user_id)
+    
+    def write(self, op, *args):
+        """Запись с пометкой своих изменений в журнале"""
+        return storage.write_logged(self._mark_own, op, *args)
+    
+    def _mark_own(self, seqs):
+        with self._own_lock:
+            self.own_seqs.update(seqs)
+    
+    def drop_own_changes(self, changes):
+        """Изменения из журнала без записанных самой панелью"""
+        if not changes:
+            return changes
+        with self._own_lock:
+            foreign = [change for change in changes if change['seq'] not in self.own_seqs]
+            # Журнал читается по порядку seq: свои записи до последней прочитанной больше не встретятся
+            last_seq = changes[-1]['seq']
+            self.own_seqs = {seq for seq in self.own_seqs if seq > last_seq}
+        return foreign
     
     def add_task(self, user_id, task_text):
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute(
-            'INSERT INTO tasks (user_id, task_text) VALUES (?, ?)',
-            (user_id, task_text)
-        )
-        task_id = cursor.lastrowid
-        conn.commit()
-        conn.close()
-        return task_id
+        return self.write(storage.add_user_task, user_id, task_text)
     
     def update_task_status(self, task_id, is_done):
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute(
-            'UPDATE tasks SET is_done = ? WHERE task_id = ?',
-            (is_done, task_id)
-        )
-        conn.commit()
-        conn.close()
+        self.write(storage.update_task_status, task_id, is_done)
     
     def delete_task(self, task_id):
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute('DELETE FROM tasks WHERE task_id = ?', (task_id,))
-        conn.commit()
-        conn.close()
+        self.write(storage.delete_task, task_id)
+    
+    def update_tasks_status(self, task_ids, is_done):
+        self.write(storage.update_tasks_status, task_ids, is_done)
+    
+    def delete_tasks(self, task_ids):
+        self.write(storage.delete_tasks, task_ids)
     
     def get_all_users(self):
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute('SELECT user_id, username, first_name, last_name FROM users')
-        users = cursor.fetchall()
-        conn.close()
-        return [{"id": user[0], "username": user[1], "first_name": user[2], "last_name": user[3]} for user in users]
+        return storage.get_all_users()
     
     def is_admin(self, user_id):
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute('SELECT 1 FROM admins WHERE user_id = ?', (user_id,))
-        result = cursor.fetchone()
-        conn.close()
-        return result is not None
+        return storage.is_admin(user_id)
     
     def add_admin(self, user_id, added_by=None):
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute(
-            'INSERT OR REPLACE INTO admins (user_id, added_by) VALUES (?, ?)',
-            (user_id, added_by)
-        )
-        conn.commit()
-        conn.close()
+        self.write(storage.add_admin, user_id, added_by)
+    
+    def get_users_overview(self):
+        return storage.get_users_overview()
+    
+    def get_tasks_by_ids(self, task_ids):
+        return storage.get_tasks_by_ids(task_ids)
+    
+    def search_user_tasks(self, user_id, query, offset=0, limit=200):
+        return storage.search_user_tasks(user_id, query, offset, limit=limit)
+    
+    def compact_changes(self, retention_seconds):
+        return storage.compact_changes(retention_seconds)
+
+
+class DbJob(QRunnable):
+    """Один вызов DatabaseManager в потоке пула"""
+    
+    def __init__(self, executor, key, generation, fn, args):
+        super().__init__()
+        self.executor = executor
+        self.key = key
+        self.generation = generation
+        self.fn = fn
+        self.args = args
+    
+    def run(self):
+        # Запрос, который успели заменить более новым, не выполняем вовсе
+        if not self.executor.is_current(self.key, self.generation):
+            self.executor.finished.emit(self.key, self.generation, None, None)
+            return
+        result, error = None, None
+        try:
+            result = self.fn(*self.args)
+        except Exception as e:
+            error = e
+        self.executor.finished.emit(self.key, self.generation, result, error)
+
+
+class DbExecutor(QObject):
+    """Выполнение запросов к БД вне GUI-потока, результаты приходят в GUI-поток через сигнал
+    
+    submit(key, ...) — чтение. По каждому ключу выполняется не больше одного
+    запроса, повторные вызовы до его окончания схлопываются в один следующий,
+    а результат устаревшего запроса (ключ успели запросить заново) отбрасывается.
+    write(...) — запись: выполняются строго по очереди в отдельном потоке.
+    """
+    
+    finished = pyqtSignal(object, int, object, object)  # key, generation, result, error
+    
+    def __init__(self, on_error=None, read_threads=2, parent=None):
+        super().__init__(parent)
+        self.on_error = on_error
+        self.read_pool = QThreadPool(self)
+        self.read_pool.setMaxThreadCount(read_threads)
+        self.write_pool = QThreadPool(self)
+        self.write_pool.setMaxThreadCount(1)
+        # Потоки не завершаются по простою: у каждого свое долгоживущее соединение SQLite
+        self.read_pool.setExpiryTimeout(-1)
+        self.write_pool.setExpiryTimeout(-1)
+        self._generations = {}
+        self._running = set()
+        self._pending = {}  # {key: (fn, args)} следующий запрос после текущего
+        self._callbacks = {}  # {(key, generation): (on_result, on_error)}
+        self._write_seq = 0
+        self.coalesced = 0
+        self.dropped = 0
+        self.finished.connect(self._on_finished)
+    
+    def is_current(self, key, generation):
+        return self._generations.get(key) == generation
+    
+    def submit(self, key, fn, *args, on_result=None, on_error=None):
+        generation = self._generations.get(key, 0) + 1
+        self._generations[key] = generation
+        self._callbacks = {k: v for k, v in self._callbacks.items() if k[0] != key}
+        self._callbacks[(key, generation)] = (on_result, on_error)
+        if key in self._running:
+            if key in self._pending:
+                self.coalesced += 1
+            self._pending[key] = (fn, args)
+            return
+        self._start(self.read_pool, key, generation, fn, args)
+    
+    def write(self, fn, *args, on_result=None, on_error=None):
+        self._write_seq += 1
+        key = ("write", self._write_seq)
+        self._generations[key] = 1
+        self._callbacks[(key, 1)] = (on_result, on_error)
+        self._start(self.write_pool, key, 1, fn, args)
+    
+    def _start(self, pool, key, generation, fn, args):
+        self._running.add(key)
+        pool.start(DbJob(self, key, generation, fn, args))
+    
+    def _on_finished(self, key, generation, result, error):
+        self._running.discard(key)
+        callbacks = self._callbacks.pop((key, generation), None)
+        if isinstance(key, tuple):
+            self._generations.pop(key, None)
+        
+        if key in self._pending:
+            fn, args = self._pending.pop(key)
+            self._start(self.read_pool, key, self._generations[key], fn, args)
+        
+        if callbacks is None:
+            self.dropped += 1
+            return
+        on_result, on_error = callbacks
+        if error is not None:
+            handler = on_error or self.on_error
+            if handler:
+                handler(error)
+        elif on_result:
+            on_result(result)
+    
+    def shutdown(self):
+        """Отмена ожидающих запросов и ожидание выполняющихся"""
+        self._pending.clear()
+        self._callbacks.clear()
+        self.read_pool.waitForDone()
+        self.write_pool.waitForDone()
+
+
+def read_changes(seq):
+    """Новые записи журнала изменений; при неполном ответе — и номер, с которого продолжить"""
+    changes, complete = storage.get_changes_since(seq)
+    last_seq = changes[-1]['seq'] if changes else seq
+    if not complete:
+        last_seq = storage.get_last_change_seq()
+    return changes, complete, last_seq
+
+
+def read_task_counters(db, user_ids):
+    """Счетчики задач пользователей: {user_id: {"total", "done", "last_activity"}}"""
+    return {user_id: db.get_user_task_stats(user_id) for user_id in user_ids}
+
+
+class ChangeWatcher(QObject):
+    """Слежение за записями бота и других процессов в общую БД
+    
+    Свой поток раз в INTERVAL_MS проверяет PRAGMA data_version — без чтения
+    таблиц. Только если версия изменилась, из журнала changes читаются записи
+    новее последнего seq. Версия сравнима лишь в пределах одного соединения,
+    поэтому опрос идет не через пул DbExecutor, а в одном потоке со своим
+    соединением; окно получает результаты сигналами и не ждет занятую базу.
+    """
+    
+    changes_arrived = pyqtSignal(list)
+    resync_needed = pyqtSignal()  # журнал очищен раньше, чем его прочитали, — нужно перечитать все
+    failed = pyqtSignal(str)
+    
+    INTERVAL_MS = 500
+    
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.last_seq = None
+        self.data_version = None
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="change-watcher", daemon=True)
+        self._thread.start()
+    
+    def _run(self):
+        while not self._stopped.wait(self.INTERVAL_MS / 1000):
+            try:
+                self.poll()
+            except Exception as e:
+                self.failed.emit(str(e))
+        storage.close_connection()
+    
+    def poll(self):
+        if self.last_seq is None:
+            self.data_version = storage.get_data_version()
+            self.last_seq = storage.get_last_change_seq()
+            return
+        version = storage.get_data_version()
+        if version == self.data_version:
+            return
+        changes, complete, self.last_seq = read_changes(self.last_seq)
+        self.data_version = version
+        if not complete:
+            self.resync_needed.emit()
+        elif changes:
+            self.changes_arrived.emit(changes)
+    
+    def stop(self):
+        self._stopped.set()
+        self._thread.join()
 
 
-class TaskItemWidget(QWidget):
-    """Виджет для отображения отдельной задачи"""
+class TaskListModel(QAbstractListModel):
+    """Задачи пользователя, подгружаемые пачками по мере прокрутки списка
+    
+    С непустым query показываются результаты поиска по релевантности.
+    """
+    
+    TaskIdRole = Qt.ItemDataRole.UserRole
+    DoneRole = Qt.ItemDataRole.UserRole + 1
+    BATCH_SIZE = 200
+    
+    def __init__(self, executor, loader, search_loader, parent=None):
+        super().__init__(parent)
+        self.executor = executor
+        self.loader = loader  # loader(user_id, cursor, limit) -> страница storage.get_user_tasks_page
+        self.search_loader = search_loader  # search_loader(user_id, query, offset, limit)
+        self.user_id = None
+        self.query = ""
+        self._tasks = []
+        self._rows = {}  # {task_id: номер строки}; None — пересчитать при следующем обращении
+        self._next = None
+        self._exhausted = True
+        self._loading = False
+    
+    def set_user(self, user_id, query=""):
+        """Сброс списка и загрузка первой пачки задач пользователя (или результатов поиска)"""
+        self.beginResetModel()
+        self.user_id = user_id
+        self.query = query
+        self._tasks = []
+        self._rows = {}
+        self._next = None
+        self._exhausted = user_id is None
+        self._loading = False
+        self.endResetModel()
+        if self.canFetchMore(QModelIndex()):
+            self.fetchMore(QModelIndex())
+    
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._tasks)
+    
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        task = self._tasks[index.row()]
+        if role in (Qt.ItemDataRole.DisplayRole, Qt.ItemDataRole.ToolTipRole):
+            return task['text']
+        if role == self.TaskIdRole:
+            return task['id']
+        if role == self.DoneRole:
+            return task['done']
+        return None
+    
+    def canFetchMore(self, parent):
+        return not parent.isValid() and not self._exhausted and not self._loading
+    
+    def fetchMore(self, parent):
+        if not self.canFetchMore(parent):
+            return
+        # Ключ общий для всех пачек: при смене пользователя загрузка прежнего отбрасывается
+        self._loading = True
+        if self.query:
+            self.executor.submit("tasks", self.search_loader, self.user_id, self.query, self._next or 0,
+                                 self.BATCH_SIZE, on_result=self._on_page, on_error=self._on_page_error)
+        else:
+            self.executor.submit("tasks", self.loader, self.user_id, self._next, self.BATCH_SIZE,
+                                 on_result=self._on_page, on_error=self._on_page_error)
+    
+    def _on_page(self, page):
+        self._loading = False
+        self._next = page['next']
+        self._exhausted = self._next is None
+        tasks = page['tasks']
+        if tasks:
+            first = len(self._tasks)
+            self.beginInsertRows(QModelIndex(), first, first + len(tasks) - 1)
+            self._tasks.extend(tasks)
+            if self._rows is not None:
+                self._rows.update((task['id'], first + n) for n, task in enumerate(tasks))
+            self.endInsertRows()
+    
+    def _on_page_error(self, error):
+        self._loading = False
+        if self.executor.on_error:
+            self.executor.on_error(error)
+    
+    def _row_of(self, task_id):
+        # Номера строк сдвигаются только при вставке и удалении, иначе поиск — одно обращение к словарю
+        if self._rows is None:
+            self._rows = {task['id']: row for row, task in enumerate(self._tasks)}
+        return self._rows.get(task_id)
+    
+    def get_task(self, task_id):
+        """Загруженная задача по id или None"""
+        row = self._row_of(task_id)
+        return None if row is None else self._tasks[row]
+    
+    def set_done(self, task_id, is_done):
+        """Обновление статуса одной строки без перезагрузки списка"""
+        row = self._row_of(task_id)
+        if row is None:
+            return
+        self._tasks[row]['done'] = is_done
+        index = self.index(row)
+        self.dataChanged.emit(index, index, [self.DoneRole])
+    
+    def set_task(self, task):
+        """Замена текста и статуса загруженной задачи, возвращает False, если ее нет в списке"""
+        row = self._row_of(task['id'])
+        if row is None:
+            return False
+        self._tasks[row].update(text=task['text'], done=task['done'])
+        index = self.index(row)
+        self.dataChanged.emit(index, index)
+        return True
+    
+    def prepend_task(self, task):
+        """Новая задача попадает в начало списка (список отсортирован от новых к старым)"""
+        # Своя запись может прийти и из журнала изменений — вторая копия не нужна.
+        # В результатах поиска порядок задает релевантность, новые задачи туда не вставляются
+        if self.query or self._row_of(task['id']) is not None:
+            return
+        self.beginInsertRows(QModelIndex(), 0, 0)
+        self._tasks.insert(0, task)
+        self._rows = None
+        self.endInsertRows()
+    
+    def remove_task(self, task_id):
+        self.remove_tasks([task_id])
+    
+    def remove_tasks(self, task_ids):
+        """Удаление строк с конца списка, чтобы номера еще не удаленных не сдвигались"""
+        rows = sorted((row for row in map(self._row_of, task_ids) if row is not None), reverse=True)
+        for row in rows:
+            self.beginRemoveRows(QModelIndex(), row, row)
+            del self._tasks[row]
+            self.endRemoveRows()
+        if rows:
+            self._rows = None
+
+
+class TaskItemDelegate(QStyledItemDelegate):
+    """Отрисовка строки задачи: кнопка статуса, текст и кнопка удаления
+    
+    Виджеты на строку не создаются, поэтому память и время загрузки
+    не зависят от длины списка.
+    """
     
     task_toggled = pyqtSignal(int, bool)  # task_id, is_done
     task_deleted = pyqtSignal(int)  # task_id
     
-    def __init__(self, task_id, text, is_done):
-        super().__init__()
-        self.task_id = task_id
-        self.is_done = is_done
-        
-        layout = QHBoxLayout()
-        layout.setContentsMargins(10, 5, 10, 5)
-        
-        # Чекбокс выполнения
-        self.toggle_btn = QPushButton("✓" if is_done else "○")
-        self.toggle_btn.setFixedSize(30, 30)
-        self.toggle_btn.setStyleSheet(
-            f"QPushButton {{ font-size: 16px; border: 2px solid {'#4CAF50' if is_done else '#ccc'}; "
-            f"background-color: {'#E8F5E8' if is_done else 'white'}; }}"
-        )
-        self.toggle_btn.clicked.connect(self.toggle_task)
-        
-        # Текст задачи
-        self.text_label = QLabel(text)
-        self.text_label.setWordWrap(True)
-        self.text_label.setStyleSheet(
-            f"QLabel {{ text-decoration: {'line-through' if is_done else 'none'}; "
-            f"color: {'#888' if is_done else 'black'}; font-size: 14px; }}"
-        )
+    ROW_HEIGHT = 44
+    BUTTON_SIZE = 30
+    MARGIN = 10
+    
+    def _button_rect(self, rect, left):
+        x = rect.left() + self.MARGIN if left else rect.right() - self.MARGIN - self.BUTTON_SIZE
+        y = rect.top() + (rect.height() - self.BUTTON_SIZE) // 2
+        return QRect(x, y, self.BUTTON_SIZE, self.BUTTON_SIZE)
+    
+    def sizeHint(self, option, index):
+        return QSize(option.rect.width(), self.ROW_HEIGHT)
+    
+    def paint(self, painter, option, index):
+        is_done = index.data(TaskListModel.DoneRole)
+        rect = option.rect
+        painter.save()
         
-        # Кнопка удаления
-        delete_btn = QPushButton("🗑")
-        delete_btn.setFixedSize(30, 30)
-        delete_btn.setStyleSheet("QPushButton { font-size: 14px; color: #ff4444; }")
-        delete_btn.clicked.connect(self.delete_task)
+        if option.state & QStyle.StateFlag.State_Selected:
+            painter.fillRect(rect, QColor("#f0f7f0"))
+        painter.setPen(QColor("#eee"))
+        painter.drawLine(rect.bottomLeft(), rect.bottomRight())
         
-        layout.addWidget(self.toggle_btn)
-        layout.addWidget(self.text_label, 1)
-        layout.addWidget(delete_btn)
+        # Кнопка выполнения
+        toggle_rect = self._button_rect(rect, left=True)
+        painter.setPen(QPen(QColor("#4CAF50" if is_done else "#ccc"), 2))
+        painter.setBrush(QColor("#E8F5E8" if is_done else "white"))
+        painter.drawRect(toggle_rect)
+        font = QFont(option.font)
+        font.setPixelSize(16)
+        painter.setFont(font)
+        painter.setPen(QColor("black"))
+        painter.drawText(toggle_rect, Qt.AlignmentFlag.AlignCenter, "✓" if is_done else "○")
         
-        self.setLayout(layout)
-        self.setStyleSheet("QWidget { border: 1px solid #eee; border-radius: 5px; margin: 2px; }")
-    
-    def toggle_task(self):
-        self.is_done = not self.is_done
-        self.toggle_btn.setText("✓" if self.is_done else "○")
-        self.toggle_btn.setStyleSheet(
-            f"QPushButton {{ font-size: 16px; border: 2px solid {'#4CAF50' if self.is_done else '#ccc'}; "
-            f"background-color: {'#E8F5E8' if self.is_done else 'white'}; }}"
-        )
-        self.text_label.setStyleSheet(
-            f"QLabel {{ text-decoration: {'line-through' if self.is_done else 'none'}; "
-            f"color: {'#888' if self.is_done else 'black'}; font-size: 14px; }}"
-        )
-        self.task_toggled.emit(self.task_id, self.is_done)
+        # Текст задачи в одну строку: одинаковая высота строк нужна для виртуализации списка
+        indent = self.MARGIN * 2 + self.BUTTON_SIZE
+        text_rect = rect.adjusted(indent, 0, -indent, 0)
+        font.setPixelSize(14)
+        font.setStrikeOut(is_done)
+        painter.setFont(font)
+        painter.setPen(QColor("#888" if is_done else "black"))
+        text = QFontMetrics(font).elidedText(index.data(), Qt.TextElideMode.ElideRight, text_rect.width())
+        painter.drawText(text_rect, Qt.AlignmentFlag.AlignVCenter | Qt.AlignmentFlag.AlignLeft, text)
+        
+        # Кнопка удаления
+        font.setStrikeOut(False)
+        painter.setFont(font)
+        painter.setPen(QColor("#ff4444"))
+        painter.drawText(self._button_rect(rect, left=False), Qt.AlignmentFlag.AlignCenter, "🗑")
+        
+        painter.restore()
     
-    def delete_task(self):
-        reply = QMessageBox.question(self, "Удаление задачи", "Вы уверены, что хотите удалить эту задачу?")
-        if reply == QMessageBox.StandardButton.Yes:
-            self.task_deleted.emit(self.task_id)
+    def editorEvent(self, event, model, option, index):
+        if event.type() != QEvent.Type.MouseButtonRelease or event.button() != Qt.MouseButton.LeftButton:
+            return False
+        pos = event.position().toPoint()
+        task_id = index.data(TaskListModel.TaskIdRole)
+        if self._button_rect(option.rect, left=True).contains(pos):
+            self.task_toggled.emit(task_id, not index.data(TaskListModel.DoneRole))
+            return True
+        if self._button_rect(option.rect, left=False).contains(pos):
+            self.task_deleted.emit(task_id)
+            return True
+        return False
 
 
 class AddTaskDialog(QDialog):
@@ -257,11 +549,20 @@ class AddAdminDialog(QDialog):
 
 
 class TaskManager(QMainWindow):
+    COMPACT_INTERVAL_MS = 3600 * 1000
+    
     def __init__(self):
         super().__init__()
         self.db = DatabaseManager()
+        self.executor = DbExecutor(on_error=self.on_db_error, parent=self)
         self.current_user_id = 1  # По умолчанию
         self.is_admin_mode = False
+        # Клиентская копия счетчиков: изменения из панели применяются к ним без запросов к БД
+        self.task_counts = None  # [всего, выполнено] выбранного пользователя
+        self.users = {}  # {user_id: строка обзора пользователей}
+        self.user_items = {}  # {user_id: QListWidgetItem}
+        self.changed_task_ids = set()  # задачи выбранного пользователя, измененные другими процессами
+        self.stale_counters = set()  # пользователи, чьи задачи меняли другие процессы
         
         self.setWindowTitle("Менеджер задач - Админ Панель")
         self.setGeometry(100, 100, 900, 600)
@@ -300,6 +601,19 @@ class TaskManager(QMainWindow):
         self.setup_ui()
         self.load_users()
         self.load_tasks()
+        
+        QShortcut(QKeySequence.StandardKey.Refresh, self, self.reconcile)
+        
+        # Записи бота в ту же БД подхватываются из журнала изменений
+        self.watcher = ChangeWatcher(self)
+        self.watcher.changes_arrived.connect(self.on_db_changes)
+        self.watcher.resync_needed.connect(self.reconcile)
+        self.watcher.failed.connect(self.on_db_error)
+        
+        # Журнал изменений чистится и тогда, когда бот не запущен
+        self.compact_timer = QTimer(self)
+        self.compact_timer.timeout.connect(self.compact_changes)
+        self.compact_timer.start(self.COMPACT_INTERVAL_MS)
     
     def setup_ui(self):
         central_widget = QWidget()
@@ -353,23 +667,52 @@ class TaskManager(QMainWindow):
         
         layout.addLayout(user_panel)
         
-        # Список задач
-        self.tasks_list = QListWidget()
+        # Поиск: запрос уходит в БД, когда пользователь перестал печатать
+        self.search_input = QLineEdit()
+        self.search_input.setPlaceholderText("🔍 Поиск по задачам...")
+        self.search_input.setClearButtonEnabled(True)
+        self.search_input.setStyleSheet("QLineEdit { padding: 6px; font-size: 14px; }")
+        self.search_timer = QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(300)
+        self.search_timer.timeout.connect(self.load_tasks)
+        self.search_input.textChanged.connect(self.search_timer.start)
+        layout.addWidget(self.search_input)
+        
+        # Список задач: модель подгружает задачи пачками, делегат рисует строки
+        self.tasks_model = TaskListModel(self.executor, self.db.get_user_tasks_page,
+                                         self.db.search_user_tasks, self)
+        self.tasks_list = QListView()
+        self.tasks_list.setModel(self.tasks_model)
+        self.tasks_list.setUniformItemSizes(True)
+        self.tasks_list.setSelectionMode(QListView.SelectionMode.ExtendedSelection)
         self.tasks_list.setStyleSheet("""
-            QListWidget {
+            QListView {
                 border: 1px solid #ccc;
                 border-radius: 5px;
                 background-color: white;
             }
-            QListWidget::item {
-                border-bottom: 1px solid #eee;
-            }
-            QListWidget::item:last {
-                border-bottom: none;
-            }
         """)
+        self.tasks_delegate = TaskItemDelegate(self.tasks_list)
+        self.tasks_delegate.task_toggled.connect(self.on_task_toggled)
+        self.tasks_delegate.task_deleted.connect(self.on_task_deleted)
+        self.tasks_list.setItemDelegate(self.tasks_delegate)
         layout.addWidget(self.tasks_list)
         
+        # Действия над выделенными задачами (Ctrl/Shift + клик): одна транзакция на все
+        bulk_panel = QHBoxLayout()
+        self.bulk_done_btn = QPushButton("✔ Отметить выполненными")
+        self.bulk_done_btn.clicked.connect(self.on_bulk_done)
+        self.bulk_delete_btn = QPushButton("🗑 Удалить выбранные")
+        self.bulk_delete_btn.clicked.connect(self.on_bulk_delete)
+        bulk_panel.addWidget(self.bulk_done_btn)
+        bulk_panel.addWidget(self.bulk_delete_btn)
+        bulk_panel.addStretch()
+        layout.addLayout(bulk_panel)
+        self.tasks_list.selectionModel().selectionChanged.connect(self.update_bulk_buttons)
+        self.tasks_model.modelReset.connect(self.update_bulk_buttons)
+        self.update_bulk_buttons()
+        
         # Статистика
         self.stats_label = QLabel()
         self.stats_label.setStyleSheet("padding: 10px; color: #666;")
@@ -420,80 +763,78 @@ class TaskManager(QMainWindow):
         self.admin_tab.setLayout(layout)
     
     def load_users(self):
-        """Загрузка списка пользователей"""
-        users = self.db.get_all_users()
+        """Загрузка списка пользователей (в фоне, повторные вызовы схлопываются)"""
+        self.executor.submit("users", self.db.get_users_overview, on_result=self.show_users)
+    
+    def show_users(self, overview):
+        """Заполнение выпадающего списка, списка пользователей и админов"""
+        # Пересоздание пунктов не должно перезагружать задачи, если выбранный пользователь не сменился
+        selected = self.user_combo.currentData()
+        self.user_combo.blockSignals(True)
         self.user_combo.clear()
-        
-        for user in users:
+        for user in overview:
             display_name = self.get_user_display_name(user)
             self.user_combo.addItem(display_name, user['id'])
+        index = self.user_combo.findData(selected)
+        self.user_combo.setCurrentIndex(index if index >= 0 else 0)
+        self.user_combo.blockSignals(False)
+        if self.user_combo.currentData() != selected:
+            self.load_tasks()
         
-        self.update_users_list()
-        self.update_admins_list()
+        self.update_users_list(overview)
+        self.update_admins_list(overview)
     
     def load_tasks(self):
         """Загрузка задач текущего пользователя"""
         if hasattr(self, 'user_combo') and self.user_combo.currentData():
             user_id = self.user_combo.currentData()
             self.current_user_id = user_id
-            tasks = self.db.get_user_tasks(user_id)
-            
-            self.tasks_list.clear()
-            
-            for task in tasks:
-                self.add_task_to_list(task)
+            self.tasks_model.set_user(user_id, self.search_input.text().strip())
             
             self.update_stats()
     
-    def add_task_to_list(self, task):
-        """Добавление задачи в список"""
-        task_widget = TaskItemWidget(task['id'], task['text'], task['done'])
-        task_widget.task_toggled.connect(self.on_task_toggled)
-        task_widget.task_deleted.connect(self.on_task_deleted)
-        
-        item = QListWidgetItem()
-        item.setSizeHint(task_widget.sizeHint())
-        
-        self.tasks_list.addItem(item)
-        self.tasks_list.setItemWidget(item, task_widget)
-    
     def update_stats(self):
         """Обновление статистики"""
-        tasks = self.db.get_user_tasks(self.current_user_id)
-        total = len(tasks)
-        completed = sum(1 for task in tasks if task['done'])
-        
+        self.executor.submit("stats", self.db.get_user_task_counts, self.current_user_id,
+                             on_result=self.show_stats)
+    
+    def show_stats(self, counts):
+        self.task_counts = list(counts)
+        self.render_stats()
+    
+    def render_stats(self):
+        total, completed = self.task_counts
         self.stats_label.setText(
             f"Всего задач: {total} | Выполнено: {completed} | "
             f"Осталось: {total - completed} | "
             f"Прогресс: {completed}/{total} ({completed/total*100:.1f}%)" if total > 0 else "Прогресс: 0%"
         )
     
-    def update_users_list(self):
+    def update_users_list(self, overview):
         """Обновление списка пользователей"""
-        users = self.db.get_all_users()
         self.users_list.clear()
+        self.users = {}
+        self.user_items = {}
         
-        for user in users:
-            display_name = self.get_user_display_name(user)
-            task_count = len(self.db.get_user_tasks(user['id']))
-            completed_count = sum(1 for task in self.db.get_user_tasks(user['id']) if task['done'])
-            
-            item_text = f"{display_name} | Задачи: {task_count} | Выполнено: {completed_count}"
-            if self.db.is_admin(user['id']):
-                item_text += " 👑"
-            
-            item = QListWidgetItem(item_text)
+        for user in overview:
+            item = QListWidgetItem(self.user_item_text(user))
             item.setData(Qt.ItemDataRole.UserRole, user['id'])
             self.users_list.addItem(item)
+            self.users[user['id']] = user
+            self.user_items[user['id']] = item
     
-    def update_admins_list(self):
+    def user_item_text(self, user):
+        item_text = f"{self.get_user_display_name(user)} | Задачи: {user['total']} | Выполнено: {user['done']}"
+        if user['is_admin']:
+            item_text += " 👑"
+        return item_text
+    
+    def update_admins_list(self, overview):
         """Обновление списка администраторов"""
-        users = self.db.get_all_users()
         self.admins_list.clear()
         
-        for user in users:
-            if self.db.is_admin(user['id']):
+        for user in overview:
+            if user['is_admin']:
                 display_name = self.get_user_display_name(user)
                 self.admins_list.addItem(display_name)
     
@@ -520,17 +861,158 @@ class TaskManager(QMainWindow):
                 self.tabs.setCurrentIndex(0)  # Переключаемся на вкладку задач
                 break
     
+    def on_db_error(self, error):
+        """Ошибка фонового запроса: окно продолжает работать, сообщение в строке состояния"""
+        self.statusBar().showMessage(f"Ошибка базы данных: {error}", 10000)
+    
+    def apply_task_delta(self, user_id, total=0, done=0):
+        """Изменение счетчиков задач пользователя в статистике и в списке пользователей без запросов к БД"""
+        user = self.users.get(user_id)
+        if user:
+            user['total'] += total
+            user['done'] += done
+            self.user_items[user_id].setText(self.user_item_text(user))
+        if user_id == self.current_user_id and self.task_counts:
+            self.task_counts[0] += total
+            self.task_counts[1] += done
+            self.render_stats()
+    
+    def reconcile(self):
+        """Полная сверка с БД: списки и счетчики перечитываются заново"""
+        self.load_users()
+        self.load_tasks()
+    
+    def compact_changes(self):
+        """Удаление записей журнала изменений старше storage.CHANGES_RETENTION_HOURS"""
+        self.executor.write(self.db.compact_changes, storage.CHANGES_RETENTION_HOURS * 3600)
+    
+    def on_db_changes(self, changes):
+        """Применение изменений из журнала: перечитываются только затронутые задачи и счетчики
+        
+        Свои записи панель уже применила к окну и пропускает. Обзор пользователей
+        перечитывается только при изменении users или admins; для задач
+        обновляются счетчики их владельцев.
+        """
+        users_changed = False
+        for change in self.db.drop_own_changes(changes):
+            if change['table'] != 'tasks':
+                users_changed = True
+                continue
+            self.stale_counters.add(change['user_id'])
+            if change['user_id'] != self.tasks_model.user_id:
+                continue
+            if change['op'] == 'delete':
+                self.changed_task_ids.discard(change['row_id'])
+                self.tasks_model.remove_task(change['row_id'])
+            else:
+                self.changed_task_ids.add(change['row_id'])
+        
+        if self.changed_task_ids:
+            self.executor.submit("changed_tasks", self.db.get_tasks_by_ids, list(self.changed_task_ids),
+                                 on_result=self.apply_changed_tasks)
+        if self.stale_counters:
+            self.executor.submit("task_counters", read_task_counters, self.db, list(self.stale_counters),
+                                 on_result=self.apply_task_counters)
+        if users_changed:
+            self.load_users()
+    
+    def apply_task_counters(self, counters):
+        """Счетчики задач пользователей, перечитанные из БД, в списке пользователей и в статистике"""
+        for user_id, stats in counters.items():
+            user = self.users.get(user_id)
+            if user:
+                user['total'], user['done'] = stats['total'], stats['done']
+                self.user_items[user_id].setText(self.user_item_text(user))
+            if user_id == self.current_user_id:
+                self.show_stats((stats['total'], stats['done']))
+        self.stale_counters.clear()
+    
+    def apply_changed_tasks(self, tasks):
+        found = set()
+        for task in tasks:
+            found.add(task['id'])
+            if task['user_id'] != self.tasks_model.user_id:
+                continue
+            if not self.tasks_model.set_task(task):
+                self.tasks_model.prepend_task({"id": task['id'], "text": task['text'], "done": task['done']})
+        # Задачи, которых уже нет в БД, удалены после записи в журнал
+        for task_id in self.changed_task_ids - found:
+            self.tasks_model.remove_task(task_id)
+        self.changed_task_ids.clear()
+    
     def on_task_toggled(self, task_id, is_done):
         """Обработчик переключения статуса задачи"""
-        self.db.update_task_status(task_id, is_done)
-        self.update_stats()
-        self.update_users_list()
+        # Строка и счетчики меняются сразу, при ошибке записи возвращаются обратно
+        user_id = self.current_user_id
+        self.tasks_model.set_done(task_id, is_done)
+        self.apply_task_delta(user_id, done=1 if is_done else -1)
+        
+        def rollback(error):
+            self.tasks_model.set_done(task_id, not is_done)
+            self.apply_task_delta(user_id, done=-1 if is_done else 1)
+            self.on_db_error(error)
+        
+        self.executor.write(self.db.update_task_status, task_id, is_done, on_error=rollback)
+    
+    def selected_tasks(self):
+        tasks = (self.tasks_model.get_task(index.data(TaskListModel.TaskIdRole))
+                 for index in self.tasks_list.selectionModel().selectedIndexes())
+        return [task for task in tasks if task]
+    
+    def update_bulk_buttons(self):
+        has_selection = self.tasks_list.selectionModel().hasSelection()
+        self.bulk_done_btn.setEnabled(has_selection)
+        self.bulk_delete_btn.setEnabled(has_selection)
+    
+    def on_bulk_done(self):
+        """Отметка выделенных задач выполненными одной транзакцией"""
+        task_ids = [task['id'] for task in self.selected_tasks() if not task['done']]
+        if not task_ids:
+            return
+        user_id = self.current_user_id
+        for task_id in task_ids:
+            self.tasks_model.set_done(task_id, True)
+        self.apply_task_delta(user_id, done=len(task_ids))
+        
+        def rollback(error):
+            for task_id in task_ids:
+                self.tasks_model.set_done(task_id, False)
+            self.apply_task_delta(user_id, done=-len(task_ids))
+            self.on_db_error(error)
+        
+        self.executor.write(self.db.update_tasks_status, task_ids, True, on_error=rollback)
+    
+    def on_bulk_delete(self):
+        """Удаление выделенных задач одной транзакцией"""
+        tasks = self.selected_tasks()
+        if not tasks:
+            return
+        reply = QMessageBox.question(self, "Удаление задач", f"Удалить выбранные задачи ({len(tasks)})?")
+        if reply != QMessageBox.StandardButton.Yes:
+            return
+        user_id = self.current_user_id
+        task_ids = [task['id'] for task in tasks]
+        done = sum(1 for task in tasks if task['done'])
+        
+        def deleted(_):
+            self.tasks_model.remove_tasks(task_ids)
+            self.apply_task_delta(user_id, total=-len(task_ids), done=-done)
+        
+        self.executor.write(self.db.delete_tasks, task_ids, on_result=deleted)
     
     def on_task_deleted(self, task_id):
         """Обработчик удаления задачи"""
-        self.db.delete_task(task_id)
-        self.load_tasks()
-        self.update_users_list()
+        reply = QMessageBox.question(self, "Удаление задачи", "Вы уверены, что хотите удалить эту задачу?")
+        if reply != QMessageBox.StandardButton.Yes:
+            return
+        user_id = self.current_user_id
+        task = self.tasks_model.get_task(task_id)
+        
+        def deleted(_):
+            self.tasks_model.remove_task(task_id)
+            self.apply_task_delta(user_id, total=-1, done=-1 if task and task['done'] else 0)
+        
+        self.executor.write(self.db.delete_task, task_id, on_result=deleted)
     
     def show_add_task_dialog(self):
         """Показать диалог добавления задачи"""
@@ -538,9 +1020,14 @@ class TaskManager(QMainWindow):
         if dialog.exec() == QDialog.DialogCode.Accepted:
             task_text = dialog.get_task_text()
             if task_text:
-                self.db.add_task(self.current_user_id, task_text)
-                self.load_tasks()
-                self.update_users_list()
+                user_id = self.current_user_id
+                
+                def added(task_id):
+                    if self.tasks_model.user_id == user_id:
+                        self.tasks_model.prepend_task({"id": task_id, "text": task_text, "done": False})
+                    self.apply_task_delta(user_id, total=1)
+                
+                self.executor.write(self.db.add_task, user_id, task_text, on_result=added)
     
     def show_add_admin_dialog(self):
         """Показать диалог добавления администратора"""
@@ -550,13 +1037,22 @@ class TaskManager(QMainWindow):
             if user_id_text:
                 try:
                     user_id = int(user_id_text)
-                    # Создаем пользователя если не существует
-                    self.db.ensure_user_exists(user_id)
-                    self.db.add_admin(user_id)
-                    self.load_users()
-                    QMessageBox.information(self, "Успех", f"Пользователь {user_id} назначен администратором")
                 except ValueError:
                     QMessageBox.warning(self, "Ошибка", "ID пользователя должен быть числом")
+                    return
+                
+                def done(_):
+                    self.load_users()
+                    QMessageBox.information(self, "Успех", f"Пользователь {user_id} назначен администратором")
+                
+                # Записи выполняются по очереди: пользователь будет создан раньше, чем назначен админом
+                self.executor.write(self.db.ensure_user_exists, user_id)
+                self.executor.write(self.db.add_admin, user_id, on_result=done)
+    
+    def closeEvent(self, event):
+        self.watcher.stop()
+        self.executor.shutdown()
+        super().closeEvent(event)
 
 
 if __name__ == "__main__":
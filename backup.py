@@ -0,0 +1,240 @@
+"""Резервные копии базы без остановки бота
+
+Копия файла, в который пишут бот и Desktop-панель, может оказаться
+несогласованной (страницы из разных транзакций, незачекпоинченный WAL).
+Поэтому снимок делается sqlite3 backup API по step_pages страниц с паузой
+step_pause между шагами: бот делит с копированием диск и процессор, а не
+ждет его целиком.
+
+Все шаги идут внутри одной читающей транзакции исходного соединения. В
+режиме WAL она не мешает писателям, а снимок получается на момент ее начала.
+Без нее каждая запись другого соединения заставляла бы backup начинать
+заново, и под постоянной нагрузкой он мог бы не закончиться никогда.
+
+Снимок пишется во временный файл, переводится в journal_mode = DELETE
+(один самодостаточный файл), проверяется и только потом получает свое имя
+tasks-ГГГГММДД-ЧЧММСС.db. Ротация оставляет keep последних снимков.
+
+Новый снимок проверяется PRAGMA quick_check: он находит поврежденные
+страницы и записи, но не сверяет индексы с таблицами и поэтому в несколько раз
+быстрее полного integrity_check, который под нагрузкой отнимает у бота
+процессор дольше самого копирования. Полная проверка — в verify_snapshot по
+умолчанию, ее выполняют dbtool verify-backup и восстановление.
+"""
+
+import os
+import sqlite3
+import threading
+import time
+
+import migrations
+import storage
+
+SNAPSHOT_PREFIX = "tasks-"
+SNAPSHOT_SUFFIX = ".db"
+# Копии базы перед восстановлением: своя ротация, плановые снимки их не вытесняют
+SAFETY_PREFIX = "pre-restore-"
+
+
+def _copy(source, target, step_pages, step_pause):
+    """Постраничное копирование source в target; возвращает (страниц, шагов)"""
+    progress = {"pages": 0, "steps": 0}
+
+    def on_step(status, remaining, total):
+        progress["pages"] = total
+        progress["steps"] += 1
+        if remaining and step_pause:
+            time.sleep(step_pause)
+
+    source.backup(target, pages=step_pages, progress=on_step)
+    return progress["pages"], progress["steps"]
+
+
+def create_snapshot(path, db_name=None, step_pages=128, step_pause=0.02, full_check=False):
+    """Снимок базы в файл path; возвращает сводку (страниц, шагов, секунд копирования и всего, байт)"""
+    started = time.perf_counter()
+    partial = path + ".part"
+    if os.path.exists(partial):
+        os.remove(partial)
+    source = storage.connect(db_name)
+    target = sqlite3.connect(partial)
+    try:
+        # Читающая транзакция на все шаги: согласованный снимок и никаких перезапусков backup
+        source.execute("BEGIN")
+        source.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()
+        pages, steps = _copy(source, target, step_pages, step_pause)
+        source.rollback()
+        target.execute("PRAGMA journal_mode = DELETE")
+    finally:
+        target.close()
+        source.close()
+
+    copied = time.perf_counter()
+    problems = verify_snapshot(partial, full_check)
+    if problems:
+        os.remove(partial)
+        raise RuntimeError(f"Снимок не прошел проверку: {'; '.join(problems)}")
+    os.replace(partial, path)
+    return {"path": path, "pages": pages, "steps": steps, "copy_seconds": copied - started,
+            "seconds": time.perf_counter() - started, "bytes": os.path.getsize(path)}
+
+
+def verify_snapshot(path, full=True):
+    """Список проблем снимка (пустой, если снимок цел и его схема известна этой версии)
+
+    full=False — PRAGMA quick_check вместо integrity_check.
+    """
+    if not os.path.exists(path):
+        return [f"файл {path} не найден"]
+    try:
+        conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    except sqlite3.Error as e:
+        return [f"не открывается: {e}"]
+    try:
+        rows = conn.execute("PRAGMA integrity_check" if full else "PRAGMA quick_check").fetchall()
+        problems = [row[0] for row in rows if row[0] != "ok"]
+        version = migrations.get_version(conn)
+    except sqlite3.Error as e:
+        return [f"ошибка чтения: {e}"]
+    finally:
+        conn.close()
+    if version > migrations.latest_version():
+        problems.append(f"схема версии {version} новее этой версии бота ({migrations.latest_version()})")
+    return problems
+
+
+def list_snapshots(backup_dir, prefix=SNAPSHOT_PREFIX):
+    """Пути снимков в каталоге от старых к новым"""
+    if not os.path.isdir(backup_dir):
+        return []
+    names = sorted(name for name in os.listdir(backup_dir)
+                   if name.startswith(prefix) and name.endswith(SNAPSHOT_SUFFIX))
+    return [os.path.join(backup_dir, name) for name in names]
+
+
+def snapshot_path(backup_dir, now=None, prefix=SNAPSHOT_PREFIX):
+    """Имя нового снимка по времени; при совпадении секунды добавляется номер"""
+    stamp = time.strftime("%Y%m%d-%H%M%S", time.localtime(now))
+    path = os.path.join(backup_dir, f"{prefix}{stamp}{SNAPSHOT_SUFFIX}")
+    n = 1
+    while os.path.exists(path):
+        path = os.path.join(backup_dir, f"{prefix}{stamp}-{n}{SNAPSHOT_SUFFIX}")
+        n += 1
+    return path
+
+
+def rotate(backup_dir, keep, prefix=SNAPSHOT_PREFIX):
+    """Удаление всех снимков, кроме keep последних; возвращает удаленные пути"""
+    snapshots = list_snapshots(backup_dir, prefix)
+    removed = snapshots[:-keep] if keep > 0 else []
+    for path in removed:
+        os.remove(path)
+    return removed
+
+
+def backup(backup_dir, keep=7, db_name=None, step_pages=128, step_pause=0.02):
+    """Новый проверенный снимок в backup_dir и ротация старых"""
+    os.makedirs(backup_dir, exist_ok=True)
+    summary = create_snapshot(snapshot_path(backup_dir), db_name, step_pages, step_pause)
+    summary["removed"] = rotate(backup_dir, keep)
+    return summary
+
+
+def restore(snapshot, db_name=None, step_pages=128, step_pause=0.0):
+    """Замена содержимого базы снимком (бот и Desktop-панель должны быть остановлены)
+
+    Содержимое переносится тем же backup API в соединение с базой, поэтому
+    файлы WAL и -shm остаются согласованными с основным файлом.
+    """
+    problems = verify_snapshot(snapshot)
+    if problems:
+        raise RuntimeError(f"Снимок {snapshot} поврежден: {'; '.join(problems)}")
+    source = sqlite3.connect(f"file:{snapshot}?mode=ro", uri=True)
+    target = storage.connect(db_name)
+    try:
+        pages, steps = _copy(source, target, step_pages, step_pause)
+    finally:
+        target.close()
+        source.close()
+    return {"pages": pages, "steps": steps}
+
+
+class BackupScheduler:
+    """Фоновый поток, делающий снимок раз в interval секунд
+
+    Время следующего снимка считается от последнего снимка в каталоге, поэтому
+    перезапуск бота не сдвигает расписание и не делает лишних снимков.
+    """
+
+    # Пауза после неудачного снимка перед новой попыткой
+    RETRY_DELAY = 300.0
+
+    def __init__(self, backup_dir, interval, keep=7, step_pages=128, step_pause=0.02, clock=time.time):
+        self.backup_dir = backup_dir
+        self.interval = interval
+        self.keep = keep
+        self.step_pages = step_pages
+        self.step_pause = step_pause
+        self.clock = clock
+        self.backups = 0
+        self.failed = 0
+        self.last_seconds = 0.0
+        self.last_bytes = 0
+        self.last_at = 0.0
+        self._cond = threading.Condition()
+        self._stopped = False
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="backup", daemon=True)
+        self._thread.start()
+        return self
+
+    def _next_at(self):
+        snapshots = list_snapshots(self.backup_dir)
+        return os.path.getmtime(snapshots[-1]) + self.interval if snapshots else self.clock()
+
+    def _wait(self, until):
+        """Ожидание момента until; False при остановке"""
+        with self._cond:
+            while not self._stopped:
+                remaining = until - self.clock()
+                if remaining <= 0:
+                    return True
+                self._cond.wait(remaining)
+        return False
+
+    def run_once(self):
+        summary = backup(self.backup_dir, self.keep, step_pages=self.step_pages, step_pause=self.step_pause)
+        with self._cond:
+            self.backups += 1
+            self.last_seconds = summary["seconds"]
+            self.last_bytes = summary["bytes"]
+            self.last_at = self.clock()
+        return summary
+
+    def _run(self):
+        next_at = self._next_at()
+        while self._wait(next_at):
+            try:
+                summary = self.run_once()
+                print(f"Резервная копия {summary['path']}: {summary['bytes'] // 1024} КБ "
+                      f"за {summary['seconds']:.1f} с")
+                next_at = self.clock() + self.interval
+            except Exception as e:
+                print(f"Ошибка резервного копирования: {e}")
+                with self._cond:
+                    self.failed += 1
+                next_at = self.clock() + self.RETRY_DELAY
+
+    def stats(self):
+        with self._cond:
+            return {"backups": self.backups, "failed": self.failed, "last_seconds": self.last_seconds,
+                    "last_bytes": self.last_bytes, "last_at": self.last_at}
+
+    def stop(self, timeout=5.0):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
@@ -0,0 +1,128 @@
+"""Задержка обработчиков во время резервного копирования
+
+База заполняется генератором (--tasks задач), затем --threads потоков
+непрерывно выполняют операции бота: страница задач пользователя, новая
+задача и отметка выполненной (записи — через поток групповой записи, как в
+боте). Задержка операций сравнивается в трех режимах:
+
+    без копии    — фон для сравнения
+    шагами       — backup API по --step-pages страниц с паузой --step-pause-ms
+    одним шагом  — backup API за один вызов, без пауз
+
+Копирование идет в том же процессе, что и операции, — так работает
+BackupScheduler в боте.
+
+Запуск из корня проекта:
+    python -m benchmarks.backup_bench --tasks 300000 --threads 8
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import threading
+import time
+
+import backup
+import storage
+from benchmarks.datagen import FIRST_USER_ID, generate
+from writer import WriteCoalescer
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))] if values else 0.0
+
+
+class Workload:
+    """Потоки, выполняющие операции бота, пока их не остановят"""
+
+    def __init__(self, threads, users):
+        self.users = users
+        self.latencies = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._pool = [threading.Thread(target=self._run, args=(n,), daemon=True) for n in range(threads)]
+
+    def start(self):
+        for thread in self._pool:
+            thread.start()
+        return self
+
+    def take(self):
+        """Задержки, накопленные с прошлого вызова"""
+        with self._lock:
+            latencies, self.latencies = self.latencies, []
+        return latencies
+
+    def _run(self, n):
+        rng = random.Random(n)
+        while not self._stop.is_set():
+            user_id = FIRST_USER_ID + rng.randrange(self.users)
+            started = time.perf_counter()
+            storage.get_user_tasks_page(user_id)
+            task_id = storage.add_user_task(user_id, f"Задача {n}")
+            storage.update_task_status(task_id, True)
+            elapsed = time.perf_counter() - started
+            with self._lock:
+                self.latencies.append(elapsed)
+        storage.close_connection()
+
+    def stop(self):
+        self._stop.set()
+        for thread in self._pool:
+            thread.join()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tasks", type=int, default=300000)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--step-pages", type=int, default=128)
+    parser.add_argument("--step-pause-ms", type=float, default=20)
+    parser.add_argument("--idle-seconds", type=float, default=3.0, help="длительность замера без копии")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        storage.configure(os.path.join(tmp, "bench.db"))
+        storage.init_db()
+        generate(args.users, args.tasks)
+        storage.close_connection()
+        print(f"база {os.path.getsize(storage.DB_NAME) // 1024} КБ, потоков {args.threads}")
+
+        writer = WriteCoalescer().start()
+        storage.set_writer(writer)
+        workload = Workload(args.threads, args.users).start()
+        time.sleep(0.5)
+        workload.take()
+
+        print(f"{'режим':<14}{'копия, с':>9}{'проверка, с':>12}{'шагов':>7}{'оп/с':>8}"
+              f"{'p50, мс':>9}{'p99, мс':>9}{'max, мс':>9}")
+        modes = (("без копии", None, None),
+                 ("шагами", args.step_pages, args.step_pause_ms / 1000),
+                 ("одним шагом", -1, 0.0))
+        for title, pages, pause in modes:
+            started = time.perf_counter()
+            steps, copy_seconds = 0, 0.0
+            if pages is None:
+                time.sleep(args.idle_seconds)
+            else:
+                summary = backup.create_snapshot(os.path.join(tmp, f"snapshot{pages}.db"),
+                                                 step_pages=pages, step_pause=pause)
+                steps, copy_seconds = summary["steps"], summary["copy_seconds"]
+            elapsed = time.perf_counter() - started
+            latencies = workload.take()
+            check_seconds = elapsed - copy_seconds if pages is not None else 0.0
+            print(f"{title:<14}{copy_seconds:>9.2f}{check_seconds:>12.2f}{steps:>7}{len(latencies) / elapsed:>8.0f}"
+                  f"{percentile(latencies, 0.5) * 1000:>9.2f}{percentile(latencies, 0.99) * 1000:>9.2f}"
+                  f"{max(latencies, default=0) * 1000:>9.2f}")
+
+        workload.stop()
+        writer.stop()
+        storage.set_writer(None)
+        storage.close_connection()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""Бенчмарк пакетных операций: по одной задаче на транзакцию против executemany в одной
+
+Запуск из корня проекта:
+    python -m benchmarks.bulk_bench --count 2000
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+import storage
+
+
+def rate(fn, count):
+    started = time.perf_counter()
+    fn()
+    return count / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--count", type=int, default=2000)
+    args = parser.parse_args()
+    texts = [f"Задача {n}" for n in range(args.count)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        storage.configure(os.path.join(tmp, "bench.db"))
+        storage.init_db()
+
+        single_ids = []
+        single = [
+            rate(lambda: single_ids.extend(storage.add_user_task(1, text) for text in texts), args.count),
+            rate(lambda: [storage.update_task_status(task_id, True) for task_id in single_ids], args.count),
+            rate(lambda: [storage.delete_task(task_id) for task_id in single_ids], args.count),
+        ]
+
+        bulk_ids = []
+        bulk = [
+            rate(lambda: bulk_ids.extend(storage.add_user_tasks(2, texts)), args.count),
+            rate(lambda: storage.update_tasks_status(bulk_ids, True), args.count),
+            rate(lambda: storage.delete_tasks(bulk_ids), args.count),
+        ]
+
+        print(f"задач: {args.count} (с триггерами журнала, счетчиков и поиска)")
+        print(f"{'операция':<12}{'по одной, шт/с':>17}{'пакетом, шт/с':>16}{'ускорение':>12}")
+        for name, one, batched in zip(["добавление", "выполнено", "удаление"], single, bulk):
+            print(f"{name:<12}{one:>17.0f}{batched:>16.0f}{batched / one:>11.1f}x")
+
+        storage.close_connection()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""Генератор тестовых данных: N пользователей и M задач в базе бота
+
+Задачи распределяются между пользователями равномерно (uniform) или по закону
+Ципфа (zipf): несколько пользователей с тысячами задач и длинный хвост с
+единицами — так выглядят реальные базы. Первые --admins пользователей
+становятся администраторами. Данные пишутся пачками через executemany, поэтому
+срабатывают все триггеры (журнал изменений, счетчики, полнотекстовый индекс).
+
+В базу, где уже есть задачи, генератор пишет только с --append.
+
+Запуск из корня проекта:
+    python -m benchmarks.datagen --db /tmp/load.db --users 1000 --tasks 100000 --distribution zipf
+"""
+
+import argparse
+import json
+import random
+import time
+
+import storage
+
+# id сгенерированных пользователей начинаются отсюда, чтобы не пересечься с настоящими
+FIRST_USER_ID = 100000
+
+WORDS = ["купить", "молоко", "позвонить", "отчет", "встреча", "проект", "письмо", "оплатить",
+         "заказ", "документы", "клиент", "ремонт", "билеты", "врач", "подарок", "презентация"]
+
+
+def user_weights(users, distribution, zipf_s=1.1):
+    """Доля задач каждого пользователя"""
+    if distribution == "uniform":
+        return [1.0] * users
+    if distribution == "zipf":
+        return [1.0 / (rank + 1) ** zipf_s for rank in range(users)]
+    raise ValueError(f"Неизвестное распределение: {distribution}")
+
+
+def generate(users, tasks, distribution="uniform", zipf_s=1.1, done_ratio=0.3, admins=1, days=90,
+             seed=0, batch_size=10000):
+    """Заполнение текущей базы storage; возвращает сводку по сгенерированным данным"""
+    rng = random.Random(seed)
+    user_ids = [FIRST_USER_ID + n for n in range(users)]
+    with storage.transaction() as conn:
+        conn.executemany(
+            'INSERT OR IGNORE INTO users (user_id, username, first_name) VALUES (?, ?, ?)',
+            ((user_id, f"user{user_id}", f"User {user_id}") for user_id in user_ids)
+        )
+        conn.executemany(
+            'INSERT OR IGNORE INTO admins (user_id, added_by) VALUES (?, NULL)',
+            ((user_id,) for user_id in user_ids[:admins])
+        )
+
+    weights = user_weights(users, distribution, zipf_s)
+    per_user = {}
+    written = 0
+    while written < tasks:
+        count = min(batch_size, tasks - written)
+        owners = rng.choices(user_ids, weights, k=count)
+        rows = []
+        for n, owner in enumerate(owners):
+            per_user[owner] = per_user.get(owner, 0) + 1
+            text = " ".join(rng.choices(WORDS, k=rng.randint(2, 6))) + f" #{written + n}"
+            rows.append((owner, text, rng.random() < done_ratio, f"-{rng.randint(0, days * 86400)} seconds"))
+        with storage.transaction() as conn:
+            conn.executemany(
+                "INSERT INTO tasks (user_id, task_text, is_done, created_at) VALUES (?, ?, ?, datetime('now', ?))",
+                rows
+            )
+        written += count
+
+    counts = sorted(per_user.values(), reverse=True)
+    return {
+        "users": users,
+        "tasks": tasks,
+        "distribution": distribution,
+        "users_with_tasks": len(counts),
+        "max_tasks_per_user": counts[0] if counts else 0,
+        "median_tasks_per_user": counts[len(counts) // 2] if counts else 0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", default=storage.DB_NAME, help="файл базы (по умолчанию база бота)")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--tasks", type=int, default=100000)
+    parser.add_argument("--distribution", choices=["uniform", "zipf"], default="uniform")
+    parser.add_argument("--zipf-s", type=float, default=1.1, help="показатель распределения Ципфа")
+    parser.add_argument("--done-ratio", type=float, default=0.3, help="доля выполненных задач")
+    parser.add_argument("--admins", type=int, default=1)
+    parser.add_argument("--days", type=int, default=90, help="за сколько дней разбросаны даты создания")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--append", action="store_true", help="дописывать в базу, где уже есть задачи")
+    args = parser.parse_args()
+
+    storage.configure(args.db)
+    storage.init_db()
+    existing = storage.get_connection().execute('SELECT COUNT(*) FROM tasks').fetchone()[0]
+    if existing and not args.append:
+        parser.error(f"в {args.db} уже {existing} задач; добавьте --append, чтобы дописать")
+
+    started = time.perf_counter()
+    summary = generate(args.users, args.tasks, args.distribution, args.zipf_s, args.done_ratio,
+                       args.admins, args.days, args.seed)
+    summary["seconds"] = round(time.perf_counter() - started, 2)
+    storage.close_connection()
+    print(json.dumps(summary, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
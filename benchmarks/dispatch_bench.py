@@ -0,0 +1,109 @@
+"""Бенчмарк стоимости диспетчеризации одного нажатия кнопки
+
+Сравнивает старую цепочку callback_query_handler с лямбда-фильтрами
+(c.data == ..., startswith(...), повторный split("_") в обработчике)
+с одним обработчиком и CallbackRouter. Обработчики пустые, поэтому
+измеряется только выбор обработчика и разбор callback_data внутри TeleBot.
+
+Запуск из корня проекта:
+    python -m benchmarks.dispatch_bench --updates 20000
+"""
+
+import argparse
+import time
+
+import telebot
+from telebot import types
+
+import callbacks
+from benchmarks.fake_telegram import callback_update
+from callbacks import CallbackRouter
+
+# (старые callback_data, новые callback_data) для одинаковых нажатий
+PAYLOADS = [
+    ("my_tasks", callbacks.encode(callbacks.MY_TASKS)),
+    ("task_123456", callbacks.encode(callbacks.TASK, 123456)),
+    ("done_123456", callbacks.encode(callbacks.DONE, 123456)),
+    ("del_123456", callbacks.encode(callbacks.DELETE, 123456)),
+    ("mtn_1760000000_123456", callbacks.encode(callbacks.TASKS_NEXT, 1760000000, 123456)),
+    ("back_main", callbacks.encode(callbacks.BACK_MAIN)),
+    ("admin_view_987654", callbacks.encode(callbacks.ADMIN_VIEW, 987654)),
+    ("genesis_add_admin", callbacks.encode(callbacks.GENESIS_ADD_ADMIN)),
+]
+
+
+def noop(*args):
+    pass
+
+
+def legacy_bot():
+    bot = telebot.TeleBot("1:bench", threaded=False)
+    reparse = lambda call: call.data.split("_")
+    filters = [
+        lambda c: c.data == "add_task",
+        lambda c: c.data == "my_tasks",
+        lambda c: c.data.startswith("mtn_") or c.data.startswith("mtp_"),
+        lambda c: c.data.startswith("task_"),
+        lambda c: c.data.startswith("done_"),
+        lambda c: c.data.startswith("del_"),
+        lambda c: c.data == "back_main",
+        lambda c: c.data == "admin_panel",
+        lambda c: c.data.startswith("aun_") or c.data.startswith("aup_"),
+        lambda c: c.data.startswith("admin_view_"),
+        lambda c: c.data == "genesis_add_admin",
+    ]
+    for func in filters:
+        bot.register_callback_query_handler(reparse, func=func)
+    return bot
+
+
+def router_bot():
+    bot = telebot.TeleBot("1:bench", threaded=False)
+    router = CallbackRouter(noop)
+    for action in callbacks.ARITY:
+        router.route(action)(noop)
+    bot.register_callback_query_handler(router.dispatch, func=lambda c: True)
+    return bot, router
+
+
+def measure(bot, updates, batch=100):
+    started = time.perf_counter()
+    for n in range(0, len(updates), batch):
+        bot.process_new_updates(updates[n:n + batch])
+    return (time.perf_counter() - started) / len(updates) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--updates", type=int, default=20000)
+    args = parser.parse_args()
+
+    legacy_updates = [
+        types.Update.de_json(callback_update(n, 100, PAYLOADS[n % len(PAYLOADS)][0]))
+        for n in range(args.updates)
+    ]
+    new_updates = [
+        types.Update.de_json(callback_update(n, 100, PAYLOADS[n % len(PAYLOADS)][1]))
+        for n in range(args.updates)
+    ]
+    stale_updates = legacy_updates  # старые кнопки в новом роутере отбрасываются
+
+    legacy = measure(legacy_bot(), legacy_updates)
+    bot, router = router_bot()
+    routed = measure(bot, new_updates)
+    rejected = measure(bot, stale_updates)
+
+    decode_started = time.perf_counter()
+    for update in new_updates:
+        callbacks.decode(update.callback_query.data)
+    decode_cost = (time.perf_counter() - decode_started) / len(new_updates) * 1e6
+
+    print(f"цепочка лямбда-фильтров:   {legacy:.2f} мкс/апдейт")
+    print(f"CallbackRouter:            {routed:.2f} мкс/апдейт")
+    print(f"отказ устаревшей кнопке:   {rejected:.2f} мкс/апдейт")
+    print(f"callbacks.decode отдельно: {decode_cost:.2f} мкс")
+    print(f"обработано роутером: {router.dispatched}, отброшено: {router.rejected}")
+
+
+if __name__ == "__main__":
+    main()
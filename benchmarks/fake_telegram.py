@@ -0,0 +1,213 @@
+"""Локальный фейковый Telegram Bot API для нагрузочных тестов
+
+Отвечает на методы бота правдоподобным JSON, записывает все вызовы и умеет
+имитировать задержку сети и лимиты Telegram: при chat_limit/global_limit
+вызовов в секунду лишние получают ответ 429 с retry_after. Подключение бота:
+
+    fake = FakeTelegram(latency=0.05).start()
+    telebot.apihelper.API_URL = fake.api_url
+    telebot.asyncio_helper.API_URL = fake.api_url
+"""
+
+import email.parser
+import email.policy
+import itertools
+import json
+import math
+import threading
+import time
+from collections import defaultdict, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+
+
+def parse_form(content_type, body):
+    """Разбор тела запроса: urlencoded, multipart или JSON"""
+    if not body:
+        return {}
+    if content_type.startswith("application/json"):
+        return json.loads(body)
+    if content_type.startswith("multipart/form-data"):
+        message = email.parser.BytesParser(policy=email.policy.HTTP).parsebytes(
+            b"Content-Type: " + content_type.encode() + b"\r\n\r\n" + body
+        )
+        fields = {}
+        for part in message.iter_parts():
+            name = part.get_param("name", header="content-disposition")
+            if part.get_filename():
+                fields[name] = part.get_payload(decode=True)
+            else:
+                fields[name] = part.get_content()
+        return fields
+    return dict(parse_qsl(body.decode()))
+
+
+class FakeTelegram:
+    """HTTP-сервер, изображающий api.telegram.org"""
+
+    def __init__(self, latency=0.0, host="127.0.0.1", port=0, chat_limit=None, global_limit=None):
+        self.latency = latency
+        self.chat_limit = chat_limit
+        self.global_limit = global_limit
+        self.calls = []  # [(время, метод, параметры)] — только принятые вызовы
+        self.rejected = 0  # ответов 429
+        self.updates = []  # очередь для getUpdates
+        self.responders = {}  # {метод: функция(params) -> (http_status, json)}
+        self._message_ids = itertools.count(1000)
+        self._sent = defaultdict(deque)  # {chat_id или None: времена вызовов за последнюю секунду}
+        self._cond = threading.Condition()
+        self._server = ThreadingHTTPServer((host, port), self._make_handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def api_url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/bot{{0}}/{{1}}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name="fake-telegram", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def count(self, method=None):
+        with self._cond:
+            return sum(1 for call in self.calls if method is None or call[1] == method)
+
+    def wait_for(self, count, method=None, timeout=30.0):
+        """Ожидание, пока не наберется count вызовов (метода); возвращает True при успехе"""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while sum(1 for call in self.calls if method is None or call[1] == method) < count:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def _record(self, method, params):
+        with self._cond:
+            self.calls.append((time.monotonic(), method, params))
+            self._cond.notify_all()
+
+    def _flood_wait(self, params):
+        """Через сколько секунд вызов уложится в лимиты (0 — уже укладывается); вызов учитывается"""
+        now = time.monotonic()
+        with self._cond:
+            keys = []
+            if self.global_limit:
+                keys.append((None, self.global_limit))
+            if self.chat_limit and params.get("chat_id"):
+                keys.append((params["chat_id"], self.chat_limit))
+            wait = 0.0
+            for key, limit in keys:
+                window = self._sent[key]
+                while window and window[0] <= now - 1.0:
+                    window.popleft()
+                if len(window) >= limit:
+                    wait = max(wait, window[0] + 1.0 - now)
+            if wait > 0:
+                self.rejected += 1
+                return wait
+            for key, _ in keys:
+                self._sent[key].append(now)
+            return 0.0
+
+    def _message(self, params):
+        return {
+            "message_id": int(params.get("message_id") or next(self._message_ids)),
+            "date": int(time.time()),
+            "chat": {"id": int(params.get("chat_id") or 0), "type": "private"},
+            "text": params.get("text", ""),
+        }
+
+    def respond(self, method, params):
+        if method.startswith(("send", "edit")) and (self.chat_limit or self.global_limit):
+            wait = self._flood_wait(params)
+            if wait:
+                retry_after = math.ceil(wait)
+                return 429, {"ok": False, "error_code": 429, "description": f"Too Many Requests: retry after {retry_after}",
+                             "parameters": {"retry_after": retry_after}}
+        if method in self.responders:
+            return self.responders[method](params)
+        if method == "getMe":
+            return 200, {"ok": True, "result": {"id": 1, "is_bot": True, "first_name": "Fake", "username": "fake_bot"}}
+        if method == "getUpdates":
+            with self._cond:
+                updates, self.updates = self.updates, []
+            return 200, {"ok": True, "result": updates}
+        if method in ("sendMessage", "editMessageText", "sendDocument", "editMessageReplyMarkup"):
+            return 200, {"ok": True, "result": self._message(params)}
+        return 200, {"ok": True, "result": True}
+
+    def _make_handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _handle(self):
+                url = urlsplit(self.path)
+                method = url.path.rsplit("/", 1)[-1]
+                length = int(self.headers.get("Content-Length") or 0)
+                body = self.rfile.read(length) if length else b""
+                params = dict(parse_qsl(url.query))
+                params.update(parse_form(self.headers.get("Content-Type", ""), body))
+
+                if fake.latency:
+                    time.sleep(fake.latency)
+                status, payload = fake.respond(method, params)
+                if status == 200:
+                    fake._record(method, params)
+
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            do_GET = _handle
+            do_POST = _handle
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+def callback_update(update_id, user_id, data, message_id=1):
+    """JSON апдейта с нажатием inline-кнопки"""
+    user = {"id": user_id, "is_bot": False, "first_name": f"User{user_id}"}
+    return {
+        "update_id": update_id,
+        "callback_query": {
+            "id": str(update_id),
+            "from": user,
+            "chat_instance": str(user_id),
+            "data": data,
+            "message": {
+                "message_id": message_id,
+                "date": int(time.time()),
+                "chat": {"id": user_id, "type": "private"},
+                "from": {"id": 1, "is_bot": True, "first_name": "Fake"},
+                "text": "Выберите действие:",
+            },
+        },
+    }
+
+
+def message_update(update_id, user_id, text):
+    """JSON апдейта с текстовым сообщением (команды распознаются по '/')"""
+    message = {
+        "message_id": update_id,
+        "date": int(time.time()),
+        "chat": {"id": user_id, "type": "private"},
+        "from": {"id": user_id, "is_bot": False, "first_name": f"User{user_id}"},
+        "text": text,
+    }
+    if text.startswith("/"):
+        message["entities"] = [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}]
+    return {"update_id": update_id, "message": message}
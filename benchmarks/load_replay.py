@@ -0,0 +1,336 @@
+"""Нагрузочный прогон бота: сценарий апдейтов с заданной частотой и отчет в JSON
+
+Берет базу, заполненную benchmarks.datagen (работает на ее копии, исходный файл
+не меняется), поднимает фейковый Telegram API и подает в обработчики tgbot.py
+(или tgbot_async.py) поток апдейтов: /start, "Мои задачи", карточка задачи,
+"Выполнено" и просмотр задач пользователя админом — в пропорции --mix и с
+частотой --rate апдейтов в секунду. Модель открытая: следующий апдейт не ждет
+окончания предыдущего, поэтому при перегрузке растет задержка, а не пауза.
+
+Отчет — JSON: p50/p95/p99 задержки (от запланированного момента до конца
+обработчика) и чистого времени обработчика по всем апдейтам и по шагам
+сценария, время внутри storage, пропускная способность, статистика
+исходящей очереди и число вызовов Telegram. --compare печатает изменение
+относительно отчета, снятого на другом коммите.
+
+Запуск из корня проекта:
+    python -m benchmarks.datagen --db /tmp/load.db --users 1000 --tasks 100000 --distribution zipf
+    python -m benchmarks.load_replay --db /tmp/load.db --rate 200 --duration 10 --output before.json
+    python -m benchmarks.load_replay --db /tmp/load.db --rate 200 --duration 10 --compare before.json
+"""
+
+import argparse
+import asyncio
+import functools
+import inspect
+import json
+import os
+import platform
+import random
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+os.environ.setdefault("BOT_TOKEN", "1:fake")
+os.environ.setdefault("GENESIS_ADMIN_ID", "1")
+# Измеряется бот, а не лимиты Telegram (их проверяет outbox_load)
+os.environ.setdefault("OUTBOX_GLOBAL_RATE", "100000")
+os.environ.setdefault("OUTBOX_CHAT_RATE", "100000")
+os.environ.setdefault("OUTBOX_CHAT_BURST", "100000")
+os.environ.setdefault("OUTBOX_WORKERS", "32")
+
+import telebot
+from telebot import asyncio_helper, types
+
+import callbacks
+import storage
+from benchmarks.fake_telegram import FakeTelegram, callback_update, message_update
+
+DEFAULT_MIX = "start=1,my_tasks=4,task=3,done=1,admin_view=0.2"
+
+# Сколько пользователей и их задач берется из базы для сценария
+SAMPLE_USERS = 1000
+SAMPLE_TASKS = 50
+
+# Метрики, которые --compare сравнивает между отчетами
+COMPARED = [
+    ("throughput", "апдейтов/с"),
+    ("latency_ms.p50", "задержка p50, мс"),
+    ("latency_ms.p95", "задержка p95, мс"),
+    ("latency_ms.p99", "задержка p99, мс"),
+    ("handler_ms.p95", "обработчик p95, мс"),
+    ("db_ms.per_update", "storage на апдейт, мс"),
+    ("db_ms.p95", "вызов storage p95, мс"),
+]
+
+
+class DbTimer:
+    """Время внутри функций storage: вложенные вызовы storage не считаются дважды"""
+
+    # Генераторы и контекстные менеджеры работают уже после возврата из функции
+    SKIP = {"transaction", "iter_user_tasks", "configure"}
+
+    def __init__(self):
+        self.calls = []
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def wrap(self, fn):
+        @functools.wraps(fn)
+        def timed(*args, **kwargs):
+            depth = getattr(self._local, "depth", 0)
+            self._local.depth = depth + 1
+            started = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self._local.depth = depth
+                if depth == 0:
+                    with self._lock:
+                        self.calls.append(time.perf_counter() - started)
+        return timed
+
+    def install(self, module):
+        """Обертка всех функций модуля; вызывать до импорта модулей, которые делают from module import"""
+        for name, value in list(vars(module).items()):
+            if inspect.isfunction(value) and value.__module__ == module.__name__ and name not in self.SKIP:
+                setattr(module, name, self.wrap(value))
+
+    def reset(self):
+        with self._lock:
+            self.calls = []
+
+
+def percentiles(values):
+    values = sorted(values)
+    if not values:
+        return {"p50": 0.0, "p95": 0.0, "p99": 0.0, "max": 0.0}
+    pick = lambda q: round(values[min(len(values) - 1, int(q * len(values)))] * 1000, 3)
+    return {"p50": pick(0.5), "p95": pick(0.95), "p99": pick(0.99), "max": round(values[-1] * 1000, 3)}
+
+
+def parse_mix(text):
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        if name not in STEPS:
+            raise ValueError(f"Неизвестный шаг сценария: {name}")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+# Шаги сценария: (номер апдейта, пользователь, его задачи, админ) -> JSON апдейта
+
+STEPS = {
+    "start": lambda n, user, tasks, admin, rng: message_update(n, user, "/start"),
+    "my_tasks": lambda n, user, tasks, admin, rng: callback_update(
+        n, user, callbacks.encode(callbacks.MY_TASKS), message_id=n),
+    "task": lambda n, user, tasks, admin, rng: callback_update(
+        n, user, callbacks.encode(callbacks.TASK, rng.choice(tasks)), message_id=n),
+    "done": lambda n, user, tasks, admin, rng: callback_update(
+        n, user, callbacks.encode(callbacks.DONE, rng.choice(tasks)), message_id=n),
+    "admin_view": lambda n, user, tasks, admin, rng: callback_update(
+        n, admin, callbacks.encode(callbacks.ADMIN_VIEW, user), message_id=n),
+}
+
+
+def make_script(mix, count, seed):
+    """[(шаг, апдейт)] в случайном порядке с заданными долями шагов"""
+    rng = random.Random(seed)
+    conn = storage.get_connection()
+    users = [row[0] for row in conn.execute(
+        'SELECT user_id FROM user_task_stats WHERE total > 0 ORDER BY user_id LIMIT ?', (SAMPLE_USERS,)
+    )]
+    if not users:
+        raise SystemExit("В базе нет задач: заполните ее через python -m benchmarks.datagen")
+    tasks = {
+        user: [row[0] for row in conn.execute(
+            'SELECT task_id FROM tasks WHERE user_id = ? LIMIT ?', (user, SAMPLE_TASKS)
+        )]
+        for user in users
+    }
+    admin = conn.execute('SELECT user_id FROM admins ORDER BY user_id LIMIT 1').fetchone()
+    admin = admin[0] if admin else int(os.environ["GENESIS_ADMIN_ID"])
+
+    names, weights = list(mix), list(mix.values())
+    script = []
+    for n in range(1, count + 1):
+        step = rng.choices(names, weights)[0]
+        user = rng.choice(users)
+        update = STEPS[step](n, user, tasks[user], admin, rng)
+        script.append((step, types.Update.de_json(update)))
+    return script
+
+
+def run_sync(script, rate, workers):
+    """Апдейты уходят в пул потоков в запланированные моменты; [(шаг, задержка, время обработчика)]"""
+    import tgbot
+    tgbot.bot.threaded = False
+    results = []
+    lock = threading.Lock()
+
+    def handle(step, update, scheduled):
+        started = time.perf_counter()
+        tgbot.bot.process_new_updates([update])
+        finished = time.perf_counter()
+        with lock:
+            results.append((step, finished - scheduled, finished - started))
+
+    with ThreadPoolExecutor(workers) as pool:
+        start = time.perf_counter()
+        for n, (step, update) in enumerate(script):
+            scheduled = start + n / rate
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            pool.submit(handle, step, update, scheduled)
+    return results, tgbot.outbox
+
+
+def run_async(script, rate):
+    import tgbot_async
+    results = []
+
+    async def handle(step, update, scheduled):
+        started = time.perf_counter()
+        await tgbot_async.bot.process_new_updates([update])
+        finished = time.perf_counter()
+        results.append((step, finished - scheduled, finished - started))
+
+    async def main():
+        tasks = []
+        start = time.perf_counter()
+        for n, (step, update) in enumerate(script):
+            scheduled = start + n / rate
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tasks.append(asyncio.create_task(handle(step, update, scheduled)))
+        await asyncio.gather(*tasks)
+        if asyncio_helper.session_manager.session:
+            await asyncio_helper.session_manager.session.close()
+
+    asyncio.run(main())
+    return results, tgbot_async.outbox
+
+
+def git_commit():
+    try:
+        # -dirty отличает прогон с незакоммиченными правками от прогона на самом коммите
+        return subprocess.run(["git", "describe", "--always", "--dirty"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def build_report(args, results, elapsed, db_timer, outbox, fake):
+    by_step = {}
+    for step in sorted({row[0] for row in results}):
+        rows = [row for row in results if row[0] == step]
+        by_step[step] = {
+            "count": len(rows),
+            "latency_ms": percentiles([row[1] for row in rows]),
+            "handler_ms": percentiles([row[2] for row in rows]),
+        }
+    db_calls = db_timer.calls
+    db_ms = percentiles(db_calls)
+    db_ms["calls"] = len(db_calls)
+    db_ms["per_update"] = round(sum(db_calls) * 1000 / max(len(results), 1), 3)
+    return {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "runtime": args.runtime,
+        "params": {"rate": args.rate, "duration": args.duration, "mix": args.mix, "workers": args.workers,
+                   "latency": args.latency, "seed": args.seed, "db": os.path.basename(args.db)},
+        "updates": len(results),
+        "elapsed": round(elapsed, 3),
+        "throughput": round(len(results) / elapsed, 1) if elapsed else 0.0,
+        "latency_ms": percentiles([row[1] for row in results]),
+        "handler_ms": percentiles([row[2] for row in results]),
+        "db_ms": db_ms,
+        "by_step": by_step,
+        "outbox": outbox.stats(),
+        "telegram_calls": dict(Counter(method for _, method, _ in fake.calls)),
+    }
+
+
+def lookup(report, path):
+    value = report
+    for key in path.split("."):
+        value = value.get(key, {}) if isinstance(value, dict) else {}
+    return value if isinstance(value, (int, float)) else None
+
+
+def print_comparison(old, new):
+    print(f"сравнение с {old.get('commit')} ({old.get('runtime')}) -> {new.get('commit')} ({new.get('runtime')})",
+          file=sys.stderr)
+    for path, title in COMPARED:
+        before, after = lookup(old, path), lookup(new, path)
+        if before is None or after is None:
+            continue
+        change = f"{(after - before) / before * 100:+.1f}%" if before else "-"
+        print(f"  {title:<24}{before:>12.2f}{after:>12.2f}{change:>10}", file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", required=True, help="база, заполненная benchmarks.datagen")
+    parser.add_argument("--runtime", choices=["sync", "async"], default="sync")
+    parser.add_argument("--rate", type=float, default=100.0, help="апдейтов в секунду")
+    parser.add_argument("--duration", type=float, default=10.0, help="длительность подачи апдейтов, с")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="доли шагов сценария: шаг=вес через запятую")
+    parser.add_argument("--workers", type=int, default=4, help="потоки обработки апдейтов (sync)")
+    parser.add_argument("--latency", type=float, default=0.02, help="задержка ответа фейкового API, с")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="куда записать JSON (по умолчанию stdout)")
+    parser.add_argument("--compare", help="JSON предыдущего прогона для сравнения")
+    args = parser.parse_args()
+    mix = parse_mix(args.mix)
+
+    db_timer = DbTimer()
+    db_timer.install(storage)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # Прогон меняет данные ("Выполнено"), поэтому работает на копии базы
+        copy_path = os.path.join(tmp, "replay.db")
+        with sqlite3.connect(args.db) as source, sqlite3.connect(copy_path) as target:
+            source.backup(target)
+        storage.configure(copy_path)
+        storage.init_db()
+        script = make_script(mix, int(args.rate * args.duration), args.seed)
+
+        fake = FakeTelegram(latency=args.latency).start()
+        telebot.apihelper.API_URL = fake.api_url
+        asyncio_helper.API_URL = fake.api_url
+        db_timer.reset()
+        try:
+            started = time.perf_counter()
+            if args.runtime == "async":
+                results, outbox = run_async(script, args.rate)
+            else:
+                results, outbox = run_sync(script, args.rate, args.workers)
+            elapsed = time.perf_counter() - started
+            outbox.join(60)
+        finally:
+            fake.stop()
+        report = build_report(args, results, elapsed, db_timer, outbox, fake)
+
+    data = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(data + "\n")
+    else:
+        print(data)
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            print_comparison(json.load(f), report)
+
+
+if __name__ == "__main__":
+    main()
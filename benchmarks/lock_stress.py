@@ -0,0 +1,172 @@
+"""Нагрузка на общий файл базы из нескольких процессов: бот и Desktop-панель
+
+--bots процессов пишут как бот (через поток групповой записи: /start, новая
+задача, отметка выполненной), --panels процессов — как Desktop-панель через
+admin_panel.DatabaseManager: массовая отметка и пересчет статистики, которые
+держат блокировку записи дольше. Каждый процесс работает --seconds секунд.
+
+Сценарии отличаются только политикой повторов: без повторов каждая
+"database is locked" — потерянное действие, с повторами транзакция
+выполняется еще раз после паузы. Маленький --busy-timeout-ms делает
+блокировки заметными и на быстром диске.
+
+Запуск из корня проекта:
+    python -m benchmarks.lock_stress --bots 4 --panels 2 --seconds 5 --busy-timeout-ms 20
+"""
+
+import argparse
+import multiprocessing
+import os
+import sqlite3
+import tempfile
+import time
+
+import storage
+from locking import is_locked_error
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))] if values else 0.0
+
+
+def bot_worker(n, seconds, threads):
+    """Процесс бота: несколько потоков-обработчиков и общий поток записи"""
+    import threading
+    from writer import WriteCoalescer
+
+    writer = WriteCoalescer().start()
+    storage.set_writer(writer)
+    latencies, failed = [], [0]
+    lock = threading.Lock()
+    deadline = time.monotonic() + seconds
+
+    def handler(k):
+        own, errors, i = [], 0, 0
+        while time.monotonic() < deadline:
+            user_id = 100000 * (n + 1) + k * 1000 + i % 200
+            started = time.perf_counter()
+            try:
+                storage.ensure_user_exists(user_id, f"user{user_id}")
+                task_id = storage.add_user_task(user_id, f"Задача {n}-{k}-{i}")
+                storage.update_task_status(task_id, True)
+                own.append(time.perf_counter() - started)
+            except sqlite3.OperationalError as e:
+                if not is_locked_error(e):
+                    raise
+                errors += 1
+            i += 1
+        storage.close_connection()
+        with lock:
+            latencies.extend(own)
+            failed[0] += errors
+
+    pool = [threading.Thread(target=handler, args=(k,)) for k in range(threads)]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    writer.stop()
+    return "bot", latencies, failed[0], storage.lock_retry.stats()
+
+
+def panel_worker(task_ids, seconds):
+    """Процесс Desktop-панели: массовые операции над заранее созданными задачами"""
+    from admin_panel import DatabaseManager
+
+    db = DatabaseManager()
+    latencies, failed, done = [], 0, False
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        started = time.perf_counter()
+        try:
+            db.update_tasks_status(task_ids, done)
+            storage.rebuild_user_task_stats()
+            latencies.append(time.perf_counter() - started)
+        except sqlite3.OperationalError as e:
+            if not is_locked_error(e):
+                raise
+            failed += 1
+        done = not done
+    storage.close_connection()
+    return "panel", latencies, failed, storage.lock_retry.stats()
+
+
+def run_process(kind, n, args, retries, results):
+    storage.configure(args.db)
+    storage.configure_locking(args.busy_timeout_ms, retries, args.retry_delay_ms / 1000)
+    try:
+        if kind == "bot":
+            results.put(bot_worker(n, args.seconds, args.threads))
+        else:
+            results.put(panel_worker(args.panel_tasks[n], args.seconds))
+    except Exception as e:
+        # Без ответа основной процесс ждал бы результатов вечно
+        results.put(("error", f"{kind} {n}: {e!r}"))
+        raise
+
+
+def prepare(args):
+    """Новая база и задачи для каждого процесса панели (до запуска, без конкуренции)"""
+    storage.configure(args.db)
+    storage.init_db()
+    args.panel_tasks = []
+    for n in range(args.panels):
+        storage.ensure_user_exists(1 + n, f"admin{n}")
+        args.panel_tasks.append(storage.add_user_tasks(1 + n, [f"Панель {n}-{i}" for i in range(args.batch)]))
+    storage.close_connection()
+
+
+def scenario(args, retries):
+    results = multiprocessing.Queue()
+    processes = [multiprocessing.Process(target=run_process, args=(kind, n, args, retries, results))
+                 for kind, count in (("bot", args.bots), ("panel", args.panels)) for n in range(count)]
+    for process in processes:
+        process.start()
+    collected = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+    errors = [item[1] for item in collected if item[0] == "error"]
+    if errors:
+        raise SystemExit("Процессы завершились с ошибкой: " + "; ".join(errors))
+
+    summary = {}
+    for kind, latencies, failed, stats in collected:
+        row = summary.setdefault(kind, {"latencies": [], "failed": 0, "lock_waits": 0, "retried": 0})
+        row["latencies"].extend(latencies)
+        row["failed"] += failed
+        row["lock_waits"] += stats["lock_waits"]
+        row["retried"] += stats["retried"]
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--bots", type=int, default=4, help="процессов бота")
+    parser.add_argument("--threads", type=int, default=8, help="потоков-обработчиков в процессе бота")
+    parser.add_argument("--panels", type=int, default=2, help="процессов Desktop-панели")
+    parser.add_argument("--batch", type=int, default=2000, help="задач в массовой операции панели")
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--busy-timeout-ms", type=int, default=20)
+    parser.add_argument("--retries", type=int, default=3)
+    parser.add_argument("--retry-delay-ms", type=float, default=50.0)
+    args = parser.parse_args()
+
+    print(f"бот: {args.bots} процессов по {args.threads} потоков, панель: {args.panels} процессов, "
+          f"busy_timeout {args.busy_timeout_ms} мс, {args.seconds:g} с")
+    print(f"{'повторы':<9}{'процесс':<8}{'оп/с':>8}{'потеряно':>10}{'ожиданий':>10}{'повторов':>10}"
+          f"{'p50, мс':>9}{'p99, мс':>9}")
+    for retries in (0, args.retries):
+        with tempfile.TemporaryDirectory() as tmp:
+            args.db = os.path.join(tmp, "stress.db")
+            prepare(args)
+            summary = scenario(args, retries)
+        for kind, row in sorted(summary.items()):
+            latencies = row["latencies"]
+            print(f"{retries:<9}{kind:<8}{len(latencies) / args.seconds:>8.0f}{row['failed']:>10}"
+                  f"{row['lock_waits']:>10}{row['retried']:>10}{percentile(latencies, 0.5) * 1000:>9.2f}"
+                  f"{percentile(latencies, 0.99) * 1000:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""Нагрузочный тест исходящей очереди на фейковом Telegram API с лимитами
+
+Фейковый API принимает не больше --chat-limit вызовов в секунду на чат и
+--global-limit на бота, остальным отвечает 429 с retry_after. Разом ставятся:
+рассылка --bulk сообщений по чатам (низкий приоритет), затем в каждый чат
+--interactive ответов и --edits правок одного сообщения подряд.
+
+Сначала те же сообщения (без правок) отправляются напрямую из --workers
+потоков, как раньше делали обработчики: каждый ответ 429 — потерянное
+сообщение. Затем через Outbox: ничего не теряется, ответы обгоняют рассылку,
+порядок сообщений в чате сохраняется, правки склеиваются.
+
+Запуск из корня проекта:
+    python -m benchmarks.outbox_load --chats 20 --bulk 100
+"""
+
+import argparse
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+os.environ.setdefault("BOT_TOKEN", "1:fake")
+
+import telebot
+from telebot.apihelper import ApiTelegramException
+
+from benchmarks.fake_telegram import FakeTelegram
+from outbox import BULK, INTERACTIVE, Outbox
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))] * 1000 if values else 0.0
+
+
+def messages(args):
+    """[(chat_id, текст, приоритет)]: сначала рассылка, затем ответы"""
+    bulk = [(100 + n % args.chats, f"bulk {n}", BULK) for n in range(args.bulk)]
+    interactive = [(100 + chat, f"reply {chat} {n}", INTERACTIVE)
+                   for n in range(args.interactive) for chat in range(args.chats)]
+    return bulk + interactive
+
+
+def run_direct(bot, items, workers):
+    """Отправка без очереди; возвращает (отправлено, потеряно на 429)"""
+    def send(item):
+        chat_id, text, _ = item
+        try:
+            bot.send_message(chat_id, text)
+            return True
+        except ApiTelegramException as e:
+            if e.error_code != 429:
+                raise
+            return False
+
+    with ThreadPoolExecutor(workers) as pool:
+        results = list(pool.map(send, items))
+    return sum(results), len(results) - sum(results)
+
+
+def run_outbox(bot, items, args):
+    outbox = Outbox(bot, global_rate=args.global_rate, chat_rate=args.chat_rate, chat_burst=args.chat_burst,
+                    workers=args.workers).start()
+    latencies = {INTERACTIVE: [], BULK: []}
+
+    def track(future, priority, submitted):
+        future.add_done_callback(lambda _: latencies[priority].append(time.monotonic() - submitted))
+
+    started = time.monotonic()
+    for chat_id, text, priority in items:
+        track(outbox.send_message(chat_id, text, priority=priority), priority, time.monotonic())
+    for chat in range(args.chats):
+        for n in range(args.edits):
+            outbox.edit_message_text(f"edit {chat} {n}", 100 + chat, 1)
+    outbox.join()
+    elapsed = time.monotonic() - started
+    outbox.stop()
+    return outbox.stats(), latencies, elapsed
+
+
+def check_order(fake, since, chats):
+    """Ответы в каждый чат пришли в порядке отправки"""
+    received = {}
+    for _, method, params in fake.calls[since:]:
+        text = params.get("text", "")
+        if method == "sendMessage" and text.startswith("reply"):
+            received.setdefault(int(params["chat_id"]), []).append(int(text.split()[-1]))
+    return len(received) == chats and all(seq == sorted(seq) for seq in received.values())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chats", type=int, default=20)
+    parser.add_argument("--interactive", type=int, default=3, help="ответов в каждый чат")
+    parser.add_argument("--edits", type=int, default=5, help="правок одного сообщения в каждом чате")
+    parser.add_argument("--bulk", type=int, default=100, help="сообщений рассылки")
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--latency", type=float, default=0.02, help="задержка ответа API, с")
+    parser.add_argument("--chat-limit", type=int, default=3, help="лимит фейкового API на чат, вызовов/с")
+    parser.add_argument("--global-limit", type=int, default=30, help="лимит фейкового API на бота, вызовов/с")
+    parser.add_argument("--chat-rate", type=float, default=1.0)
+    parser.add_argument("--chat-burst", type=int, default=3)
+    parser.add_argument("--global-rate", type=float, default=30.0)
+    args = parser.parse_args()
+
+    fake = FakeTelegram(latency=args.latency, chat_limit=args.chat_limit, global_limit=args.global_limit).start()
+    telebot.apihelper.API_URL = fake.api_url
+    bot = telebot.TeleBot(os.environ["BOT_TOKEN"], threaded=False)
+    items = messages(args)
+    try:
+        sent, lost = run_direct(bot, items, args.workers)
+        print(f"напрямую: отправлено {sent}, потеряно на 429: {lost} из {len(items)}")
+
+        # Окно лимитов фейкового API должно освободиться перед вторым прогоном
+        time.sleep(1.5)
+        since, rejected = len(fake.calls), fake.rejected
+        stats, latencies, elapsed = run_outbox(bot, items, args)
+        print(f"очередь:  отправлено {stats['sent']}, ошибок {stats['failed']}, "
+              f"ответов 429 {fake.rejected - rejected} (повторено {stats['retried']}), "
+              f"склеено правок {stats['coalesced']} из {args.chats * args.edits}, за {elapsed:.1f} с")
+        for name, priority in (("ответы", INTERACTIVE), ("рассылка", BULK)):
+            values = latencies[priority]
+            print(f"  {name:<9} p50 {percentile(values, 0.5):7.0f} мс  p95 {percentile(values, 0.95):7.0f} мс")
+        print(f"  порядок ответов в чатах сохранен: {check_order(fake, since, args.chats)}")
+    finally:
+        fake.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""Бенчмарк постраничной выборки задач: время страницы не должно расти с числом задач
+
+Запуск из корня проекта:
+    python -m benchmarks.pagination_bench --sizes 1000 10000 100000
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+import storage
+
+
+def fill_user_tasks(user_id, count):
+    with storage.transaction() as conn:
+        conn.executemany(
+            "INSERT INTO tasks (user_id, task_text, created_at) VALUES (?, ?, datetime('2024-01-01', ?))",
+            ((user_id, f"Задача {n}", f"+{n} seconds") for n in range(count))
+        )
+
+
+def time_per_call(fn, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - started) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--page-size", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        storage.configure(os.path.join(tmp, "bench.db"))
+        storage.init_db()
+
+        print(f"{'задач':>8}{'первая стр., мс':>18}{'середина, мс':>16}{'весь список, мс':>18}")
+        for user_id, size in enumerate(args.sizes, start=1):
+            fill_user_tasks(user_id, size)
+
+            # Курсор из середины списка: keyset не должен замедляться на глубоких страницах
+            middle = storage.get_connection().execute(
+                "SELECT CAST(strftime('%s', created_at) AS INTEGER), task_id FROM tasks "
+                'WHERE user_id = ? ORDER BY created_at DESC, task_id DESC LIMIT 1 OFFSET ?',
+                (user_id, size // 2)
+            ).fetchone()
+
+            first = time_per_call(lambda: storage.get_user_tasks_page(user_id, limit=args.page_size), args.repeat)
+            deep = time_per_call(lambda: storage.get_user_tasks_page(user_id, middle, limit=args.page_size), args.repeat)
+            full = time_per_call(lambda: storage.get_user_tasks(user_id), max(1, args.repeat // 20))
+            print(f"{size:>8}{first:>18.3f}{deep:>16.3f}{full:>18.3f}")
+
+        storage.close_connection()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""Бенчмарк загрузки списка задач в Desktop-панели при 1k/10k/100k задач
+
+Для каждого размера в отдельном процессе создается окно TaskManager
+(QListView + TaskListModel + TaskItemDelegate) и замеряется время до первой
+отрисовки и прирост памяти процесса. Для сравнения тот же список строится
+старым способом — QListWidget с виджетом на каждую строку (до --legacy-max задач).
+
+Запуск из корня проекта (без дисплея):
+    QT_QPA_PLATFORM=offscreen python -m benchmarks.panel_bench --sizes 1000 10000 100000
+"""
+
+import argparse
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import storage
+from benchmarks.pagination_bench import fill_user_tasks
+
+
+def rss_mb():
+    """Текущий размер резидентной памяти процесса, МБ"""
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * resource.getpagesize() / 2 ** 20
+
+
+def legacy_list(tasks):
+    """Старый способ: QListWidget и виджет с двумя кнопками и меткой на каждую задачу"""
+    from PyQt6.QtWidgets import QHBoxLayout, QLabel, QListWidget, QListWidgetItem, QPushButton, QWidget
+
+    tasks_list = QListWidget()
+    for task in tasks:
+        widget = QWidget()
+        layout = QHBoxLayout()
+        layout.setContentsMargins(10, 5, 10, 5)
+        toggle_btn = QPushButton("✓" if task['done'] else "○")
+        toggle_btn.setFixedSize(30, 30)
+        toggle_btn.setStyleSheet("QPushButton { font-size: 16px; border: 2px solid #ccc; background-color: white; }")
+        label = QLabel(task['text'])
+        label.setWordWrap(True)
+        label.setStyleSheet("QLabel { text-decoration: none; color: black; font-size: 14px; }")
+        delete_btn = QPushButton("🗑")
+        delete_btn.setFixedSize(30, 30)
+        delete_btn.setStyleSheet("QPushButton { font-size: 14px; color: #ff4444; }")
+        layout.addWidget(toggle_btn)
+        layout.addWidget(label, 1)
+        layout.addWidget(delete_btn)
+        widget.setLayout(layout)
+        widget.setStyleSheet("QWidget { border: 1px solid #eee; border-radius: 5px; margin: 2px; }")
+        item = QListWidgetItem()
+        item.setSizeHint(widget.sizeHint())
+        tasks_list.addItem(item)
+        tasks_list.setItemWidget(item, widget)
+    return tasks_list
+
+
+def child(mode, db_path):
+    """Одно измерение в чистом процессе: печатает 'секунды мегабайты'"""
+    from PyQt6.QtWidgets import QApplication
+
+    storage.configure(db_path)
+    app = QApplication(sys.argv)
+    app.processEvents()
+    before = rss_mb()
+    started = time.perf_counter()
+    if mode == "model":
+        import admin_panel
+        window = admin_panel.TaskManager()
+        window.show()
+        # Задачи грузятся в фоновом потоке: ждем, пока первая пачка попадет в модель
+        while window.tasks_model.rowCount() == 0:
+            app.processEvents()
+            time.sleep(0.001)
+    else:
+        window = legacy_list(storage.get_user_tasks(1))
+        window.show()
+    app.processEvents()
+    elapsed = time.perf_counter() - started
+    print(f"{elapsed:.4f} {rss_mb() - before:.1f}")
+
+
+def measure(mode, db_path):
+    result = subprocess.run(
+        [sys.executable, "-m", "benchmarks.panel_bench", "--child", mode, db_path],
+        capture_output=True, text=True, check=True
+    )
+    seconds, megabytes = result.stdout.split()[-2:]
+    return float(seconds), float(megabytes)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--legacy-max", type=int, default=10000, help="до какого размера мерить старый список")
+    parser.add_argument("--child", nargs=2, metavar=("MODE", "DB"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(*args.child)
+        return
+
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    print(f"{'задач':>8}{'модель, с':>12}{'модель, МБ':>13}{'виджеты, с':>13}{'виджеты, МБ':>14}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in args.sizes:
+            db_path = os.path.join(tmp, f"panel_{size}.db")
+            storage.configure(db_path)
+            storage.init_db()
+            storage.ensure_user_exists(1, "bench")
+            fill_user_tasks(1, size)
+            storage.close_connection()
+
+            model_time, model_mem = measure("model", db_path)
+            if size <= args.legacy_max:
+                legacy_time, legacy_mem = measure("legacy", db_path)
+                legacy = f"{legacy_time:>13.3f}{legacy_mem:>14.1f}"
+            else:
+                legacy = f"{'-':>13}{'-':>14}"
+            print(f"{size:>8}{model_time:>12.3f}{model_mem:>13.1f}{legacy}")
+
+
+if __name__ == "__main__":
+    main()
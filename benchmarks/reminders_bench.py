@@ -0,0 +1,89 @@
+"""Бенчмарк планировщика напоминаний при большом числе ожидающих напоминаний
+
+В базу записывается --pending напоминаний на далекое будущее и --due напоминаний,
+наступающих в ближайшие --span секунд. Планировщик запускается как в боте;
+замеряется задержка доставки, число пробуждений и время процессора, а для
+сравнения — один "тик" наивного опроса, который просматривает всю таблицу.
+
+Запуск из корня проекта:
+    python -m benchmarks.reminders_bench --pending 100000 --due 5000 --span 5
+"""
+
+import argparse
+import os
+import tempfile
+import threading
+import time
+
+import storage
+from reminders import ReminderScheduler
+
+
+def fill(rows):
+    with storage.transaction() as conn:
+        conn.executemany('INSERT INTO tasks (user_id, task_text, remind_at) VALUES (?, ?, ?)', rows)
+
+
+def naive_tick():
+    """Опрос без индекса: каждый тик просматривает всю таблицу задач"""
+    started = time.perf_counter()
+    storage.get_connection().execute(
+        'SELECT task_id FROM tasks NOT INDEXED WHERE remind_at <= ?', (int(time.time()),)
+    ).fetchall()
+    return (time.perf_counter() - started) * 1000
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))] if values else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pending", type=int, default=100000, help="напоминаний на далекое будущее")
+    parser.add_argument("--due", type=int, default=5000, help="напоминаний, наступающих во время теста")
+    parser.add_argument("--span", type=int, default=5, help="за сколько секунд наступают --due напоминаний")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        storage.configure(os.path.join(tmp, "bench.db"))
+        storage.init_db()
+        now = int(time.time())
+        fill((n % 1000, f"Задача {n}", now + 86400 + n) for n in range(args.pending))
+        # Срочные пишутся после заполнения, чтобы они наступали уже во время работы планировщика
+        now = int(time.time())
+        fill((n % 1000, f"Срочная {n}", now + 1 + n * args.span // max(args.due, 1)) for n in range(args.due))
+
+        lags = []
+        done = threading.Event()
+
+        def send(task):
+            lags.append(time.time() - remind_at[task["id"]])
+            if len(lags) == args.due:
+                done.set()
+
+        remind_at = dict(storage.get_connection().execute(
+            'SELECT task_id, remind_at FROM tasks WHERE remind_at < ?', (int(time.time()) + 86400,)
+        ).fetchall())
+
+        scheduler = ReminderScheduler(send)
+        started = time.perf_counter()
+        cpu_started = time.process_time()
+        scheduler.start()
+        done.wait(args.span + 30)
+        elapsed = time.perf_counter() - started
+        cpu = time.process_time() - cpu_started
+        scheduler.stop()
+
+        print(f"ожидают: {storage.count_pending_reminders()}, доставлено {len(lags)} из {args.due} за {elapsed:.1f} с")
+        print(f"задержка доставки: p50 {percentile(lags, 0.5) * 1000:.0f} мс, p99 {percentile(lags, 0.99) * 1000:.0f} мс "
+              "(время напоминания хранится с точностью до секунды)")
+        print(f"пробуждений: {scheduler.wakeups}, загрузок кучи: {scheduler.reloads}, процессор: {cpu:.2f} с")
+        print(f"план выборки: {storage.explain(*storage.HOT_QUERIES['claim_due_reminders'])}")
+        print(f"наивный тик с полным просмотром: {naive_tick():.1f} мс на каждый опрос")
+
+        storage.close_connection()
+
+
+if __name__ == "__main__":
+    main()
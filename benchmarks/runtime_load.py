@@ -0,0 +1,114 @@
+"""Нагрузочный тест: sync TeleBot против AsyncTeleBot на фейковом Telegram API
+
+Пачка нажатий "Мои задачи" от разных пользователей подается в обе среды
+выполнения; фейковый API отвечает с задержкой --latency. Замеряется время,
+за которое бот обработает апдейты и его исходящая очередь опустеет (нажатия
+одного пользователя правят одно сообщение, поэтому часть правок склеивается).
+
+Запуск из корня проекта:
+    python -m benchmarks.runtime_load --updates 200 --latency 0.05
+"""
+
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+os.environ.setdefault("BOT_TOKEN", "1:fake")
+os.environ.setdefault("GENESIS_ADMIN_ID", "1")
+# Здесь сравниваются среды выполнения, а не лимиты Telegram (их проверяет outbox_load)
+os.environ.setdefault("OUTBOX_GLOBAL_RATE", "100000")
+os.environ.setdefault("OUTBOX_CHAT_RATE", "100000")
+os.environ.setdefault("OUTBOX_CHAT_BURST", "100000")
+os.environ.setdefault("OUTBOX_WORKERS", "32")
+
+import telebot
+from telebot import asyncio_helper, types
+
+import callbacks
+import storage
+from benchmarks.fake_telegram import FakeTelegram, callback_update
+
+
+def make_updates(count, users, offset=0):
+    return [
+        # Каждое нажатие — в своем сообщении: иначе кэш экранов пропустил бы повторные правки
+        types.Update.de_json(callback_update(offset + n, 100 + n % users, callbacks.encode(callbacks.MY_TASKS),
+                                             message_id=offset + n))
+        for n in range(count)
+    ]
+
+
+def handled(outbox):
+    """Вызовы, поставленные в очередь, и правки, пропущенные кэшем экранов"""
+    return outbox.submitted + (outbox.render_cache.hits if outbox.render_cache else 0)
+
+
+def drain(outbox, count, timeout=600):
+    """Ожидание, пока обработчики выполнят count вызовов и очередь их отправит"""
+    deadline = time.monotonic() + timeout
+    while handled(outbox) < count and time.monotonic() < deadline:
+        time.sleep(0.005)
+    outbox.join(max(0.0, deadline - time.monotonic()))
+
+
+def run_sync(fake, updates):
+    import tgbot
+    started = time.perf_counter()
+    before = handled(tgbot.outbox)
+    tgbot.bot.process_new_updates(updates)
+    drain(tgbot.outbox, before + len(updates))
+    return time.perf_counter() - started
+
+
+def run_async(fake, updates):
+    import tgbot_async
+
+    async def main():
+        try:
+            await tgbot_async.bot.process_new_updates(updates)
+        finally:
+            # Сессия aiohttp создается при первом запросе; ответы же уходят через исходящую очередь
+            if asyncio_helper.session_manager.session:
+                await asyncio_helper.session_manager.session.close()
+
+    started = time.perf_counter()
+    before = handled(tgbot_async.outbox)
+    asyncio.run(main())
+    drain(tgbot_async.outbox, before + len(updates))
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--updates", type=int, default=200)
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=0.05, help="задержка ответа API, с")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        storage.configure(os.path.join(tmp, "bench.db"))
+        storage.init_db()
+        for n in range(args.users):
+            storage.ensure_user_exists(100 + n)
+            for k in range(20):
+                storage.add_user_task(100 + n, f"Задача {k}")
+
+        fake = FakeTelegram(latency=args.latency).start()
+        telebot.apihelper.API_URL = fake.api_url
+        asyncio_helper.API_URL = fake.api_url
+        try:
+            sync_time = run_sync(fake, make_updates(args.updates, args.users))
+            async_time = run_async(fake, make_updates(args.updates, args.users, offset=args.updates))
+        finally:
+            fake.stop()
+
+        print(f"апдейтов: {args.updates}, задержка API: {args.latency * 1000:.0f} мс")
+        print(f"sync:  {sync_time:.2f} с, {args.updates / sync_time:.1f} апдейтов/с")
+        print(f"async: {async_time:.2f} с, {args.updates / async_time:.1f} апдейтов/с")
+        print(f"выигрыш: {sync_time / async_time:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""Бенчмарк поиска по задачам: FTS5 против LIKE по мере роста таблицы
+
+Задачи распределяются между --users пользователями; ищется частое и редкое
+слово в задачах одного пользователя. Время FTS5 должно зависеть от числа
+найденных задач пользователя, а не от размера всей таблицы.
+
+Запуск из корня проекта:
+    python -m benchmarks.search_bench --sizes 100000 1000000
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import time
+
+import storage
+
+WORDS = ["купить", "молоко", "позвонить", "отчет", "встреча", "проект", "письмо", "оплатить",
+         "заказ", "документы", "клиент", "ремонт", "билеты", "врач", "подарок", "презентация"]
+
+
+def fill_tasks(count, users, start=0):
+    rng = random.Random(start)
+    with storage.transaction() as conn:
+        conn.executemany(
+            'INSERT INTO tasks (user_id, task_text) VALUES (?, ?)',
+            ((n % users, " ".join(rng.choices(WORDS, k=4)) + f" #{n}") for n in range(start, start + count))
+        )
+
+
+def time_per_call(fn, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - started) / repeat * 1000
+
+
+def like_search(user_id, word, limit):
+    return storage.get_connection().execute(
+        'SELECT task_id, task_text FROM tasks WHERE user_id = ? AND task_text LIKE ? LIMIT ?',
+        (user_id, f"%{word}%", limit)
+    ).fetchall()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100000, 1000000])
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        storage.configure(os.path.join(tmp, "bench.db"))
+        storage.init_db()
+
+        print(f"{'задач':>9}{'FTS частое, мс':>17}{'FTS редкое, мс':>17}{'LIKE, мс':>11}{'заполнение, с':>16}")
+        filled = 0
+        for size in sorted(args.sizes):
+            started = time.perf_counter()
+            fill_tasks(size - filled, args.users, start=filled)
+            fill_time = time.perf_counter() - started
+            filled = size
+
+            common = time_per_call(lambda: storage.search_user_tasks(7, "купить", limit=10), args.repeat)
+            rare = time_per_call(lambda: storage.search_user_tasks(7, f"#{size - args.users + 7}", limit=10), args.repeat)
+            like = time_per_call(lambda: like_search(7, "купить", 10), args.repeat)
+            print(f"{size:>9}{common:>17.3f}{rare:>17.3f}{like:>11.3f}{fill_time:>16.1f}")
+
+        storage.close_connection()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""Микробенчмарк: соединение на каждый вызов против долгоживущего соединения storage
+
+Запуск из корня проекта:
+    python -m benchmarks.storage_bench --ops 5000
+"""
+
+import argparse
+import os
+import sqlite3
+import tempfile
+import time
+
+import storage
+
+
+def legacy_is_admin(db_name, user_id):
+    """Старый шаблон: connect + запрос + close"""
+    conn = sqlite3.connect(db_name)
+    cursor = conn.cursor()
+    cursor.execute('SELECT 1 FROM admins WHERE user_id = ?', (user_id,))
+    result = cursor.fetchone()
+    conn.close()
+    return result is not None
+
+
+def legacy_get_user_tasks(db_name, user_id):
+    conn = sqlite3.connect(db_name)
+    cursor = conn.cursor()
+    cursor.execute(
+        'SELECT task_id, task_text, is_done FROM tasks WHERE user_id = ? ORDER BY created_at DESC',
+        (user_id,)
+    )
+    tasks = cursor.fetchall()
+    conn.close()
+    return [{"id": task[0], "text": task[1], "done": bool(task[2])} for task in tasks]
+
+
+def legacy_add_user_task(db_name, user_id, task_text):
+    conn = sqlite3.connect(db_name)
+    cursor = conn.cursor()
+    cursor.execute('INSERT INTO tasks (user_id, task_text) VALUES (?, ?)', (user_id, task_text))
+    task_id = cursor.lastrowid
+    conn.commit()
+    conn.close()
+    return task_id
+
+
+def measure(fn, ops):
+    started = time.perf_counter()
+    for i in range(ops):
+        fn(i)
+    elapsed = time.perf_counter() - started
+    return ops / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--ops", type=int, default=5000, help="операций на сценарий")
+    parser.add_argument("--users", type=int, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_name = os.path.join(tmp, "bench.db")
+        storage.configure(db_name)
+        storage.init_db()
+        for user_id in range(args.users):
+            storage.ensure_user_exists(user_id)
+            for n in range(5):
+                storage.add_user_task(user_id, f"Задача {n}")
+
+        scenarios = [
+            ("is_admin",
+             lambda i: legacy_is_admin(db_name, i % args.users),
+             lambda i: storage.is_admin(i % args.users)),
+            ("get_user_tasks",
+             lambda i: legacy_get_user_tasks(db_name, i % args.users),
+             lambda i: storage.get_user_tasks(i % args.users)),
+            ("add_user_task",
+             lambda i: legacy_add_user_task(db_name, i % args.users, "bench"),
+             lambda i: storage.add_user_task(i % args.users, "bench")),
+        ]
+
+        print(f"{'сценарий':<16}{'connect/вызов':>16}{'storage':>12}{'ускорение':>12}")
+        for name, legacy, pooled in scenarios:
+            legacy_rate = measure(legacy, args.ops)
+            pooled_rate = measure(pooled, args.ops)
+            print(f"{name:<16}{legacy_rate:>14.0f}/s{pooled_rate:>10.0f}/s{pooled_rate / legacy_rate:>11.1f}x")
+
+        storage.close_connection()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""Сквозная проверка webhook: POST записанных обновлений на localhost
+
+По умолчанию поднимает все локально: фейковый Telegram API, временную базу
+и webhook-сервер tgbot.py, затем отправляет обновления из файла и печатает
+коды ответов и вызовы, которые бот сделал в Telegram.
+
+С --url отправляет обновления в уже запущенный бот (python tgbot.py --mode webhook).
+
+Запуск из корня проекта:
+    python -m benchmarks.webhook_replay
+    python -m benchmarks.webhook_replay --url http://127.0.0.1:8443/webhook --secret <WEBHOOK_SECRET>
+"""
+
+import argparse
+import json
+import os
+import tempfile
+import urllib.error
+import urllib.request
+
+RECORDED_UPDATES = os.path.join(os.path.dirname(__file__), "recorded_updates.json")
+
+
+def post_update(url, secret, update):
+    request = urllib.request.Request(
+        url,
+        data=json.dumps(update).encode(),
+        headers={"Content-Type": "application/json", "X-Telegram-Bot-Api-Secret-Token": secret},
+        method="POST"
+    )
+    try:
+        with urllib.request.urlopen(request, timeout=10) as response:
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+
+
+def replay(url, secret, updates):
+    statuses = [post_update(url, secret, update) for update in updates]
+    for update, status in zip(updates, statuses):
+        print(f"update {update['update_id']}: HTTP {status}")
+    return statuses
+
+
+def run_local(updates):
+    secret = "replay-secret"
+    os.environ.setdefault("BOT_TOKEN", "1:fake")
+    os.environ.setdefault("GENESIS_ADMIN_ID", "1")
+    os.environ["WEBHOOK_SECRET"] = secret
+    os.environ["WEBHOOK_PORT"] = "0"
+
+    import telebot
+    import storage
+    from benchmarks.fake_telegram import FakeTelegram
+
+    with tempfile.TemporaryDirectory() as tmp:
+        storage.configure(os.path.join(tmp, "replay.db"))
+        storage.init_db()
+
+        fake = FakeTelegram().start()
+        telebot.apihelper.API_URL = fake.api_url
+
+        import tgbot
+        server = tgbot.make_webhook_server().start()
+        host, port = server.address
+        url = f"http://{host}:{port}{tgbot.WEBHOOK_PATH}"
+        try:
+            statuses = replay(url, secret, updates)
+            rejected = post_update(url, "wrong-secret", updates[0])
+            print(f"неверный секрет: HTTP {rejected}")
+            server.join()
+            # Ответы уходят через исходящую очередь бота: ждем, пока она опустеет
+            tgbot.outbox.join(timeout=30)
+        finally:
+            server.stop()
+            fake.stop()
+
+        print("\nВызовы Telegram API:")
+        for _, method, params in fake.calls:
+            print(f"  {method} chat={params.get('chat_id')} {params.get('text', '')[:50]!r}")
+        print(f"\nСтатистика webhook: {server.stats()}")
+        print(f"Статистика очереди: {tgbot.outbox.stats()}")
+        return all(status == 200 for status in statuses) and rejected == 403
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--updates", default=RECORDED_UPDATES, help="JSON-файл со списком обновлений")
+    parser.add_argument("--url", help="адрес запущенного webhook")
+    parser.add_argument("--secret", default="", help="секретный токен для --url")
+    args = parser.parse_args()
+
+    with open(args.updates, encoding="utf-8") as f:
+        updates = json.load(f)
+
+    if args.url:
+        ok = all(status == 200 for status in replay(args.url, args.secret, updates))
+    else:
+        ok = run_local(updates)
+    raise SystemExit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
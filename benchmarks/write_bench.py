@@ -0,0 +1,89 @@
+"""Бенчмарк групповой записи: каждая запись своей транзакцией против пачек WriteCoalescer
+
+--threads потоков имитируют обработчики бота: каждый делает --ops операций
+"/start + новая задача + отметка выполненной". Замеряются пропускная
+способность, задержка одной операции (до commit) и число транзакций. С
+--synchronous FULL каждая транзакция делает fsync, как на сервере без
+батарейки в контроллере диска, — там разница заметнее всего.
+
+Запуск из корня проекта:
+    python -m benchmarks.write_bench --threads 16 --ops 200
+"""
+
+import argparse
+import os
+import tempfile
+import threading
+import time
+
+import storage
+from writer import WriteCoalescer
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))] if values else 0.0
+
+
+def run(threads, ops, users):
+    latencies = []
+    lock = threading.Lock()
+
+    def worker(n):
+        own = []
+        for k in range(ops):
+            user_id = 1000 + (n * ops + k) % users
+            started = time.perf_counter()
+            storage.ensure_user_exists(user_id, f"user{user_id}")
+            task_id = storage.add_user_task(user_id, f"Задача {n}-{k}")
+            storage.update_task_status(task_id, True)
+            own.append(time.perf_counter() - started)
+        storage.close_connection()
+        with lock:
+            latencies.extend(own)
+
+    started = time.perf_counter()
+    pool = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    return time.perf_counter() - started, latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--ops", type=int, default=200, help="операций на поток")
+    parser.add_argument("--users", type=int, default=500, help="разных пользователей")
+    parser.add_argument("--window-ms", type=float, default=0.0, help="окно сбора пачки")
+    parser.add_argument("--synchronous", choices=["NORMAL", "FULL"], default="NORMAL")
+    args = parser.parse_args()
+    storage.PRAGMAS = storage.PRAGMAS + (f"PRAGMA synchronous = {args.synchronous}",)
+
+    print(f"потоков {args.threads}, операций {args.threads * args.ops} "
+          f"(3 записи в каждой), synchronous = {args.synchronous}")
+    print(f"{'режим':<10}{'оп/с':>9}{'p50, мс':>10}{'p99, мс':>10}{'транзакций':>12}")
+    for mode in ("direct", "batch"):
+        with tempfile.TemporaryDirectory() as tmp:
+            storage.configure(os.path.join(tmp, "bench.db"))
+            storage.init_db()
+            writer = None
+            if mode == "batch":
+                writer = WriteCoalescer(args.window_ms / 1000).start()
+                storage.set_writer(writer)
+            elapsed, latencies = run(args.threads, args.ops, args.users)
+            if writer is not None:
+                writer.stop()
+                storage.set_writer(None)
+                transactions = writer.batches
+            else:
+                # ensure_user_exists пишет только для новых пользователей
+                transactions = 2 * len(latencies) + min(args.users, len(latencies))
+            print(f"{mode:<10}{len(latencies) / elapsed:>9.0f}{percentile(latencies, 0.5) * 1000:>10.2f}"
+                  f"{percentile(latencies, 0.99) * 1000:>10.2f}{transactions:>12}")
+            storage.close_connection()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""Кэши внутри процесса: роли пользователей, мемоизация по ключу и отправленные экраны"""
+
+import threading
+import time
+from collections import OrderedDict
+
+
+class RoleCache:
+    """Кэш флага администратора с TTL и сбросом по счетчику изменений в БД
+
+    loader(user_id) читает флаг из базы, version_loader() — счетчик изменений
+    таблицы admins. Счетчик перечитывается не чаще раза в check_interval секунд;
+    если он изменился (например, админа добавили из Desktop-панели), кэш
+    сбрасывается целиком.
+    """
+
+    def __init__(self, loader, version_loader, ttl=300.0, check_interval=2.0, clock=time.monotonic):
+        self.loader = loader
+        self.version_loader = version_loader
+        self.ttl = ttl
+        self.check_interval = check_interval
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._entries = {}  # {user_id: (value, expires_at)}
+        self._version = None
+        self._checked_at = None
+        self._generation = 0  # растет при каждом сбросе, чтобы не сохранить устаревшее значение
+        self._lock = threading.Lock()
+
+    def _check_version(self, now):
+        if self._checked_at is not None and now - self._checked_at < self.check_interval:
+            return
+        version = self.version_loader()
+        if version != self._version:
+            if self._version is not None:
+                self._entries.clear()
+                self._generation += 1
+                self.invalidations += 1
+            self._version = version
+        self._checked_at = now
+
+    def get(self, user_id):
+        now = self.clock()
+        with self._lock:
+            self._check_version(now)
+            entry = self._entries.get(user_id)
+            if entry is not None and entry[1] > now:
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+            generation = self._generation
+
+        value = self.loader(user_id)
+        with self._lock:
+            if generation == self._generation:
+                self._entries[user_id] = (value, now + self.ttl)
+        return value
+
+    def invalidate(self, user_id=None):
+        """Сброс одной записи или всего кэша"""
+        with self._lock:
+            if user_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(user_id, None)
+            self._generation += 1
+            self.invalidations += 1
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses,
+                    "invalidations": self.invalidations, "size": len(self._entries)}
+
+
+class Memo:
+    """Значения, которые один раз строятся factory(key) и дальше переиспользуются"""
+
+    def __init__(self, factory):
+        self.factory = factory
+        self.hits = 0
+        self.misses = 0
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key in self._values:
+                self.hits += 1
+                return self._values[key]
+            self.misses += 1
+            value = self._values[key] = self.factory(key)
+            return value
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "size": len(self._values)}
+
+
+class RenderCache:
+    """Что последним отправлено в каждое сообщение бота: {(chat_id, message_id): хэш}
+
+    Хэш считается по тексту, клавиатуре и прочим параметрам правки. Правка с тем
+    же хэшем, что уже отправлен, не нужна: Telegram ответил бы "message is not
+    modified". При переполнении забываются сообщения, которые дольше всех не правились.
+    """
+
+    def __init__(self, max_size=10000):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.evicted = 0
+        self._digests = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def digest(text, reply_markup=None, **kwargs):
+        markup = reply_markup.to_json() if hasattr(reply_markup, "to_json") else reply_markup
+        return hash((text, markup, tuple(sorted((name, repr(value)) for name, value in kwargs.items()))))
+
+    def update(self, key, digest):
+        """Запоминает новый хэш; False, если он совпал с отправленным (правку можно пропустить)"""
+        with self._lock:
+            if self._digests.get(key) == digest:
+                self._digests.move_to_end(key)
+                self.hits += 1
+                return False
+            self.misses += 1
+            self._digests[key] = digest
+            self._digests.move_to_end(key)
+            while len(self._digests) > self.max_size:
+                self._digests.popitem(last=False)
+                self.evicted += 1
+            return True
+
+    def forget(self, key, digest=None):
+        """Правка не дошла: сообщение в Telegram осталось прежним"""
+        with self._lock:
+            if digest is None or self._digests.get(key) == digest:
+                self._digests.pop(key, None)
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {"hits": self.hits, "misses": self.misses, "evicted": self.evicted,
+                    "size": len(self._digests), "hit_ratio": self.hits / total if total else 0.0}
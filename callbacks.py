@@ -0,0 +1,152 @@
+"""Компактный формат callback_data и маршрутизатор нажатий inline-кнопок
+
+callback_data = версия + код действия [+ ":" + аргументы через "." в base36],
+например "1m" (мои задачи) или "1t:2s" (задача 100). Разбор одного нажатия —
+это проверка версии, поиск действия в словаре и разбор нескольких чисел;
+кнопки старого формата или другой версии отбрасываются без обращения к БД.
+"""
+
+import re
+
+VERSION = "1"
+
+# Telegram ограничивает callback_data 64 байтами
+MAX_LENGTH = 64
+
+MY_TASKS = "m"
+TASKS_NEXT = "n"            # (created_at, task_id) курсора
+TASKS_PREV = "p"            # (created_at, task_id) курсора
+TASK = "t"                  # task_id
+DONE = "d"                  # task_id
+DELETE = "x"                # task_id
+ADD_TASK = "a"
+BACK_MAIN = "b"
+ADMIN_PANEL = "A"
+USERS_NEXT = "N"            # user_id курсора
+USERS_PREV = "P"            # user_id курсора
+ADMIN_VIEW = "v"            # user_id
+GENESIS_ADD_ADMIN = "g"
+SEARCH = "s"
+SEARCH_PAGE = "S"           # смещение страницы результатов
+REMIND = "r"                # task_id
+REMIND_SET = "R"            # (task_id, через сколько минут; 0 — убрать напоминание)
+DUE = "u"                   # task_id
+
+# Число аргументов каждого действия
+ARITY = {
+    MY_TASKS: 0,
+    TASKS_NEXT: 2,
+    TASKS_PREV: 2,
+    TASK: 1,
+    DONE: 1,
+    DELETE: 1,
+    ADD_TASK: 0,
+    BACK_MAIN: 0,
+    ADMIN_PANEL: 0,
+    USERS_NEXT: 1,
+    USERS_PREV: 1,
+    ADMIN_VIEW: 1,
+    GENESIS_ADD_ADMIN: 0,
+    SEARCH: 0,
+    SEARCH_PAGE: 1,
+    REMIND: 1,
+    REMIND_SET: 2,
+    DUE: 1,
+}
+
+# Наименьшее допустимое значение каждого аргумента: id задач и пользователей положительны,
+# смещение страницы поиска и минуты напоминания могут быть нулем. Не указанные действия — только id
+MIN_ARGS = {
+    TASKS_NEXT: (0, 1),
+    TASKS_PREV: (0, 1),
+    SEARCH_PAGE: (0,),
+    REMIND_SET: (1, 0),
+}
+
+# Больше не поместится в INTEGER SQLite: такой аргумент подделан
+MAX_ARG = 2 ** 63 - 1
+
+_ARGS_RE = re.compile(r"-?[0-9a-z]+(?:\.-?[0-9a-z]+)*")
+_DIGITS = "0123456789abcdefghijklmnopqrstuvwxyz"
+
+
+def to_base36(number):
+    if number < 0:
+        return "-" + to_base36(-number)
+    if number < 36:
+        return _DIGITS[number]
+    digits = []
+    while number:
+        number, rest = divmod(number, 36)
+        digits.append(_DIGITS[rest])
+    return "".join(reversed(digits))
+
+
+def encode(action, *args):
+    """callback_data для действия с целочисленными аргументами"""
+    if len(args) != ARITY[action]:
+        raise ValueError(f"Действие {action!r} принимает {ARITY[action]} аргументов")
+    data = VERSION + action
+    if args:
+        data += ":" + ".".join(to_base36(int(arg)) for arg in args)
+    if len(data.encode()) > MAX_LENGTH:
+        raise ValueError(f"callback_data длиннее {MAX_LENGTH} байт: {data}")
+    return data
+
+
+def decode(data):
+    """(действие, аргументы) или None для неверных и устаревших данных"""
+    if not data or len(data) > MAX_LENGTH or data[0] != VERSION or len(data) < 2:
+        return None
+    action = data[1]
+    arity = ARITY.get(action)
+    if arity is None:
+        return None
+    if arity == 0:
+        return (action, ()) if len(data) == 2 else None
+    if data[2:3] != ":" or not _ARGS_RE.fullmatch(data, 3):
+        return None
+    args = tuple(int(part, 36) for part in data[3:].split("."))
+    if len(args) != arity:
+        return None
+    minimums = MIN_ARGS.get(action, (1,) * arity)
+    if any(arg < low or arg > MAX_ARG for arg, low in zip(args, minimums)):
+        return None
+    return action, args
+
+
+class CallbackRouter:
+    """Диспетчер нажатий по словарю действие -> обработчик
+
+    Обработчик вызывается как handler(call, *args). Для неразобранных данных
+    вызывается on_invalid(call). Обработчики могут быть и корутинами — тогда
+    dispatch возвращает корутину, которую ждет вызывающий.
+    """
+
+    def __init__(self, on_invalid):
+        self.on_invalid = on_invalid
+        self.handlers = {}
+        self.dispatched = 0
+        self.rejected = 0
+
+    def route(self, action):
+        """Декоратор регистрации обработчика действия"""
+        if action not in ARITY:
+            raise ValueError(f"Неизвестное действие {action!r}")
+
+        def decorator(handler):
+            self.handlers[action] = handler
+            return handler
+        return decorator
+
+    def dispatch(self, call):
+        decoded = decode(call.data)
+        handler = self.handlers.get(decoded[0]) if decoded else None
+        if handler is None:
+            self.rejected += 1
+            return self.on_invalid(call)
+        self.dispatched += 1
+        return handler(call, *decoded[1])
+
+    def stats(self):
+        return {"dispatched": self.dispatched, "rejected": self.rejected}
@@ -0,0 +1,83 @@
+"""Очистка журнала изменений по расписанию
+
+Триггеры пишут в таблицу changes каждое изменение задач, пользователей и
+админов, а Desktop-панель читает из нее только новые записи. Без очистки
+журнал растет вместе со всей историей записей, поэтому процесс бота раз в
+interval секунд удаляет записи старше retention секунд. Очистка идет через
+поток записи вместе с остальными записями бота; несколько процессов бота
+могут чистить журнал одновременно — удаление по границе seq не конфликтует.
+"""
+
+import threading
+import time
+
+import storage
+
+
+class ChangeLogCompactor:
+    """Фоновый поток, удаляющий старые записи журнала изменений раз в interval секунд"""
+
+    # Пауза после неудачной очистки перед новой попыткой
+    RETRY_DELAY = 60.0
+
+    def __init__(self, interval, retention, clock=time.monotonic):
+        self.interval = interval
+        self.retention = retention
+        self.clock = clock
+        self.runs = 0
+        self.failed = 0
+        self.deleted = 0
+        self.last_seconds = 0.0
+        self._cond = threading.Condition()
+        self._stopped = False
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="changes-compact", daemon=True)
+        self._thread.start()
+        return self
+
+    def _wait(self, until):
+        """Ожидание момента until; False при остановке"""
+        with self._cond:
+            while not self._stopped:
+                remaining = until - self.clock()
+                if remaining <= 0:
+                    return True
+                self._cond.wait(remaining)
+        return False
+
+    def run_once(self):
+        started = time.perf_counter()
+        deleted = storage.compact_changes(self.retention)
+        with self._cond:
+            self.runs += 1
+            self.deleted += deleted
+            self.last_seconds = time.perf_counter() - started
+        return deleted
+
+    def _run(self):
+        # Первая очистка сразу: частые перезапуски бота не должны откладывать ее бесконечно
+        next_at = self.clock()
+        while self._wait(next_at):
+            try:
+                self.run_once()
+                next_at = self.clock() + self.interval
+            except Exception as e:
+                print(f"Ошибка очистки журнала изменений: {e}")
+                with self._cond:
+                    self.failed += 1
+                next_at = self.clock() + self.RETRY_DELAY
+        storage.close_connection()
+
+    def stats(self):
+        with self._cond:
+            return {"runs": self.runs, "failed": self.failed, "deleted": self.deleted,
+                    "last_seconds": self.last_seconds}
+
+    def stop(self, timeout=5.0):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
@@ -0,0 +1,98 @@
+"""Настройки Telegram бота из переменных окружения и файла .env"""
+
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+BOT_TOKEN = os.getenv("BOT_TOKEN")
+GENESIS_ADMIN_ID = int(os.getenv("GENESIS_ADMIN_ID"))
+
+if not all([BOT_TOKEN, GENESIS_ADMIN_ID]):
+    raise ValueError("Не все необходимые переменные окружения установлены в .env файле")
+
+# Размер страницы: Telegram ограничивает размер клавиатуры, лишние строки не выбираем
+TASKS_PAGE_SIZE = 10
+USERS_PAGE_SIZE = 10
+
+# Сколько задач показывать в admin_view сообщениями; больше — выгрузка файлом (csv или txt)
+ADMIN_VIEW_DOCUMENT_THRESHOLD = int(os.getenv("ADMIN_VIEW_DOCUMENT_THRESHOLD", "200"))
+ADMIN_VIEW_DOCUMENT_FORMAT = os.getenv("ADMIN_VIEW_DOCUMENT_FORMAT", "csv")
+
+# Сколько секунд помнить роль пользователя (изменения из Desktop-панели видны через ~2 с)
+ROLE_CACHE_TTL = float(os.getenv("ROLE_CACHE_TTL", "300"))
+
+# Среда выполнения бота: sync (TeleBot) или async (AsyncTeleBot)
+BOT_RUNTIME = os.getenv("BOT_RUNTIME", "sync")
+
+# Потоки для запросов к SQLite в async-режиме и предел ожидающих запросов
+DB_WORKERS = int(os.getenv("DB_WORKERS", "4"))
+DB_MAX_PENDING = int(os.getenv("DB_MAX_PENDING", "64"))
+
+# Способ получения обновлений: polling или webhook
+BOT_MODE = os.getenv("BOT_MODE", "polling")
+
+# Webhook: публичный адрес (регистрируется в Telegram, если задан), секрет и локальный сервер
+WEBHOOK_URL = os.getenv("WEBHOOK_URL", "")
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")
+WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "127.0.0.1")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8443"))
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/webhook")
+WEBHOOK_WORKERS = int(os.getenv("WEBHOOK_WORKERS", "4"))
+WEBHOOK_QUEUE_SIZE = int(os.getenv("WEBHOOK_QUEUE_SIZE", "100"))
+
+# Хранилище состояний диалога: memory (в процессе) или sqlite (переживает перезапуск,
+# общее для нескольких процессов бота); состояние забывается через STATE_TTL секунд
+STATE_STORE = os.getenv("STATE_STORE", "memory")
+STATE_TTL = float(os.getenv("STATE_TTL", "3600"))
+STATE_MAX_SIZE = int(os.getenv("STATE_MAX_SIZE", "10000"))
+
+# Исходящая очередь: лимиты Telegram (вызовов в секунду на бота и на чат, запас подряд
+# для чата), потоки отправки и повторы после сетевых ошибок
+OUTBOX_GLOBAL_RATE = float(os.getenv("OUTBOX_GLOBAL_RATE", "30"))
+OUTBOX_CHAT_RATE = float(os.getenv("OUTBOX_CHAT_RATE", "1"))
+OUTBOX_CHAT_BURST = int(os.getenv("OUTBOX_CHAT_BURST", "3"))
+OUTBOX_WORKERS = int(os.getenv("OUTBOX_WORKERS", "8"))
+OUTBOX_MAX_RETRIES = int(os.getenv("OUTBOX_MAX_RETRIES", "3"))
+
+# Сколько сообщений бота помнить, чтобы не отправлять правки, которые ничего не меняют
+RENDER_CACHE_SIZE = int(os.getenv("RENDER_CACHE_SIZE", "10000"))
+
+# Часовой пояс пользователей бота (часы от UTC): в нем вводятся и показываются сроки задач
+TIMEZONE_OFFSET = float(os.getenv("TIMEZONE_OFFSET", "0"))
+
+# Метрики Prometheus на локальном адресе (GET /metrics); порт 0 — сервер метрик не запускается
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+
+# Профилирование по /profile или SIGUSR1: период снятия стеков (секунды) и каталог отчетов
+PROFILE_INTERVAL = float(os.getenv("PROFILE_INTERVAL", "0.005"))
+PROFILE_DIR = os.getenv("PROFILE_DIR", ".")
+
+# Запись в базу: batch — записи обработчиков коммитятся пачками одной транзакцией в отдельном
+# потоке (все, что накопилось за время предыдущего commit, плюс окно DB_WRITE_WINDOW_MS мс,
+# не больше DB_WRITE_MAX_BATCH), direct — каждая запись сразу своей транзакцией
+DB_WRITE_MODE = os.getenv("DB_WRITE_MODE", "batch")
+DB_WRITE_WINDOW_MS = float(os.getenv("DB_WRITE_WINDOW_MS", "0"))
+DB_WRITE_MAX_BATCH = int(os.getenv("DB_WRITE_MAX_BATCH", "500"))
+
+# Занятая база (бот и Desktop-панель пишут в один файл): сколько ждать блокировку записи, сколько
+# раз повторить транзакцию после "database is locked", пауза перед первым повтором и доля повторов
+# от числа транзакций, больше которой повторять не стоит
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+SQLITE_LOCK_RETRIES = int(os.getenv("SQLITE_LOCK_RETRIES", "3"))
+SQLITE_RETRY_DELAY_MS = float(os.getenv("SQLITE_RETRY_DELAY_MS", "50"))
+SQLITE_RETRY_BUDGET = float(os.getenv("SQLITE_RETRY_BUDGET", "0.2"))
+
+# Резервные копии базы из процесса бота: каталог снимков, как часто (часы, 0 — выключено),
+# сколько последних хранить, сколько страниц копировать за шаг и пауза между шагами (мс)
+BACKUP_DIR = os.getenv("BACKUP_DIR", "backups")
+BACKUP_INTERVAL_HOURS = float(os.getenv("BACKUP_INTERVAL_HOURS", "0"))
+BACKUP_KEEP = int(os.getenv("BACKUP_KEEP", "7"))
+BACKUP_STEP_PAGES = int(os.getenv("BACKUP_STEP_PAGES", "128"))
+BACKUP_STEP_PAUSE_MS = float(os.getenv("BACKUP_STEP_PAUSE_MS", "20"))
+
+# Очистка журнала изменений (его читает Desktop-панель) из процесса бота: как часто (минуты,
+# 0 — выключена) и сколько часов хранить записи
+CHANGES_COMPACT_INTERVAL_MINUTES = float(os.getenv("CHANGES_COMPACT_INTERVAL_MINUTES", "60"))
+CHANGES_RETENTION_HOURS = float(os.getenv("CHANGES_RETENTION_HOURS", "168"))
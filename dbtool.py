@@ -0,0 +1,152 @@
+"""Обслуживание базы данных из командной строки
+
+    python dbtool.py migrate        # применить недостающие миграции
+    python dbtool.py check-plans    # проверить, что горячие запросы идут по индексам
+    python dbtool.py compact-changes --retention-hours 168   # очистить старый журнал изменений
+    python dbtool.py verify-stats   # сверить user_task_stats с таблицей tasks
+    python dbtool.py rebuild-stats  # пересчитать user_task_stats заново
+    python dbtool.py backup --dir backups --keep 7   # снимок работающей базы и ротация
+    python dbtool.py list-backups   # снимки в каталоге
+    python dbtool.py verify-backup backups/tasks-20260101-030000.db   # проверить снимок
+    python dbtool.py restore backups/tasks-20260101-030000.db   # восстановить базу (бот остановлен)
+"""
+
+import argparse
+import os
+import sys
+
+import backup
+import migrations
+import storage
+
+
+def cmd_migrate(args):
+    applied = storage.init_db()
+    for version, description in applied:
+        print(f"Применена миграция {version}: {description}")
+    print(f"Версия схемы: {migrations.get_version(storage.get_connection())}")
+    return 0
+
+
+def cmd_check_plans(args):
+    storage.init_db()
+    problems = storage.find_slow_plans()
+    for name, detail in problems:
+        print(f"{name}: {detail}")
+    if problems:
+        print("Обнаружены запросы без индекса")
+        return 1
+    print("Все горячие запросы используют индексы")
+    return 0
+
+
+def cmd_compact_changes(args):
+    storage.init_db()
+    deleted = storage.compact_changes(args.retention_hours * 3600)
+    print(f"Удалено записей журнала изменений: {deleted}, последний seq: {storage.get_last_change_seq()}")
+    return 0
+
+
+def cmd_verify_stats(args):
+    storage.init_db()
+    mismatches = storage.verify_user_task_stats()
+    for user_id, stored, actual in mismatches:
+        print(f"Пользователь {user_id}: в user_task_stats {stored}, по задачам {actual}")
+    if mismatches:
+        print("Счетчики расходятся с задачами, выполните rebuild-stats")
+        return 1
+    print("Счетчики задач совпадают")
+    return 0
+
+
+def cmd_rebuild_stats(args):
+    storage.init_db()
+    users = storage.rebuild_user_task_stats()
+    print(f"Счетчики пересчитаны для пользователей: {users}")
+    return 0
+
+
+def cmd_backup(args):
+    summary = backup.backup(args.dir, args.keep, step_pages=args.step_pages, step_pause=args.step_pause_ms / 1000)
+    print(f"Снимок {summary['path']}: {summary['bytes'] // 1024} КБ, {summary['pages']} страниц "
+          f"за {summary['steps']} шагов, {summary['seconds']:.2f} с")
+    for path in summary["removed"]:
+        print(f"Удален старый снимок {path}")
+    return 0
+
+
+def cmd_list_backups(args):
+    snapshots = backup.list_snapshots(args.dir) + backup.list_snapshots(args.dir, backup.SAFETY_PREFIX)
+    for path in snapshots:
+        print(f"{path}  {os.path.getsize(path) // 1024} КБ")
+    if not snapshots:
+        print(f"В {args.dir} нет снимков")
+    return 0
+
+
+def cmd_verify_backup(args):
+    problems = backup.verify_snapshot(args.snapshot)
+    for problem in problems:
+        print(problem)
+    if problems:
+        print("Снимок поврежден")
+        return 1
+    print("Снимок цел")
+    return 0
+
+
+def cmd_restore(args):
+    safety = os.path.exists(args.db) and not args.no_safety_backup
+    if safety:
+        # Текущая база тоже сохраняется: восстановление не того снимка можно откатить. Копия
+        # называется pre-restore-*, поэтому ротация плановых снимков ее не трогает
+        os.makedirs(args.dir, exist_ok=True)
+        summary = backup.create_snapshot(backup.snapshot_path(args.dir, prefix=backup.SAFETY_PREFIX))
+        print(f"Текущая база сохранена в {summary['path']}")
+    summary = backup.restore(args.snapshot)
+    print(f"База {args.db} восстановлена из {args.snapshot}: {summary['pages']} страниц")
+    if safety:
+        # Только после восстановления: снимок, из которого восстанавливали, мог быть старой копией pre-restore
+        for path in backup.rotate(args.dir, args.keep, backup.SAFETY_PREFIX):
+            print(f"Удалена старая копия {path}")
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", default=storage.DB_NAME, help="файл базы данных")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("migrate", help="применить миграции").set_defaults(handler=cmd_migrate)
+    commands.add_parser("check-plans", help="EXPLAIN QUERY PLAN для горячих запросов").set_defaults(handler=cmd_check_plans)
+    compact = commands.add_parser("compact-changes", help="удалить записи журнала изменений старше срока хранения")
+    compact.add_argument("--retention-hours", type=float, default=storage.CHANGES_RETENTION_HOURS, help="сколько часов хранить изменения")
+    compact.set_defaults(handler=cmd_compact_changes)
+    commands.add_parser("verify-stats", help="сверить user_task_stats с задачами").set_defaults(handler=cmd_verify_stats)
+    commands.add_parser("rebuild-stats", help="пересчитать user_task_stats").set_defaults(handler=cmd_rebuild_stats)
+
+    snapshot_dir = argparse.ArgumentParser(add_help=False)
+    snapshot_dir.add_argument("--dir", default="backups", help="каталог снимков")
+    snapshot_dir.add_argument("--keep", type=int, default=7, help="сколько последних снимков хранить")
+    make = commands.add_parser("backup", parents=[snapshot_dir], help="снимок базы без остановки бота")
+    make.add_argument("--step-pages", type=int, default=128, help="страниц за шаг копирования")
+    make.add_argument("--step-pause-ms", type=float, default=20, help="пауза между шагами")
+    make.set_defaults(handler=cmd_backup)
+    commands.add_parser("list-backups", parents=[snapshot_dir], help="снимки в каталоге").set_defaults(
+        handler=cmd_list_backups)
+    verify = commands.add_parser("verify-backup", help="PRAGMA integrity_check и версия схемы снимка")
+    verify.add_argument("snapshot")
+    verify.set_defaults(handler=cmd_verify_backup)
+    restore = commands.add_parser("restore", help="восстановить базу из снимка")
+    restore.add_argument("--dir", default="backups", help="куда сохранить текущую базу перед заменой")
+    restore.add_argument("snapshot")
+    restore.add_argument("--no-safety-backup", action="store_true", help="не сохранять текущую базу перед заменой")
+    restore.add_argument("--keep", type=int, default=7, help="сколько последних копий pre-restore-* хранить")
+    restore.set_defaults(handler=cmd_restore)
+
+    args = parser.parse_args(argv)
+    storage.configure(args.db)
+    return args.handler(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,60 @@
+"""Запуск бота: выбор среды выполнения до создания ее объектов
+
+tgbot.py и tgbot_async.py при импорте создают бота, исходящую очередь, поток
+записи и планировщики. Поэтому аргументы разбираются здесь, и импортируется
+только модуль выбранной среды — иначе объекты второй среды запускали бы свои
+потоки, напоминания и снимки базы рядом с работающей.
+
+Запуск: python tgbot.py [--runtime async] [--mode webhook]
+"""
+
+import argparse
+
+import metrics
+import storage
+from config import BOT_RUNTIME, BOT_MODE, WEBHOOK_SECRET, METRICS_HOST, METRICS_PORT
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Telegram бот менеджера задач")
+    parser.add_argument(
+        "--runtime", choices=["sync", "async"], default=BOT_RUNTIME,
+        help="sync — TeleBot с потоками, async — AsyncTeleBot и пул потоков для SQLite"
+    )
+    parser.add_argument(
+        "--mode", choices=["polling", "webhook"], default=BOT_MODE,
+        help="polling — long polling, webhook — локальный HTTP-сервер за обратным прокси"
+    )
+    parser.add_argument(
+        "--metrics-port", type=int, default=METRICS_PORT,
+        help="порт локального сервера метрик Prometheus (0 — не запускать)"
+    )
+    args = parser.parse_args(argv)
+    if args.mode == "webhook" and args.runtime != "sync":
+        parser.error("webhook поддерживается только в среде выполнения sync")
+    if args.mode == "webhook" and not WEBHOOK_SECRET:
+        parser.error("для webhook задайте WEBHOOK_SECRET в .env")
+    return args
+
+
+def start_metrics_server(port):
+    server = metrics.MetricsServer(host=METRICS_HOST, port=port).start()
+    host, port = server.address
+    print(f"Метрики: http://{host}:{port}/metrics")
+    return server
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    storage.init_db()
+    print("База данных инициализирована")
+    print("Бот запущен...")
+    if args.metrics_port:
+        start_metrics_server(args.metrics_port)
+    if args.runtime == "async":
+        import tgbot_async
+        tgbot_async.run()
+    else:
+        import tgbot
+        tgbot.run(args.mode)
+    return 0
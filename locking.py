@@ -0,0 +1,118 @@
+"""Транзакции при занятой базе SQLite: повторы и счетчики ожидания блокировки
+
+Бот и Desktop-панель пишут в один файл. busy_timeout заставляет SQLite ждать
+блокировку записи, но если ее не освободили и за это время, транзакция
+получает "database is locked". LockRetry повторяет такую транзакцию с
+экспоненциальной паузой и случайным разбросом (чтобы процессы не
+просыпались одновременно). Повторы ограничены бюджетом: budget_ratio от числа
+транзакций плюс budget_min в секунду, поэтому долгая блокировка (например,
+тяжелая операция в панели) не превращается в лавину повторов.
+"""
+
+import random
+import sqlite3
+import threading
+import time
+
+import metrics
+
+
+def is_locked_error(error):
+    """Ошибка занятой базы, после которой транзакцию можно повторить"""
+    if not isinstance(error, sqlite3.OperationalError):
+        return False
+    message = str(error)
+    return "database is locked" in message or "database is busy" in message
+
+
+class LockRetry:
+    """Выполнение транзакций с повторами при занятой базе и учетом ожидания блокировок"""
+
+    # BEGIN IMMEDIATE дольше этого — ожидание чужой блокировки записи (без нее он занимает микросекунды)
+    WAIT_THRESHOLD = 0.001
+
+    def __init__(self, retries=3, base_delay=0.05, max_delay=1.0, budget_ratio=0.2, budget_min=10.0,
+                 clock=time.monotonic, sleep=time.sleep, rand=random.random):
+        self.retries = retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.budget_ratio = budget_ratio
+        self.budget_min = budget_min
+        self.clock = clock
+        self.sleep = sleep
+        self.rand = rand
+        self.transactions = 0
+        self.lock_waits = 0
+        self.lock_wait_seconds = 0.0
+        self.locked = 0
+        self.retried = 0
+        self.budget_exhausted = 0
+        self.failed = 0
+        self._budget = budget_min
+        self._refilled = clock()
+        self._lock = threading.Lock()
+
+    def begin(self, conn):
+        """BEGIN IMMEDIATE: блокировка записи берется сразу, ожидание busy_timeout — здесь
+
+        Отложенная транзакция, которая сначала читает, а потом пишет, при занятой
+        базе получает "database is locked" сразу, без ожидания.
+        """
+        started = time.perf_counter()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+        finally:
+            waited = time.perf_counter() - started
+            with self._lock:
+                self.transactions += 1
+                if waited >= self.WAIT_THRESHOLD:
+                    self.lock_waits += 1
+                    self.lock_wait_seconds += waited
+            if waited >= self.WAIT_THRESHOLD:
+                metrics.DB_LOCK_WAIT_SECONDS.observe(waited)
+
+    def run(self, fn, *args, **kwargs):
+        """fn(*args, **kwargs) с повторами, пока ошибка — занятая база и бюджет не исчерпан"""
+        attempt = 0
+        while True:
+            try:
+                result = fn(*args, **kwargs)
+            except sqlite3.OperationalError as e:
+                if not is_locked_error(e):
+                    raise
+                if not self._may_retry(attempt):
+                    raise
+                attempt += 1
+                delay = min(self.max_delay, self.base_delay * 2 ** (attempt - 1))
+                self.sleep(delay * (0.5 + self.rand()))
+                continue
+            with self._lock:
+                self._budget = min(self._budget + self.budget_ratio, self._capacity())
+            return result
+
+    def _capacity(self):
+        return self.budget_min * 10
+
+    def _may_retry(self, attempt):
+        with self._lock:
+            self.locked += 1
+            now = self.clock()
+            self._budget = min(self._budget + (now - self._refilled) * self.budget_min, self._capacity())
+            self._refilled = now
+            if attempt >= self.retries:
+                self.failed += 1
+                return False
+            if self._budget < 1:
+                self.budget_exhausted += 1
+                self.failed += 1
+                return False
+            self._budget -= 1
+            self.retried += 1
+            return True
+
+    def stats(self):
+        with self._lock:
+            return {"transactions": self.transactions, "lock_waits": self.lock_waits,
+                    "lock_wait_seconds": self.lock_wait_seconds, "locked": self.locked,
+                    "retried": self.retried, "budget_exhausted": self.budget_exhausted,
+                    "failed": self.failed, "budget": self._budget}
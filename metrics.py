@@ -0,0 +1,284 @@
+"""Метрики бота в формате Prometheus
+
+Гистограммы длительности (обработчики, запросы к базе, вызовы Bot API),
+счетчики ошибок и снимки stats() очереди, кэшей и планировщика. Все метрики
+живут в REGISTRY; MetricsServer отдает их по GET /metrics локальному Prometheus.
+
+    with metrics.timer(DB_QUERY_SECONDS, "get_task"):
+        ...
+    @metrics.timed(DB_QUERY_SECONDS, "get_task")
+    def get_task(task_id): ...
+
+Замер — два вызова perf_counter и поиск корзины под блокировкой, поэтому
+метрики включены всегда, а не только при разборе проблем.
+"""
+
+import asyncio
+import bisect
+import functools
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Границы корзин в секундах: от долей миллисекунды (SQLite) до секунд (Bot API)
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels_text(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    pairs.extend(f'{name}="{value}"' for name, value in extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    """Гистограмма с метками: {значения меток: (счетчики корзин, сумма, количество)}"""
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def snapshot(self):
+        """{значения меток: (накопленные счетчики корзин, сумма, количество)}"""
+        with self._lock:
+            items = [(labels, list(series[0]), series[1], series[2]) for labels, series in self._series.items()]
+        result = {}
+        for labels, counts, total, count in items:
+            cumulative, running = [], 0
+            for n in counts:
+                running += n
+                cumulative.append(running)
+            result[labels] = (cumulative, total, count)
+        return result
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for labels, (cumulative, total, count) in sorted(self.snapshot().items()):
+            for bound, value in zip(self.buckets + (float("inf"),), cumulative):
+                text = _labels_text(self.labelnames, labels, [("le", _number(bound))])
+                lines.append(f"{self.name}_bucket{text} {value}")
+            text = _labels_text(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{text} {_number(total)}")
+            lines.append(f"{self.name}_count{text} {count}")
+        return lines
+
+
+class Counter:
+    """Счетчик с метками"""
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels):
+        with self._lock:
+            return self._values.get(labels, 0)
+
+    def render(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        lines.extend(f"{self.name}{_labels_text(self.labelnames, labels)} {value}" for labels, value in items)
+        return lines
+
+
+class Registry:
+    """Набор метрик и сборщиков, которые читают stats() компонентов при каждом запросе"""
+
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []  # [(префикс, функция -> dict)]
+        self._lock = threading.Lock()
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._add(Histogram(name, documentation, labelnames, buckets))
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._add(Counter(name, documentation, labelnames))
+
+    def _add(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def register_collector(self, prefix, stats):
+        """stats() -> {имя: число}; каждое число отдается как метрика prefix_имя"""
+        with self._lock:
+            self._collectors = [c for c in self._collectors if c[0] != prefix] + [(prefix, stats)]
+
+    def render(self):
+        """Все метрики в текстовом формате Prometheus"""
+        with self._lock:
+            metrics, collectors = list(self._metrics), list(self._collectors)
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        for prefix, stats in collectors:
+            try:
+                values = stats()
+            except Exception as e:
+                print(f"Ошибка сбора метрик {prefix}: {e}")
+                continue
+            for key, value in sorted(values.items()):
+                if isinstance(value, bool) or not isinstance(value, (int, float)):
+                    continue
+                lines.append(f"# TYPE {prefix}_{key} untyped")
+                lines.append(f"{prefix}_{key} {_number(value)}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+HANDLER_SECONDS = REGISTRY.histogram(
+    "bot_handler_seconds", "Время обработчика обновления Telegram", ["handler"])
+HANDLER_ERRORS = REGISTRY.counter(
+    "bot_handler_errors_total", "Исключения в обработчиках", ["handler"])
+DB_QUERY_SECONDS = REGISTRY.histogram(
+    "db_query_seconds", "Время функции работы с SQLite (запрос и чтение строк)", ["query"])
+DB_CONNECTION_SECONDS = REGISTRY.histogram(
+    "db_connection_acquire_seconds", "Время получения соединения SQLite потоком", ["state"])
+DB_LOCK_WAIT_SECONDS = REGISTRY.histogram(
+    "db_lock_wait_seconds", "Ожидание блокировки записи, занятой другим соединением или процессом")
+DB_POOL_WAIT_SECONDS = REGISTRY.histogram(
+    "db_pool_wait_seconds", "Ожидание свободного потока для SQLite в async-режиме")
+TELEGRAM_API_SECONDS = REGISTRY.histogram(
+    "telegram_api_seconds", "Время HTTP-вызова Bot API", ["method"])
+TELEGRAM_API_ERRORS = REGISTRY.counter(
+    "telegram_api_errors_total", "Ошибки Bot API по коду ответа (network — сетевые)", ["method", "code"])
+OUTBOX_DELIVERY_SECONDS = REGISTRY.histogram(
+    "outbox_delivery_seconds", "От постановки в исходящую очередь до ответа Telegram", ["priority"])
+
+
+@contextmanager
+def timer(histogram, *labels):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        histogram.observe(time.perf_counter() - started, *labels)
+
+
+def timed(histogram, *labels, errors=None):
+    """Декоратор замера длительности функции или корутины; errors — счетчик исключений"""
+    def decorator(fn):
+        if asyncio.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                started = time.perf_counter()
+                try:
+                    return await fn(*args, **kwargs)
+                except Exception:
+                    if errors is not None:
+                        errors.inc(*labels)
+                    raise
+                finally:
+                    histogram.observe(time.perf_counter() - started, *labels)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            except Exception:
+                if errors is not None:
+                    errors.inc(*labels)
+                raise
+            finally:
+                histogram.observe(time.perf_counter() - started, *labels)
+        return wrapper
+    return decorator
+
+
+def instrument_handler(fn):
+    return timed(HANDLER_SECONDS, fn.__name__, errors=HANDLER_ERRORS)(fn)
+
+
+def instrument_bot(bot, router=None, state_handlers=None):
+    """Замер всех обработчиков бота на месте: зарегистрированных декораторами
+    bot, действий CallbackRouter и обработчиков состояний диалога
+
+    on_message и on_callback попадают в метрики как полное время обновления,
+    а обработчики, которые они выбирают, — под своими именами.
+    """
+    for handlers in (bot.message_handlers, bot.callback_query_handlers):
+        for handler in handlers:
+            handler["function"] = instrument_handler(handler["function"])
+    for table in (router.handlers if router else {}, state_handlers or {}):
+        for key, fn in table.items():
+            table[key] = instrument_handler(fn)
+
+
+class MetricsServer:
+    """Локальный HTTP-сервер с GET /metrics для Prometheus"""
+
+    def __init__(self, registry=REGISTRY, host="127.0.0.1", port=9108):
+        self.registry = registry
+        self._server = ThreadingHTTPServer((host, port), self._make_handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def address(self):
+        return self._server.server_address[:2]
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name="metrics", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _make_handler(self):
+        registry = self.registry
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_response(404)
+                    self.end_headers()
+                    return
+                body = registry.render().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
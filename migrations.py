@@ -0,0 +1,284 @@
+"""Версионирование схемы базы данных через PRAGMA user_version
+
+Каждая миграция — это (версия, описание, шаги). Шаг — SQL-строка или функция,
+принимающая соединение. Миграции применяются по возрастанию версии, каждая
+в своей транзакции вместе с обновлением user_version.
+"""
+
+MIGRATIONS = [
+    (1, "Базовая схема", [
+        # Таблица пользователей
+        '''
+        CREATE TABLE IF NOT EXISTS users (
+            user_id INTEGER PRIMARY KEY,
+            username TEXT,
+            first_name TEXT,
+            last_name TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+        # Таблица задач
+        '''
+        CREATE TABLE IF NOT EXISTS tasks (
+            task_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER,
+            task_text TEXT NOT NULL,
+            is_done BOOLEAN DEFAULT FALSE,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users (user_id)
+        )
+        ''',
+        # Таблица администраторов
+        '''
+        CREATE TABLE IF NOT EXISTS admins (
+            user_id INTEGER PRIMARY KEY,
+            added_by INTEGER,
+            added_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users (user_id)
+        )
+        ''',
+    ]),
+    (2, "Индексы для списка задач пользователя", [
+        # task_id в конце индекса — стабильный порядок при одинаковом created_at
+        'CREATE INDEX IF NOT EXISTS idx_tasks_user_created ON tasks (user_id, created_at DESC, task_id DESC)',
+        'CREATE INDEX IF NOT EXISTS idx_tasks_user_done ON tasks (user_id, is_done)',
+        'ANALYZE',
+    ]),
+    (3, "Счетчики изменений для инвалидации кэшей", [
+        '''
+        CREATE TABLE IF NOT EXISTS db_counters (
+            name TEXT PRIMARY KEY,
+            value INTEGER NOT NULL DEFAULT 0
+        )
+        ''',
+        "INSERT OR IGNORE INTO db_counters (name, value) VALUES ('admins', 0)",
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_admins_insert_counter AFTER INSERT ON admins
+        BEGIN
+            UPDATE db_counters SET value = value + 1 WHERE name = 'admins';
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_admins_update_counter AFTER UPDATE ON admins
+        BEGIN
+            UPDATE db_counters SET value = value + 1 WHERE name = 'admins';
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_admins_delete_counter AFTER DELETE ON admins
+        BEGIN
+            UPDATE db_counters SET value = value + 1 WHERE name = 'admins';
+        END
+        ''',
+    ]),
+    (4, "Состояния диалогов пользователей", [
+        '''
+        CREATE TABLE IF NOT EXISTS user_states (
+            user_id INTEGER PRIMARY KEY,
+            state TEXT NOT NULL,
+            expires_at REAL NOT NULL
+        )
+        ''',
+        'CREATE INDEX IF NOT EXISTS idx_user_states_expires ON user_states (expires_at)',
+    ]),
+    (5, "Журнал изменений для живого обновления Desktop-панели", [
+        # seq растет монотонно и не переиспользуется даже после очистки старых записей
+        '''
+        CREATE TABLE IF NOT EXISTS changes (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            table_name TEXT NOT NULL,
+            op TEXT NOT NULL,
+            row_id INTEGER NOT NULL,
+            user_id INTEGER,
+            changed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_tasks_insert_change AFTER INSERT ON tasks
+        BEGIN
+            INSERT INTO changes (table_name, op, row_id, user_id) VALUES ('tasks', 'insert', NEW.task_id, NEW.user_id);
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_tasks_update_change AFTER UPDATE ON tasks
+        BEGIN
+            INSERT INTO changes (table_name, op, row_id, user_id) VALUES ('tasks', 'update', NEW.task_id, NEW.user_id);
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_tasks_delete_change AFTER DELETE ON tasks
+        BEGIN
+            INSERT INTO changes (table_name, op, row_id, user_id) VALUES ('tasks', 'delete', OLD.task_id, OLD.user_id);
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_users_insert_change AFTER INSERT ON users
+        BEGIN
+            INSERT INTO changes (table_name, op, row_id, user_id) VALUES ('users', 'insert', NEW.user_id, NEW.user_id);
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_users_update_change AFTER UPDATE ON users
+        BEGIN
+            INSERT INTO changes (table_name, op, row_id, user_id) VALUES ('users', 'update', NEW.user_id, NEW.user_id);
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_users_delete_change AFTER DELETE ON users
+        BEGIN
+            INSERT INTO changes (table_name, op, row_id, user_id) VALUES ('users', 'delete', OLD.user_id, OLD.user_id);
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_admins_insert_change AFTER INSERT ON admins
+        BEGIN
+            INSERT INTO changes (table_name, op, row_id, user_id) VALUES ('admins', 'insert', NEW.user_id, NEW.user_id);
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_admins_update_change AFTER UPDATE ON admins
+        BEGIN
+            INSERT INTO changes (table_name, op, row_id, user_id) VALUES ('admins', 'update', NEW.user_id, NEW.user_id);
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_admins_delete_change AFTER DELETE ON admins
+        BEGIN
+            INSERT INTO changes (table_name, op, row_id, user_id) VALUES ('admins', 'delete', OLD.user_id, OLD.user_id);
+        END
+        ''',
+    ]),
+    (6, "Счетчики задач пользователей, поддерживаемые триггерами", [
+        '''
+        CREATE TABLE IF NOT EXISTS user_task_stats (
+            user_id INTEGER PRIMARY KEY,
+            total INTEGER NOT NULL DEFAULT 0,
+            done INTEGER NOT NULL DEFAULT 0,
+            last_activity TIMESTAMP
+        )
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_tasks_insert_stats AFTER INSERT ON tasks
+        BEGIN
+            INSERT INTO user_task_stats (user_id, total, done, last_activity)
+            VALUES (NEW.user_id, 1, COALESCE(NEW.is_done, 0) != 0, CURRENT_TIMESTAMP)
+            ON CONFLICT (user_id) DO UPDATE SET
+                total = total + 1,
+                done = done + excluded.done,
+                last_activity = excluded.last_activity;
+        END
+        ''',
+        # Смена статуса или владельца: строка вычитается у старого пользователя и прибавляется новому
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_tasks_update_stats AFTER UPDATE OF is_done, user_id ON tasks
+        BEGIN
+            UPDATE user_task_stats SET
+                total = total - 1,
+                done = done - (COALESCE(OLD.is_done, 0) != 0)
+            WHERE user_id = OLD.user_id;
+            INSERT INTO user_task_stats (user_id, total, done, last_activity)
+            VALUES (NEW.user_id, 1, COALESCE(NEW.is_done, 0) != 0, CURRENT_TIMESTAMP)
+            ON CONFLICT (user_id) DO UPDATE SET
+                total = total + 1,
+                done = done + excluded.done,
+                last_activity = excluded.last_activity;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_tasks_delete_stats AFTER DELETE ON tasks
+        BEGIN
+            UPDATE user_task_stats SET
+                total = total - 1,
+                done = done - (COALESCE(OLD.is_done, 0) != 0),
+                last_activity = CURRENT_TIMESTAMP
+            WHERE user_id = OLD.user_id;
+        END
+        ''',
+        # Заполнение по уже существующим задачам
+        '''
+        INSERT OR REPLACE INTO user_task_stats (user_id, total, done, last_activity)
+        SELECT user_id, COUNT(*), SUM(COALESCE(is_done, 0) != 0), MAX(created_at)
+        FROM tasks GROUP BY user_id
+        ''',
+    ]),
+    (7, "Полнотекстовый поиск по задачам (FTS5)", [
+        # Таблица без копии текста (content=''): текст берется из tasks по rowid = task_id.
+        # owner = 'u' || user_id — отдельный токен, чтобы поиск сразу сужался до задач одного пользователя.
+        # ё индексируется как е: unicode61 не считает их одной буквой
+        '''
+        CREATE VIRTUAL TABLE IF NOT EXISTS tasks_fts USING fts5(
+            task_text, owner, content='', tokenize='unicode61 remove_diacritics 2'
+        )
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_tasks_insert_fts AFTER INSERT ON tasks
+        BEGIN
+            INSERT INTO tasks_fts (rowid, task_text, owner)
+            VALUES (NEW.task_id, replace(replace(NEW.task_text, 'ё', 'е'), 'Ё', 'Е'), 'u' || NEW.user_id);
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_tasks_update_fts AFTER UPDATE OF task_text, user_id ON tasks
+        BEGIN
+            INSERT INTO tasks_fts (tasks_fts, rowid, task_text, owner)
+            VALUES ('delete', OLD.task_id, replace(replace(OLD.task_text, 'ё', 'е'), 'Ё', 'Е'), 'u' || OLD.user_id);
+            INSERT INTO tasks_fts (rowid, task_text, owner)
+            VALUES (NEW.task_id, replace(replace(NEW.task_text, 'ё', 'е'), 'Ё', 'Е'), 'u' || NEW.user_id);
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_tasks_delete_fts AFTER DELETE ON tasks
+        BEGIN
+            INSERT INTO tasks_fts (tasks_fts, rowid, task_text, owner)
+            VALUES ('delete', OLD.task_id, replace(replace(OLD.task_text, 'ё', 'е'), 'Ё', 'Е'), 'u' || OLD.user_id);
+        END
+        ''',
+        # Индексация уже существующих задач
+        '''
+        INSERT INTO tasks_fts (rowid, task_text, owner)
+        SELECT task_id, replace(replace(task_text, 'ё', 'е'), 'Ё', 'Е'), 'u' || user_id FROM tasks
+        ''',
+    ]),
+    (8, "Сроки задач и напоминания", [
+        # unix-время (UTC); remind_at сбрасывается в NULL, когда напоминание отправлено
+        'ALTER TABLE tasks ADD COLUMN due_at INTEGER',
+        'ALTER TABLE tasks ADD COLUMN remind_at INTEGER',
+        # В индексе только задачи с ожидающим напоминанием: ближайшие берутся с его начала
+        'CREATE INDEX IF NOT EXISTS idx_tasks_remind_at ON tasks (remind_at) WHERE remind_at IS NOT NULL',
+    ]),
+]
+
+
+def get_version(conn):
+    """Текущая версия схемы"""
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+
+def latest_version():
+    return MIGRATIONS[-1][0]
+
+
+def migrate(conn):
+    """Применение всех недостающих миграций, возвращает список примененных версий"""
+    applied = []
+    for version, description, steps in MIGRATIONS:
+        if get_version(conn) >= version:
+            continue
+        # IMMEDIATE сразу берет блокировку записи: бот и панель могут стартовать одновременно
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            if get_version(conn) >= version:
+                conn.rollback()
+                continue
+            for step in steps:
+                if callable(step):
+                    step(conn)
+                else:
+                    conn.execute(step)
+            conn.execute(f'PRAGMA user_version = {int(version)}')
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        applied.append((version, description))
+    return applied
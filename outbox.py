@@ -0,0 +1,349 @@
+"""Исходящая очередь бота с учетом лимитов Telegram
+
+Обработчики не вызывают Bot API напрямую, а ставят вызов в очередь и сразу
+продолжают работу; ошибка отправки больше не обрывает обработчик на середине
+(например, после того как задача уже записана в базу).
+
+    outbox = Outbox(bot).start()
+    outbox.send_message(chat_id, "Готово")            # вернет Future
+    outbox.edit_message_text(text, chat_id, message_id, reply_markup=kb)
+    outbox.send_message(chat_id, text, priority=BULK)  # рассылки — после ответов
+
+Диспетчер выбирает следующий вызов с учетом общего ведра токенов (лимит бота)
+и ведра каждого чата, отдает его пулу потоков и держит в полете не больше
+одного вызова на чат, поэтому сообщения в чат уходят в порядке постановки.
+Ответ 429 ставит чат (или весь бот) на паузу retry_after секунд и возвращает
+вызов в начало очереди. Повторное редактирование того же сообщения, пока
+предыдущее еще ждет отправки, заменяет его — уйдет только последний текст.
+С render_cache (cache.RenderCache) правка, не меняющая сообщение, не
+отправляется вовсе.
+"""
+
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import requests
+from telebot.apihelper import ApiTelegramException
+
+import metrics
+
+# Очереди по приоритету: ответы на действия пользователя раньше рассылок
+INTERACTIVE = 0
+BULK = 1
+
+
+class TokenBucket:
+    """Ведро токенов: rate вызовов в секунду, до capacity подряд после простоя"""
+
+    def __init__(self, rate, capacity, clock=time.monotonic):
+        self.rate = rate
+        self.capacity = capacity
+        self.clock = clock
+        self.tokens = float(capacity)
+        self.updated = clock()
+        self.paused_until = 0.0
+
+    def delay(self, now):
+        """Сколько секунд ждать до следующего токена (0 — можно отправлять)"""
+        if now < self.paused_until:
+            return self.paused_until - now
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self):
+        self.tokens -= 1
+
+    def pause(self, seconds, now):
+        """Пауза по retry_after: после нее ведро начинает с одного токена"""
+        self.paused_until = max(self.paused_until, now + seconds)
+        self.tokens = 0.0
+        self.updated = self.paused_until
+
+    def idle(self, now):
+        return now >= self.paused_until and self.delay(now) == 0 and self.tokens >= self.capacity
+
+
+class OutboxJob:
+    __slots__ = ("chat_id", "priority", "key", "method", "args", "kwargs", "future", "created", "attempts")
+
+    def __init__(self, chat_id, priority, key, method, args, kwargs, created):
+        self.chat_id = chat_id
+        self.priority = priority
+        self.key = key
+        self.method = method
+        self.args = args
+        self.kwargs = kwargs
+        self.future = Future()
+        self.created = created
+        self.attempts = 0
+
+
+class Outbox:
+    """Диспетчер исходящих вызовов Bot API с ведрами токенов и приоритетами"""
+
+    # Сколько последних задержек отправки хранить для перцентилей
+    LATENCY_WINDOW = 1000
+    # Пауза перед повтором после сетевой ошибки: BACKOFF * 2 ** (попытка - 1) секунд
+    BACKOFF = 0.5
+    # Как часто забывать ведра чатов, в которые давно ничего не отправлялось
+    PRUNE_INTERVAL = 60.0
+
+    def __init__(self, bot, global_rate=30.0, chat_rate=1.0, chat_burst=3, workers=8, max_retries=3,
+                 render_cache=None, clock=time.monotonic):
+        self.bot = bot
+        self.render_cache = render_cache
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.workers = workers
+        self.max_retries = max_retries
+        self.clock = clock
+        # Общий лимит без запаса: вызовы идут равномерно и в любую секунду их не больше global_rate
+        self._global = TokenBucket(global_rate, 1, clock)
+        self._buckets = {}  # {chat_id: TokenBucket}
+        self._lanes = (deque(), deque())
+        self._tails = {}  # {chat_id: последний ожидающий вызов} — для склейки правок
+        self._busy = set()  # чаты, у которых вызов уже в полете
+        self._cond = threading.Condition()
+        self._pool = None
+        self._thread = None
+        self._stopped = False
+        self._pruned_at = clock()
+        self._latencies = deque(maxlen=self.LATENCY_WINDOW)
+        self.submitted = 0
+        self.sent = 0
+        self.failed = 0
+        self.retried = 0
+        self.rate_limited = 0
+        self.coalesced = 0
+
+    def start(self):
+        self._pool = ThreadPoolExecutor(self.workers, thread_name_prefix="outbox")
+        self._thread = threading.Thread(target=self._run, name="outbox-dispatcher", daemon=True)
+        self._thread.start()
+        return self
+
+    # Методы Bot API, которыми пользуются обработчики
+
+    def send_message(self, chat_id, text, priority=INTERACTIVE, **kwargs):
+        return self.submit(chat_id, self.bot.send_message, (chat_id, text), kwargs, priority)
+
+    def edit_message_text(self, text, chat_id, message_id, priority=INTERACTIVE, **kwargs):
+        if self.render_cache is None:
+            return self.submit(chat_id, self.bot.edit_message_text, (text, chat_id, message_id), kwargs, priority,
+                               key=("edit", chat_id, message_id))
+        # Сообщение уже показывает то же самое — в Telegram не обращаемся
+        message = (chat_id, message_id)
+        digest = self.render_cache.digest(text, **kwargs)
+        if not self.render_cache.update(message, digest):
+            future = Future()
+            future.set_result(True)
+            return future
+        future = self.submit(chat_id, self.bot.edit_message_text, (text, chat_id, message_id), kwargs, priority,
+                             key=("edit", chat_id, message_id))
+        future.add_done_callback(lambda f: f.exception() and self.render_cache.forget(message, digest))
+        return future
+
+    def send_document(self, chat_id, document, priority=INTERACTIVE, **kwargs):
+        def send_document():
+            # При повторе файл нужно читать сначала
+            document.seek(0)
+            return self.bot.send_document(chat_id, document, **kwargs)
+        return self.submit(chat_id, send_document, (), {}, priority)
+
+    def answer_callback_query(self, callback_query_id, text=None, **kwargs):
+        # Ответ на нажатие не относится к чату: ограничен только общим лимитом
+        return self.submit(None, self.bot.answer_callback_query, (callback_query_id, text), kwargs, INTERACTIVE)
+
+    def submit(self, chat_id, method, args, kwargs, priority=INTERACTIVE, key=None):
+        """Постановка вызова method(*args, **kwargs) в очередь; возвращает Future с результатом"""
+        with self._cond:
+            self.submitted += 1
+            tail = self._tails.get(chat_id) if key is not None else None
+            if tail is not None and tail.key == key:
+                # Предыдущая правка того же сообщения еще не ушла: отправим только новую
+                tail.method, tail.args, tail.kwargs = method, args, kwargs
+                self.coalesced += 1
+                return tail.future
+            job = OutboxJob(chat_id, priority, key, method, args, kwargs, self.clock())
+            self._lanes[priority].append(job)
+            if chat_id is not None:
+                self._tails[chat_id] = job
+            self._cond.notify_all()
+            return job.future
+
+    # Диспетчер
+
+    def _bucket(self, chat_id):
+        bucket = self._buckets.get(chat_id)
+        if bucket is None:
+            bucket = self._buckets[chat_id] = TokenBucket(self.chat_rate, self.chat_burst, self.clock)
+        return bucket
+
+    def _next_job(self):
+        """Первый вызов, который можно отправить сейчас, или (None, сколько ждать)"""
+        now = self.clock()
+        wait = self._global.delay(now)
+        if wait > 0:
+            return None, wait
+        wait = None
+        for lane in self._lanes:
+            blocked = set()
+            for index, job in enumerate(lane):
+                chat_id = job.chat_id
+                if chat_id is None:
+                    pass
+                elif chat_id in blocked or chat_id in self._busy:
+                    # Более ранний вызов в этот чат еще не ушел: порядок сохраняется
+                    blocked.add(chat_id)
+                    continue
+                else:
+                    delay = self._bucket(chat_id).delay(now)
+                    if delay > 0:
+                        blocked.add(chat_id)
+                        wait = delay if wait is None else min(wait, delay)
+                        continue
+                    self._bucket(chat_id).take()
+                    self._busy.add(chat_id)
+                    if self._tails.get(chat_id) is job:
+                        del self._tails[chat_id]
+                del lane[index]
+                self._global.take()
+                return job, None
+        return None, wait
+
+    def _run(self):
+        with self._cond:
+            while not self._stopped:
+                job, wait = self._next_job()
+                if job is None:
+                    self._cond.wait(wait)
+                    continue
+                try:
+                    self._pool.submit(self._send, job)
+                except RuntimeError:
+                    # Пул уже остановлен при выходе интерпретатора: отправлять больше некому
+                    self._lanes[job.priority].appendleft(job)
+                    return
+
+    def _send(self, job):
+        job.attempts += 1
+        method = getattr(job.method, "__name__", "call")
+        try:
+            result = self._call(job, method)
+        except ApiTelegramException as e:
+            metrics.TELEGRAM_API_ERRORS.inc(method, str(e.error_code))
+            if e.error_code == 429:
+                retry_after = (e.result_json.get("parameters") or {}).get("retry_after", 1)
+                self._retry(job, retry_after, rate_limited=True)
+                return
+            if "message is not modified" in e.description:
+                # Текст не изменился — для пользователя это успех
+                self._finish(job, result=True)
+                return
+            self._finish(job, error=e)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            metrics.TELEGRAM_API_ERRORS.inc(method, "network")
+            if job.attempts <= self.max_retries:
+                self._retry(job, self.BACKOFF * 2 ** (job.attempts - 1))
+            else:
+                self._finish(job, error=e)
+        except Exception as e:
+            metrics.TELEGRAM_API_ERRORS.inc(method, "other")
+            self._finish(job, error=e)
+        else:
+            self._finish(job, result=result)
+
+    @staticmethod
+    def _call(job, method):
+        started = time.perf_counter()
+        try:
+            return job.method(*job.args, **job.kwargs)
+        finally:
+            metrics.TELEGRAM_API_SECONDS.observe(time.perf_counter() - started, method)
+
+    def _retry(self, job, delay, rate_limited=False):
+        with self._cond:
+            now = self.clock()
+            if rate_limited:
+                self.rate_limited += 1
+            self.retried += 1
+            if job.chat_id is None:
+                self._global.pause(delay, now)
+            else:
+                self._bucket(job.chat_id).pause(delay, now)
+                self._busy.discard(job.chat_id)
+                if job.key is not None and job.chat_id not in self._tails:
+                    self._tails[job.chat_id] = job
+            # В начало своей очереди: более поздние вызовы в этот чат не обгонят повтор
+            self._lanes[job.priority].appendleft(job)
+            self._cond.notify_all()
+
+    def _finish(self, job, result=None, error=None):
+        with self._cond:
+            self._busy.discard(job.chat_id)
+            latency = self.clock() - job.created
+            self._latencies.append(latency)
+            if error is None:
+                self.sent += 1
+            else:
+                self.failed += 1
+            self._prune(self.clock())
+            self._cond.notify_all()
+        metrics.OUTBOX_DELIVERY_SECONDS.observe(latency, "interactive" if job.priority == INTERACTIVE else "bulk")
+        if error is None:
+            job.future.set_result(result)
+        else:
+            print(f"Ошибка отправки в чат {job.chat_id}: {error}")
+            job.future.set_exception(error)
+
+    def _prune(self, now):
+        # Полное ведро без паузы ничем не отличается от нового — не держим его
+        if now - self._pruned_at < self.PRUNE_INTERVAL:
+            return
+        self._pruned_at = now
+        for chat_id in [c for c, b in self._buckets.items() if c not in self._busy and b.idle(now)]:
+            del self._buckets[chat_id]
+
+    # Метрики и остановка
+
+    def depth(self):
+        with self._cond:
+            return {"interactive": len(self._lanes[INTERACTIVE]), "bulk": len(self._lanes[BULK]),
+                    "in_flight": len(self._busy)}
+
+    def stats(self):
+        with self._cond:
+            latencies = sorted(self._latencies)
+            stats = {
+                "submitted": self.submitted, "sent": self.sent, "failed": self.failed,
+                "retried": self.retried, "rate_limited": self.rate_limited, "coalesced": self.coalesced,
+                "interactive": len(self._lanes[INTERACTIVE]), "bulk": len(self._lanes[BULK]),
+                "in_flight": len(self._busy),
+            }
+        for name, q in (("p50", 0.5), ("p95", 0.95), ("max", 1.0)):
+            stats[name] = latencies[min(len(latencies) - 1, int(q * len(latencies)))] if latencies else 0.0
+        return stats
+
+    def join(self, timeout=None):
+        """Ожидание, пока очередь не опустеет и все вызовы не завершатся; True при успехе"""
+        deadline = None if timeout is None else self.clock() + timeout
+        with self._cond:
+            while self._lanes[INTERACTIVE] or self._lanes[BULK] or self.sent + self.failed < self.submitted - self.coalesced:
+                remaining = None if deadline is None else deadline - self.clock()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining if remaining is None else min(remaining, 0.1))
+        return True
+
+    def stop(self, timeout=5.0):
+        self.join(timeout)
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        if self._pool is not None:
+            self._pool.shutdown(wait=False)
@@ -0,0 +1,170 @@
+"""Профилирование работающего бота по требованию
+
+Пока профилирование выключено, оно ничего не стоит. Включенное, оно раз в
+interval секунд снимает стеки всех потоков (sys._current_frames) — обработчики
+работают в пулах потоков, а cProfile видит только поток, в котором его
+включили. Одновременно tracemalloc записывает выделения памяти. Отчет — самые
+частые функции по собственному и накопленному времени и строки с наибольшим
+приростом памяти за время профилирования.
+
+Включается командой администратора /profile или сигналом SIGUSR1: первый
+сигнал запускает профилирование, второй останавливает его и пишет отчет в файл.
+"""
+
+import os
+import signal
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+
+
+class SamplingProfiler:
+    """Выборочный профилировщик всех потоков процесса с отчетом по памяти"""
+
+    def __init__(self, interval=0.005, limit=25, report_dir="."):
+        self.interval = interval
+        self.limit = limit
+        self.report_dir = report_dir
+        self.samples = 0
+        self._self_counts = Counter()
+        self._total_counts = Counter()
+        self._started = None
+        self._snapshot = None
+        self._thread = None
+        self._timer = None
+        self._on_done = None
+        self._tracing = False  # tracemalloc включен нами, а не был включен до профилирования
+        self._stop_event = threading.Event()
+        self._lock = threading.Lock()
+
+    @property
+    def running(self):
+        return self._thread is not None
+
+    def start(self, duration=None, on_done=None):
+        """Запуск; через duration секунд профилирование остановится и вызовет on_done(отчет)
+
+        False, если профилирование уже идет.
+        """
+        with self._lock:
+            if self._thread is not None:
+                return False
+            self.samples = 0
+            self._self_counts.clear()
+            self._total_counts.clear()
+            self._started = time.monotonic()
+            self._on_done = on_done
+            self._tracing = not tracemalloc.is_tracing()
+            if self._tracing:
+                tracemalloc.start()
+            self._snapshot = tracemalloc.take_snapshot()
+            self._stop_event.clear()
+            self._thread = threading.Thread(target=self._sample, name="profiler", daemon=True)
+            self._thread.start()
+            if duration:
+                self._timer = threading.Timer(duration, self.stop)
+                self._timer.daemon = True
+                self._timer.start()
+            return True
+
+    def stop(self, on_done=None):
+        """Остановка и текст отчета (None, если профилирование не шло)
+
+        on_done, если передан, получает отчет вместо переданного в start.
+        """
+        with self._lock:
+            thread, self._thread = self._thread, None
+            if thread is None:
+                return None
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            self._stop_event.set()
+        thread.join()
+        report = self.report(tracemalloc.take_snapshot())
+        if self._tracing:
+            tracemalloc.stop()
+        on_done, self._on_done = on_done or self._on_done, None
+        if on_done is not None:
+            try:
+                on_done(report)
+            except Exception as e:
+                print(f"Ошибка передачи отчета профилировщика: {e}")
+        return report
+
+    def toggle(self):
+        """Включение или выключение; при выключении отчет пишется в файл, возвращается путь"""
+        if not self.running:
+            self.start()
+            return None
+        report = self.stop()
+        path = os.path.join(self.report_dir, time.strftime("profile-%Y%m%d-%H%M%S.txt"))
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(report)
+        return path
+
+    def install_signal(self, signum=getattr(signal, "SIGUSR1", None)):
+        """Переключение по сигналу (только в главном потоке и не в Windows)"""
+        if signum is None:
+            return False
+
+        def handler(signum, frame):
+            # Запись отчета — не в обработчике сигнала, чтобы не прерывать главный поток надолго
+            threading.Thread(target=self._toggle_and_print, name="profiler-toggle", daemon=True).start()
+
+        signal.signal(signum, handler)
+        return True
+
+    def _toggle_and_print(self):
+        path = self.toggle()
+        print(f"Профилирование: отчет в {path}" if path else "Профилирование запущено")
+
+    def _sample(self):
+        own = threading.get_ident()
+        while not self._stop_event.wait(self.interval):
+            frames = sys._current_frames()
+            for thread_id, frame in frames.items():
+                if thread_id == own:
+                    continue
+                seen = set()
+                leaf = True
+                while frame is not None:
+                    code = frame.f_code
+                    key = (code.co_filename, code.co_firstlineno, code.co_name)
+                    if leaf:
+                        self._self_counts[key] += 1
+                        leaf = False
+                    if key not in seen:
+                        # Рекурсия не должна считать функцию несколько раз в одном стеке
+                        seen.add(key)
+                        self._total_counts[key] += 1
+                    frame = frame.f_back
+            self.samples += 1
+
+    def report(self, snapshot=None):
+        elapsed = time.monotonic() - self._started if self._started else 0.0
+        lines = [f"Профилирование {elapsed:.1f} с, снимков стеков: {self.samples}", ""]
+        for title, counts in (("Собственное время (ожидание в пулах и select тоже здесь):", self._self_counts),
+                              ("Накопленное время:", self._total_counts)):
+            lines.append(title)
+            for (filename, lineno, name), count in counts.most_common(self.limit):
+                share = count / self.samples * 100 if self.samples else 0.0
+                lines.append(f"  {share:5.1f}%  {name}  {_short(filename)}:{lineno}")
+            lines.append("")
+        if snapshot is not None and self._snapshot is not None:
+            lines.append("Прирост памяти:")
+            for stat in snapshot.compare_to(self._snapshot, "lineno")[:self.limit]:
+                frame = stat.traceback[0]
+                lines.append(f"  {stat.size_diff / 1024:+9.1f} КБ  {stat.count_diff:+7d} блоков  "
+                             f"{_short(frame.filename)}:{frame.lineno}")
+        return "\n".join(lines) + "\n"
+
+
+def _short(filename):
+    """Путь без каталогов site-packages и стандартной библиотеки"""
+    for prefix in sorted(sys.path, key=len, reverse=True):
+        if prefix and filename.startswith(prefix + os.sep):
+            return filename[len(prefix) + 1:]
+    return filename
@@ -0,0 +1,135 @@
+"""Планировщик напоминаний о задачах
+
+Время напоминания хранится в tasks.remind_at под частичным индексом. Планировщик
+держит в куче только моменты ближайших WINDOW напоминаний и спит до самого
+раннего из них. Проснувшись, он забирает из базы все наступившие напоминания
+(storage.claim_due_reminders — диапазон по индексу) и отдает их send, поэтому
+даже при 100k ожидающих напоминаний нет просмотра всей таблицы.
+
+Куча — только подсказка, когда проснуться: что отправлять, решает база. Поэтому
+перезапуск ничего не теряет (куча заново загружается из базы), а удаленные,
+перенесенные или уже отправленные другим процессом напоминания просто дают
+пустую выборку. Раз в RELOAD_INTERVAL секунд куча перечитывается, чтобы увидеть
+напоминания, поставленные другими процессами.
+"""
+
+import heapq
+import threading
+import time
+
+import storage
+
+
+class ReminderScheduler:
+    """Фоновый поток, вызывающий send(task) для каждой наступившей задачи с напоминанием"""
+
+    # Сколько ближайших напоминаний держать в куче
+    WINDOW = 1000
+    # Как часто перечитывать кучу из базы
+    RELOAD_INTERVAL = 60.0
+    # Сколько напоминаний забирать из базы за один запрос
+    BATCH = 500
+    # Пауза после ошибки базы перед новой попыткой
+    RETRY_DELAY = 5.0
+
+    def __init__(self, send, clock=time.time):
+        self.send = send
+        self.clock = clock
+        self.sent = 0
+        self.skipped = 0
+        self.wakeups = 0
+        self.reloads = 0
+        self._heap = []  # моменты remind_at
+        self._horizon = None  # напоминания позже этого момента в кучу не загружены (None — загружены все)
+        self._reload_at = 0.0
+        self._cond = threading.Condition()
+        self._stopped = False
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="reminders", daemon=True)
+        self._thread.start()
+        return self
+
+    def schedule(self, remind_at):
+        """Сообщить о новом напоминании, уже записанном в базу"""
+        if remind_at is None:
+            return
+        with self._cond:
+            if self._horizon is not None and remind_at > self._horizon:
+                # За пределами загруженного окна: попадет в кучу при загрузке следующего
+                return
+            heapq.heappush(self._heap, remind_at)
+            if self._heap[0] == remind_at:
+                self._cond.notify_all()
+
+    def _reload(self, now):
+        rows = storage.get_next_reminders(self.WINDOW)
+        # Строки уже отсортированы по времени, а отсортированный список — корректная куча
+        self._heap = [row[0] for row in rows]
+        self._horizon = rows[-1][0] if len(rows) == self.WINDOW else None
+        self._reload_at = now + self.RELOAD_INTERVAL
+        self.reloads += 1
+
+    def _wait_due(self):
+        """Ожидание ближайшего напоминания; возвращает текущее время или None при остановке"""
+        with self._cond:
+            while not self._stopped:
+                now = self.clock()
+                if now >= self._reload_at or (not self._heap and self._horizon is not None):
+                    self._reload(now)
+                if self._heap and self._heap[0] <= now:
+                    # Все наступившие моменты забирает один проход по базе
+                    while self._heap and self._heap[0] <= now:
+                        heapq.heappop(self._heap)
+                    self.wakeups += 1
+                    return now
+                wake_at = min(self._heap[0], self._reload_at) if self._heap else self._reload_at
+                self._cond.wait(wake_at - now)
+        return None
+
+    def deliver(self, now):
+        """Отправка всех напоминаний, наступивших к now"""
+        while True:
+            tasks = storage.claim_due_reminders(now, self.BATCH)
+            for task in tasks:
+                if task["done"]:
+                    self.skipped += 1
+                    continue
+                try:
+                    self.send(task)
+                    self.sent += 1
+                except Exception as e:
+                    print(f"Ошибка отправки напоминания по задаче {task['id']}: {e}")
+            if len(tasks) < self.BATCH:
+                return
+
+    def _run(self):
+        while True:
+            try:
+                now = self._wait_due()
+                if now is None:
+                    return
+                self.deliver(now)
+            except Exception as e:
+                print(f"Ошибка планировщика напоминаний: {e}")
+                with self._cond:
+                    # Напоминания остались в базе: перечитаем кучу после паузы
+                    self._reload_at = 0.0
+                    self._cond.wait(self.RETRY_DELAY)
+
+    def pending(self):
+        with self._cond:
+            return len(self._heap)
+
+    def stats(self):
+        with self._cond:
+            return {"sent": self.sent, "skipped": self.skipped, "wakeups": self.wakeups,
+                    "reloads": self.reloads, "pending": len(self._heap)}
+
+    def stop(self, timeout=5.0):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
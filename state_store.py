@@ -0,0 +1,221 @@
+"""Хранилища состояний диалога (user_states) с API словаря
+
+    store[user_id] = "add_task"     # запомнить состояние
+    store.get(user_id)              # прочитать (None, если нет или истекло)
+    store[user_id] = None           # сбросить
+
+MemoryStateStore держит состояния в процессе (LRU + TTL). SQLiteStateStore
+дополнительно сохраняет их в таблицу user_states фоновым потоком пачками,
+поэтому состояние переживает перезапуск и видно другим процессам бота.
+"""
+
+import atexit
+import threading
+import time
+from collections import OrderedDict
+
+import storage
+
+
+class MemoryStateStore:
+    """Состояния в памяти: вытеснение самых давних при переполнении и истечение по TTL"""
+
+    def __init__(self, max_size=10000, ttl=3600.0, clock=time.time):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.clock = clock
+        self.evicted = 0
+        self._items = OrderedDict()  # {user_id: (state, expires_at)}
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                return default
+            if item[1] <= self.clock():
+                del self._items[key]
+                return default
+            self._items.move_to_end(key)
+            return item[0]
+
+    def __getitem__(self, key):
+        value = self.get(key)
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key, value):
+        with self._lock:
+            if value is None:
+                self._items.pop(key, None)
+                return
+            self._items[key] = (value, self.clock() + self.ttl)
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+                self.evicted += 1
+
+    def __delitem__(self, key):
+        self[key] = None
+
+    def pop(self, key, default=None):
+        value = self.get(key, default)
+        self[key] = None
+        return value
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def __len__(self):
+        with self._lock:
+            return len(self._items)
+
+    def close(self):
+        pass
+
+
+class SQLiteStateStore:
+    """Состояния в SQLite с отложенной пакетной записью
+
+    Запись сразу видна в этом процессе и попадает в базу не позже чем через
+    flush_interval секунд одной транзакцией вместе с другими изменениями.
+    Чтения берутся из локального кэша, который считается свежим cache_ttl
+    секунд, иначе из базы — так изменения других процессов бота видны
+    с задержкой не больше cache_ttl.
+    """
+
+    # Как часто удалять истекшие строки из таблицы
+    PURGE_INTERVAL = 60.0
+    # Пауза перед повтором неудавшейся записи: удваивается после каждой неудачи до RETRY_MAX
+    RETRY_DELAY = 0.5
+    RETRY_MAX = 30.0
+
+    def __init__(self, ttl=3600.0, flush_interval=0.2, cache_ttl=1.0, max_cached=10000, clock=time.time):
+        self.ttl = ttl
+        self.flush_interval = flush_interval
+        self.cache_ttl = cache_ttl
+        self.clock = clock
+        self.flushes = 0
+        self.written = 0
+        self.failed = 0
+        self._cache = MemoryStateStore(max_size=max_cached, ttl=cache_ttl, clock=clock)
+        self._pending = {}  # {user_id: (state, expires_at) или None для удаления}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = False
+        self._purged_at = 0.0
+        self._thread = threading.Thread(target=self._run, name="state-store-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def get(self, key, default=None):
+        now = self.clock()
+        with self._lock:
+            if key in self._pending:
+                item = self._pending[key]
+                return item[0] if item is not None and item[1] > now else default
+        # В кэше хранится пара (state, expires_at); отсутствие в базе кэшируется как (None, 0)
+        cached = self._cache.get(key)
+        if cached is None:
+            row = storage.get_connection().execute(
+                'SELECT state, expires_at FROM user_states WHERE user_id = ?', (key,)
+            ).fetchone()
+            cached = tuple(row) if row else (None, 0)
+            self._cache[key] = cached
+        return cached[0] if cached[0] is not None and cached[1] > now else default
+
+    def __getitem__(self, key):
+        value = self.get(key)
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key, value):
+        item = None if value is None else (value, self.clock() + self.ttl)
+        with self._lock:
+            self._pending[key] = item
+        self._cache[key] = item or (None, 0)
+        self._wakeup.set()
+
+    def __delitem__(self, key):
+        self[key] = None
+
+    def pop(self, key, default=None):
+        value = self.get(key, default)
+        self[key] = None
+        return value
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def flush(self):
+        """Запись накопленных изменений одной транзакцией"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        now = self.clock()
+        purge = now - self._purged_at >= self.PURGE_INTERVAL
+        if not pending and not purge:
+            return
+        upserts = [(key, item[0], item[1]) for key, item in pending.items() if item is not None]
+        deletes = [(key,) for key, item in pending.items() if item is None]
+
+        def write(conn):
+            if upserts:
+                conn.executemany(
+                    'INSERT INTO user_states (user_id, state, expires_at) VALUES (?, ?, ?) '
+                    'ON CONFLICT (user_id) DO UPDATE SET state = excluded.state, expires_at = excluded.expires_at',
+                    upserts
+                )
+            if deletes:
+                conn.executemany('DELETE FROM user_states WHERE user_id = ?', deletes)
+            if purge:
+                conn.execute('DELETE FROM user_states WHERE expires_at <= ?', (now,))
+
+        try:
+            # Как и остальные записи: BEGIN IMMEDIATE и повторы, пока база занята другим процессом
+            storage.run_transaction(write)
+        except Exception:
+            # Не теряем изменения: вернем их в очередь, если поверх не записали более новые
+            with self._lock:
+                for key, item in pending.items():
+                    self._pending.setdefault(key, item)
+            raise
+        if purge:
+            self._purged_at = now
+        self.flushes += 1
+        self.written += len(pending)
+
+    def _run(self):
+        delay = self.flush_interval
+        while not self._stopped:
+            self._wakeup.wait()
+            # Копим изменения flush_interval секунд, чтобы записать их одной транзакцией
+            time.sleep(delay)
+            self._wakeup.clear()
+            try:
+                self.flush()
+                delay = self.flush_interval
+            except Exception as e:
+                self.failed += 1
+                print(f"Ошибка записи состояний: {e}")
+                # Изменения вернулись в очередь: повторим сами, не дожидаясь следующей записи
+                delay = min(max(delay * 2, self.RETRY_DELAY), self.RETRY_MAX)
+                self._wakeup.set()
+
+    def close(self):
+        if self._stopped:
+            return
+        self._stopped = True
+        self._wakeup.set()
+        self._thread.join(timeout=5)
+        self.flush()
+
+
+def make_state_store(kind="memory", ttl=3600.0, max_size=10000):
+    """Хранилище состояний по имени из настроек: memory или sqlite"""
+    if kind == "sqlite":
+        return SQLiteStateStore(ttl=ttl, max_cached=max_size)
+    if kind == "memory":
+        return MemoryStateStore(max_size=max_size, ttl=ttl)
+    raise ValueError(f"Неизвестное хранилище состояний: {kind}")
@@ -0,0 +1,736 @@
+"""Общий слой доступа к SQLite для Telegram бота и Desktop-приложения"""
+
+import functools
+import re
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+from contextlib import contextmanager
+
+import metrics
+import migrations
+from locking import LockRetry
+
+DB_NAME = "tasks_bot.db"
+
+# Размер кэша подготовленных выражений на одно соединение
+STATEMENT_CACHE_SIZE = 256
+
+PRAGMAS = (
+    "PRAGMA journal_mode = WAL",
+    # В режиме WAL NORMAL не теряет целостность, но не делает fsync на каждый commit
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA cache_size = -16000",
+    "PRAGMA mmap_size = 134217728",
+)
+
+# Сколько миллисекунд ждать блокировку записи, занятую другим процессом (бот, панель, dbtool)
+BUSY_TIMEOUT_MS = 5000
+
+# Повторы транзакций записи, которым не хватило BUSY_TIMEOUT_MS; счетчики — в lock_retry.stats()
+lock_retry = LockRetry()
+metrics.REGISTRY.register_collector("db_locks", lock_retry.stats)
+
+_local = threading.local()
+
+# Поток групповой записи (writer.WriteCoalescer); None — каждая запись своей транзакцией
+_writer = None
+
+# Пользователи, которые точно есть в таблице users: их /start не пишет в базу.
+# Пользователи не удаляются, поэтому множество не устаревает; при переполнении оно сбрасывается
+KNOWN_USERS_MAX = 100000
+_known_users = set()
+
+# Сколько часов хранить журнал изменений: панель, не читавшая его дольше, перечитывает все заново
+CHANGES_RETENTION_HOURS = 168
+
+
+def configure(db_name):
+    """Смена файла базы данных (соединения потоков переоткроются при следующем обращении)"""
+    global DB_NAME
+    DB_NAME = db_name
+    _known_users.clear()
+
+
+def configure_locking(busy_timeout_ms=None, retries=None, retry_delay=None, retry_budget=None):
+    """Ожидание блокировки (для новых соединений) и политика повторов при занятой базе"""
+    global BUSY_TIMEOUT_MS
+    if busy_timeout_ms is not None:
+        BUSY_TIMEOUT_MS = busy_timeout_ms
+    if retries is not None:
+        lock_retry.retries = retries
+    if retry_delay is not None:
+        lock_retry.base_delay = retry_delay
+    if retry_budget is not None:
+        lock_retry.budget_ratio = retry_budget
+
+
+def set_writer(writer):
+    """Запись через поток групповых транзакций writer (None — каждая запись сразу)"""
+    global _writer
+    _writer = writer
+
+
+def get_writer():
+    return _writer
+
+
+def connect(db_name=None):
+    """Открытие нового настроенного соединения"""
+    conn = sqlite3.connect(db_name or DB_NAME, cached_statements=STATEMENT_CACHE_SIZE)
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
+    conn.execute(f"PRAGMA busy_timeout = {int(BUSY_TIMEOUT_MS)}")
+    return conn
+
+
+def get_connection():
+    """Долгоживущее соединение текущего потока"""
+    started = time.perf_counter()
+    conn = getattr(_local, "conn", None)
+    if conn is not None and _local.db_name == DB_NAME:
+        metrics.DB_CONNECTION_SECONDS.observe(time.perf_counter() - started, "reused")
+        return conn
+    if conn is not None:
+        conn.close()
+    conn = connect()
+    _local.conn = conn
+    _local.db_name = DB_NAME
+    metrics.DB_CONNECTION_SECONDS.observe(time.perf_counter() - started, "opened")
+    return conn
+
+
+def close_connection():
+    """Закрытие соединения текущего потока"""
+    conn = getattr(_local, "conn", None)
+    if conn is not None:
+        conn.close()
+        _local.conn = None
+
+
+@contextmanager
+def transaction():
+    """Транзакция записи на соединении текущего потока: commit при успехе, rollback при ошибке
+
+    Начинается с BEGIN IMMEDIATE, поэтому занятая база ждется в начале, а не
+    обрывает транзакцию посередине.
+    """
+    conn = get_connection()
+    lock_retry.begin(conn)
+    try:
+        yield conn
+    except BaseException:
+        conn.rollback()
+        raise
+    conn.commit()
+
+
+def run_transaction(fn, *args, **kwargs):
+    """fn(conn, *args, **kwargs) в транзакции; при занятой базе транзакция повторяется целиком"""
+    def attempt():
+        with transaction() as conn:
+            return fn(conn, *args, **kwargs)
+    return lock_retry.run(attempt)
+
+
+# Запросы горячего пути, которые обязаны идти по индексу: имя -> (SQL, параметры)
+HOT_QUERIES = {
+    "get_user_tasks": (
+        'SELECT task_id, task_text, is_done FROM tasks WHERE user_id = ? ORDER BY created_at DESC',
+        (1,)
+    ),
+    "count_done_tasks": ('SELECT COUNT(*) FROM tasks WHERE user_id = ? AND is_done = ?', (1, True)),
+    "get_user_tasks_page": (
+        'SELECT task_id FROM tasks WHERE user_id = ? '
+        "AND (created_at, task_id) < (datetime(?, 'unixepoch'), ?) "
+        'ORDER BY created_at DESC, task_id DESC LIMIT ?',
+        (1, 0, 1, 11)
+    ),
+    "get_user_task_stats": ('SELECT total, done, last_activity FROM user_task_stats WHERE user_id = ?', (1,)),
+    "get_task": ('SELECT task_id, task_text, is_done, due_at, remind_at FROM tasks WHERE task_id = ?', (1,)),
+    "is_admin": ('SELECT 1 FROM admins WHERE user_id = ?', (1,)),
+    "get_changes_since": (
+        'SELECT seq, table_name, op, row_id, user_id FROM changes WHERE seq > ? ORDER BY seq LIMIT ?',
+        (0, 1001)
+    ),
+    "get_next_reminders": (
+        'SELECT remind_at, task_id FROM tasks WHERE remind_at IS NOT NULL ORDER BY remind_at LIMIT ?',
+        (1000,)
+    ),
+    "claim_due_reminders": ('SELECT task_id FROM tasks WHERE remind_at <= ? ORDER BY remind_at LIMIT ?', (0, 500)),
+    # Третий элемент — строки плана, которые для запроса ожидаемы: обзор читает всех пользователей,
+    # а поиск сортирует по bm25 только найденные FTS строки
+    "get_users_overview": (
+        'SELECT u.user_id, u.username, u.first_name, u.last_name, '
+        'COALESCE(s.total, 0), COALESCE(s.done, 0), a.user_id IS NOT NULL '
+        'FROM users u '
+        'LEFT JOIN user_task_stats s ON s.user_id = u.user_id '
+        'LEFT JOIN admins a ON a.user_id = u.user_id',
+        (),
+        ("SCAN u",)
+    ),
+    "search_user_tasks": (
+        'SELECT t.task_id, t.task_text, t.is_done FROM tasks_fts '
+        'JOIN tasks t ON t.task_id = tasks_fts.rowid '
+        'WHERE tasks_fts MATCH ? '
+        'ORDER BY bm25(tasks_fts, 1.0, 0.0), tasks_fts.rowid DESC LIMIT ? OFFSET ?',
+        ('owner : "u1" AND task_text : ("задача"*)', 11, 0),
+        ("SCAN tasks_fts VIRTUAL TABLE INDEX 0:M", "USE TEMP B-TREE FOR ORDER BY")
+    ),
+}
+
+
+def init_db():
+    """Инициализация базы данных и применение миграций"""
+    return migrations.migrate(get_connection())
+
+
+def explain(sql, params=()):
+    """Строки EXPLAIN QUERY PLAN для запроса"""
+    rows = get_connection().execute(f'EXPLAIN QUERY PLAN {sql}', params).fetchall()
+    return [row[3] for row in rows]
+
+
+def find_slow_plans(queries=None):
+    """Горячие запросы, план которых содержит полный скан таблицы или сортировку во временном B-дереве"""
+    problems = []
+    for name, (sql, params, *expected) in (queries or HOT_QUERIES).items():
+        allowed = expected[0] if expected else ()
+        for detail in explain(sql, params):
+            if detail.startswith(allowed):
+                continue
+            if detail.startswith("SCAN") or "TEMP B-TREE" in detail:
+                problems.append((name, detail))
+    return problems
+
+
+def _timed(fn):
+    """Замер функции работы с базой в гистограмме db_query_seconds под ее именем"""
+    return metrics.timed(metrics.DB_QUERY_SECONDS, fn.__name__)(fn)
+
+
+def submit_write(fn, *args, **kwargs):
+    """Запись fn(conn, *args, **kwargs) в транзакции; Future с результатом, готовый после commit
+
+    С включенным потоком записи запись уходит в его пачку, иначе выполняется сразу.
+    """
+    writer = _writer
+    if writer is not None:
+        try:
+            return writer.submit(lambda conn: fn(conn, *args, **kwargs))
+        except RuntimeError:
+            pass  # поток записи уже остановлен при выходе: пишем сами
+    future = Future()
+    try:
+        future.set_result(run_transaction(fn, *args, **kwargs))
+    except Exception as e:
+        future.set_exception(e)
+    return future
+
+
+def _write_op(fn):
+    """Функция записи fn(conn, ...) вызывается без conn и ждет commit;
+    .submit(...) вместо ожидания возвращает Future"""
+    @functools.wraps(fn)
+    def write(*args, **kwargs):
+        return submit_write(fn, *args, **kwargs).result()
+    write.submit = functools.partial(submit_write, fn)
+    write.fn = fn
+    return write
+
+
+def write_logged(on_logged, op, *args, **kwargs):
+    """Запись op (функции с _write_op) своей транзакцией, минуя поток записи
+
+    on_logged получает range номеров seq, которые запись добавила в журнал
+    изменений, еще до коммита — другие соединения увидят эти записи журнала
+    уже отмеченными. Пока транзакция держит блокировку записи, журнал никто
+    больше не пополняет, поэтому все номера между значениями до и после op — ее.
+    """
+    def logged(conn):
+        before = _last_change_seq(conn)
+        result = op.fn(conn, *args, **kwargs)
+        on_logged(range(before + 1, _last_change_seq(conn) + 1))
+        return result
+    return run_transaction(logged)
+
+
+@_write_op
+def _insert_user(conn, user_id, username, first_name, last_name):
+    conn.execute(
+        'INSERT OR IGNORE INTO users (user_id, username, first_name, last_name) VALUES (?, ?, ?, ?)',
+        (user_id, username, first_name, last_name)
+    )
+
+
+@_timed
+def ensure_user_exists(user_id, username=None, first_name=None, last_name=None):
+    """Создает запись пользователя если не существует (известных пользователей — без обращения к базе)"""
+    if user_id in _known_users:
+        return
+    _insert_user(user_id, username, first_name, last_name)
+    _remember_user(user_id)
+
+
+def _submit_ensure_user(user_id, username=None, first_name=None, last_name=None):
+    """ensure_user_exists без ожидания: Future, готовый после commit"""
+    if user_id in _known_users:
+        future = Future()
+        future.set_result(None)
+        return future
+    future = _insert_user.submit(user_id, username, first_name, last_name)
+    future.add_done_callback(lambda done: done.exception() is None and _remember_user(user_id))
+    return future
+
+
+ensure_user_exists.submit = _submit_ensure_user
+
+
+def _remember_user(user_id):
+    if len(_known_users) >= KNOWN_USERS_MAX:
+        _known_users.clear()
+    _known_users.add(user_id)
+
+
+@_timed
+def get_user_tasks(user_id):
+    """Получение задач пользователя"""
+    tasks = get_connection().execute(
+        'SELECT task_id, task_text, is_done FROM tasks WHERE user_id = ? ORDER BY created_at DESC',
+        (user_id,)
+    ).fetchall()
+    return [{"id": task[0], "text": task[1], "done": bool(task[2])} for task in tasks]
+
+
+@_timed
+def get_task(task_id, user_id=None):
+    """Получение одной задачи (с user_id — только если она принадлежит этому пользователю)"""
+    sql = 'SELECT task_id, task_text, is_done, due_at, remind_at FROM tasks WHERE task_id = ?'
+    params = (task_id,)
+    if user_id is not None:
+        sql += ' AND user_id = ?'
+        params += (user_id,)
+    task = get_connection().execute(sql, params).fetchone()
+    if task is None:
+        return None
+    return {"id": task[0], "text": task[1], "done": bool(task[2]), "due_at": task[3], "remind_at": task[4]}
+
+
+@_timed
+@_write_op
+def add_user_task(conn, user_id, task_text):
+    """Добавление новой задачи"""
+    cursor = conn.execute(
+        'INSERT INTO tasks (user_id, task_text) VALUES (?, ?)',
+        (user_id, task_text)
+    )
+    return cursor.lastrowid
+
+
+@_timed
+@_write_op
+def update_task_status(conn, task_id, is_done):
+    """Обновление статуса задачи"""
+    conn.execute('UPDATE tasks SET is_done = ? WHERE task_id = ?', (is_done, task_id))
+
+
+@_timed
+@_write_op
+def delete_task(conn, task_id):
+    """Удаление задачи"""
+    conn.execute('DELETE FROM tasks WHERE task_id = ?', (task_id,))
+
+
+@_timed
+@_write_op
+def add_user_tasks(conn, user_id, task_texts):
+    """Добавление нескольких задач одной транзакцией, возвращает их id по порядку"""
+    rows = [(user_id, text) for text in task_texts]
+    if not rows:
+        return []
+    conn.executemany('INSERT INTO tasks (user_id, task_text) VALUES (?, ?)', rows)
+    # Под блокировкой записи AUTOINCREMENT выдает id подряд, последний — у последней строки
+    last_id = conn.execute('SELECT last_insert_rowid()').fetchone()[0]
+    return list(range(last_id - len(rows) + 1, last_id + 1))
+
+
+@_timed
+@_write_op
+def update_tasks_status(conn, task_ids, is_done):
+    """Смена статуса нескольких задач одной транзакцией"""
+    conn.executemany('UPDATE tasks SET is_done = ? WHERE task_id = ?', ((is_done, task_id) for task_id in task_ids))
+
+
+@_timed
+@_write_op
+def delete_tasks(conn, task_ids):
+    """Удаление нескольких задач одной транзакцией"""
+    conn.executemany('DELETE FROM tasks WHERE task_id = ?', ((task_id,) for task_id in task_ids))
+
+
+@_timed
+def is_admin(user_id):
+    """Проверка наличия пользователя в таблице администраторов"""
+    result = get_connection().execute(
+        'SELECT 1 FROM admins WHERE user_id = ?', (user_id,)
+    ).fetchone()
+    return result is not None
+
+
+@_timed
+@_write_op
+def add_admin(conn, user_id, added_by=None):
+    """Добавление администратора"""
+    conn.execute(
+        'INSERT OR REPLACE INTO admins (user_id, added_by) VALUES (?, ?)',
+        (user_id, added_by)
+    )
+
+
+@_timed
+def get_all_users():
+    """Получение списка всех пользователей"""
+    users = get_connection().execute(
+        'SELECT user_id, username, first_name, last_name FROM users'
+    ).fetchall()
+    return [{"id": user[0], "username": user[1], "first_name": user[2], "last_name": user[3]} for user in users]
+
+
+@_timed
+def get_users_overview():
+    """Все пользователи со счетчиками задач и флагом администратора за один запрос"""
+    rows = get_connection().execute('''
+        SELECT u.user_id, u.username, u.first_name, u.last_name,
+               COALESCE(s.total, 0), COALESCE(s.done, 0), a.user_id IS NOT NULL
+        FROM users u
+        LEFT JOIN user_task_stats s ON s.user_id = u.user_id
+        LEFT JOIN admins a ON a.user_id = u.user_id
+    ''').fetchall()
+    return [
+        {"id": row[0], "username": row[1], "first_name": row[2], "last_name": row[3],
+         "total": row[4], "done": row[5], "is_admin": bool(row[6])}
+        for row in rows
+    ]
+
+
+def _keyset_page(rows, limit, backwards, has_cursor):
+    """Разбор выборки limit + 1 строк в страницу и признаки соседних страниц"""
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if backwards:
+        rows.reverse()
+        return rows, has_more, has_cursor
+    return rows, has_cursor, has_more
+
+
+@_timed
+def get_user_tasks_page(user_id, cursor=None, backwards=False, limit=10):
+    """Страница задач пользователя (новые сверху) с курсором по (created_at, task_id)
+
+    cursor — пара (created_at в секундах unix, task_id) граничной задачи.
+    Вперед отдаются задачи старше курсора, назад (backwards) — новее.
+    Выбирается только limit + 1 строк.
+    """
+    conn = get_connection()
+    columns = "task_id, task_text, is_done, CAST(strftime('%s', created_at) AS INTEGER)"
+    if cursor is None:
+        rows = conn.execute(
+            f'SELECT {columns} FROM tasks WHERE user_id = ? '
+            'ORDER BY created_at DESC, task_id DESC LIMIT ?',
+            (user_id, limit + 1)
+        ).fetchall()
+    elif backwards:
+        rows = conn.execute(
+            f'SELECT {columns} FROM tasks WHERE user_id = ? '
+            "AND (created_at, task_id) > (datetime(?, 'unixepoch'), ?) "
+            'ORDER BY created_at ASC, task_id ASC LIMIT ?',
+            (user_id, cursor[0], cursor[1], limit + 1)
+        ).fetchall()
+    else:
+        rows = conn.execute(
+            f'SELECT {columns} FROM tasks WHERE user_id = ? '
+            "AND (created_at, task_id) < (datetime(?, 'unixepoch'), ?) "
+            'ORDER BY created_at DESC, task_id DESC LIMIT ?',
+            (user_id, cursor[0], cursor[1], limit + 1)
+        ).fetchall()
+
+    rows, has_prev, has_next = _keyset_page(rows, limit, backwards, cursor is not None)
+    return {
+        "tasks": [{"id": row[0], "text": row[1], "done": bool(row[2])} for row in rows],
+        "prev": (rows[0][3], rows[0][0]) if rows and has_prev else None,
+        "next": (rows[-1][3], rows[-1][0]) if rows and has_next else None,
+    }
+
+
+@_timed
+def get_users_page(cursor=None, backwards=False, limit=10):
+    """Страница пользователей по возрастанию user_id с курсором по user_id"""
+    conn = get_connection()
+    if cursor is None:
+        rows = conn.execute(
+            'SELECT user_id, username, first_name, last_name FROM users ORDER BY user_id LIMIT ?',
+            (limit + 1,)
+        ).fetchall()
+    elif backwards:
+        rows = conn.execute(
+            'SELECT user_id, username, first_name, last_name FROM users '
+            'WHERE user_id < ? ORDER BY user_id DESC LIMIT ?',
+            (cursor, limit + 1)
+        ).fetchall()
+    else:
+        rows = conn.execute(
+            'SELECT user_id, username, first_name, last_name FROM users '
+            'WHERE user_id > ? ORDER BY user_id LIMIT ?',
+            (cursor, limit + 1)
+        ).fetchall()
+
+    rows, has_prev, has_next = _keyset_page(rows, limit, backwards, cursor is not None)
+    return {
+        "users": [{"id": row[0], "username": row[1], "first_name": row[2], "last_name": row[3]} for row in rows],
+        "prev": rows[0][0] if rows and has_prev else None,
+        "next": rows[-1][0] if rows and has_next else None,
+    }
+
+
+@_timed
+def get_user_task_stats(user_id):
+    """Счетчики задач пользователя из user_task_stats: total, done, last_activity"""
+    row = get_connection().execute(
+        'SELECT total, done, last_activity FROM user_task_stats WHERE user_id = ?', (user_id,)
+    ).fetchone()
+    if row is None:
+        return {"total": 0, "done": 0, "last_activity": None}
+    return {"total": row[0], "done": row[1], "last_activity": row[2]}
+
+
+@_timed
+def count_user_tasks(user_id):
+    """Количество задач пользователя (одно чтение по первичному ключу)"""
+    return get_user_task_stats(user_id)["total"]
+
+
+@_timed
+def get_user_task_counts(user_id):
+    """Всего задач пользователя и сколько из них выполнено"""
+    stats = get_user_task_stats(user_id)
+    return stats["total"], stats["done"]
+
+
+# Счетчики, пересчитанные по таблице tasks, для сверки с user_task_stats
+_ACTUAL_TASK_STATS = '''
+    SELECT user_id, COUNT(*), SUM(COALESCE(is_done, 0) != 0), MAX(created_at)
+    FROM tasks GROUP BY user_id
+'''
+
+
+@_timed
+def verify_user_task_stats():
+    """Расхождения user_task_stats с таблицей tasks: [(user_id, (total, done) в таблице, фактические)]"""
+    conn = get_connection()
+    stored = {row[0]: (row[1], row[2]) for row in conn.execute('SELECT user_id, total, done FROM user_task_stats')}
+    actual = {row[0]: (row[1], row[2]) for row in conn.execute(_ACTUAL_TASK_STATS)}
+    mismatches = []
+    for user_id in sorted(stored.keys() | actual.keys()):
+        expected = actual.get(user_id, (0, 0))
+        if stored.get(user_id, (0, 0)) != expected:
+            mismatches.append((user_id, stored.get(user_id), expected))
+    return mismatches
+
+
+@_timed
+@_write_op
+def rebuild_user_task_stats(conn):
+    """Полный пересчет user_task_stats по таблице tasks, возвращает число пользователей"""
+    conn.execute('DELETE FROM user_task_stats')
+    conn.execute(
+        f'INSERT INTO user_task_stats (user_id, total, done, last_activity) {_ACTUAL_TASK_STATS}'
+    )
+    return conn.execute('SELECT COUNT(*) FROM user_task_stats').fetchone()[0]
+
+
+def iter_user_tasks(user_id, batch_size=500):
+    """Ленивый обход задач пользователя пачками по batch_size строк
+
+    Каждая пачка — отдельный keyset-запрос, поэтому между пачками не держится
+    открытый курсор и обход можно продолжать из другого потока.
+    """
+    cursor = None
+    while True:
+        page = get_user_tasks_page(user_id, cursor, limit=batch_size)
+        yield from page["tasks"]
+        cursor = page["next"]
+        if cursor is None:
+            return
+
+
+@_timed
+def get_counter(name):
+    """Значение счетчика изменений из db_counters (растет при каждой записи в отслеживаемую таблицу)"""
+    row = get_connection().execute('SELECT value FROM db_counters WHERE name = ?', (name,)).fetchone()
+    return row[0] if row else 0
+
+
+@_timed
+def get_data_version():
+    """PRAGMA data_version: меняется, когда другое соединение зафиксировало запись в БД"""
+    return get_connection().execute('PRAGMA data_version').fetchone()[0]
+
+
+@_timed
+def get_last_change_seq():
+    """Номер последней записи журнала изменений (0, если журнал пуст)"""
+    return _last_change_seq(get_connection())
+
+
+def _last_change_seq(conn):
+    row = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'changes'").fetchone()
+    return row[0] if row else 0
+
+
+@_timed
+def get_changes_since(seq, limit=1000):
+    """Записи журнала изменений новее seq по возрастанию
+
+    Возвращает (изменения, полный ли ответ). Если с seq накопилось больше limit
+    записей или часть из них уже удалена очисткой, ответ неполный — читателю
+    нужно перечитать данные целиком и продолжить с последнего seq.
+    """
+    conn = get_connection()
+    rows = conn.execute(
+        'SELECT seq, table_name, op, row_id, user_id FROM changes WHERE seq > ? ORDER BY seq LIMIT ?',
+        (seq, limit + 1)
+    ).fetchall()
+    changes = [
+        {"seq": row[0], "table": row[1], "op": row[2], "row_id": row[3], "user_id": row[4]}
+        for row in rows[:limit]
+    ]
+    # AUTOINCREMENT не оставляет пропусков при откатах, поэтому пропуск означает очистку журнала
+    if changes:
+        complete = len(rows) <= limit and changes[0]["seq"] == seq + 1
+    else:
+        complete = get_last_change_seq() <= seq
+    return changes, complete
+
+
+@_timed
+@_write_op
+def compact_changes(conn, retention_seconds):
+    """Удаление записей журнала изменений старше retention_seconds, возвращает число удаленных
+
+    seq растет вместе со временем, поэтому граница ищется от начала журнала
+    и удаляется диапазон по первичному ключу.
+    """
+    row = conn.execute(
+        "SELECT seq FROM changes WHERE changed_at >= datetime('now', ?) ORDER BY seq LIMIT 1",
+        (f'-{max(0, int(retention_seconds))} seconds',)
+    ).fetchone()
+    if row is None:
+        cursor = conn.execute('DELETE FROM changes')
+    else:
+        cursor = conn.execute('DELETE FROM changes WHERE seq < ?', (row[0],))
+    return cursor.rowcount
+
+
+@_timed
+def get_tasks_by_ids(task_ids):
+    """Задачи по списку id (отсутствующие пропускаются)"""
+    task_ids = list(task_ids)
+    if not task_ids:
+        return []
+    placeholders = ", ".join("?" * len(task_ids))
+    rows = get_connection().execute(
+        f'SELECT task_id, task_text, is_done, user_id FROM tasks WHERE task_id IN ({placeholders})',
+        task_ids
+    ).fetchall()
+    return [{"id": row[0], "text": row[1], "done": bool(row[2]), "user_id": row[3]} for row in rows]
+
+
+def fts_query(text):
+    """Запрос FTS5 из произвольного текста: все слова должны встретиться, каждое как префикс
+
+    Слова берутся только из букв и цифр, поэтому синтаксис FTS5 из ввода пользователя
+    не попадает в запрос. None — если слов нет.
+    """
+    words = re.findall(r"\w+", text.lower().replace("ё", "е"))
+    if not words:
+        return None
+    return " ".join(f'"{word}"*' for word in words)
+
+
+@_timed
+def search_user_tasks(user_id, text, offset=0, limit=10):
+    """Поиск по задачам пользователя, самые релевантные сначала (bm25)
+
+    Возвращает {"tasks", "prev", "next"}, где prev/next — смещения соседних страниц.
+    """
+    terms = fts_query(text)
+    if terms is None:
+        return {"tasks": [], "prev": None, "next": None}
+    rows = get_connection().execute(
+        'SELECT t.task_id, t.task_text, t.is_done FROM tasks_fts '
+        'JOIN tasks t ON t.task_id = tasks_fts.rowid '
+        'WHERE tasks_fts MATCH ? '
+        'ORDER BY bm25(tasks_fts, 1.0, 0.0), tasks_fts.rowid DESC LIMIT ? OFFSET ?',
+        (f'owner : "u{int(user_id)}" AND task_text : ({terms})', limit + 1, offset)
+    ).fetchall()
+    return {
+        "tasks": [{"id": row[0], "text": row[1], "done": bool(row[2])} for row in rows[:limit]],
+        "prev": max(offset - limit, 0) if offset > 0 else None,
+        "next": offset + limit if len(rows) > limit else None,
+    }
+
+
+@_timed
+@_write_op
+def set_task_reminder(conn, task_id, user_id, remind_at):
+    """Время напоминания по задаче пользователя (unix-время, None — без напоминания);
+    False, если у пользователя нет такой задачи"""
+    cursor = conn.execute('UPDATE tasks SET remind_at = ? WHERE task_id = ? AND user_id = ?',
+                          (remind_at, task_id, user_id))
+    return cursor.rowcount > 0
+
+
+@_timed
+@_write_op
+def set_task_due(conn, task_id, user_id, due_at):
+    """Срок задачи пользователя (unix-время), напоминание переносится на срок;
+    False, если у пользователя нет такой задачи"""
+    cursor = conn.execute('UPDATE tasks SET due_at = ?, remind_at = ? WHERE task_id = ? AND user_id = ?',
+                          (due_at, due_at, task_id, user_id))
+    return cursor.rowcount > 0
+
+
+@_timed
+def get_next_reminders(limit=1000):
+    """Ближайшие ожидающие напоминания [(remind_at, task_id)] по возрастанию времени (по индексу)"""
+    return get_connection().execute(
+        'SELECT remind_at, task_id FROM tasks WHERE remind_at IS NOT NULL ORDER BY remind_at LIMIT ?',
+        (limit,)
+    ).fetchall()
+
+
+@_timed
+def claim_due_reminders(now, limit=500):
+    """Забирает до limit наступивших напоминаний: сбрасывает remind_at и возвращает задачи
+
+    Выборка и сброс — один UPDATE ... RETURNING, поэтому напоминание получит
+    только один процесс бота, даже если их запущено несколько.
+    """
+    rows = run_transaction(lambda conn: conn.execute(
+        'UPDATE tasks SET remind_at = NULL WHERE task_id IN ('
+        '    SELECT task_id FROM tasks WHERE remind_at <= ? ORDER BY remind_at LIMIT ?'
+        ') RETURNING task_id, user_id, task_text, is_done, due_at',
+        (now, limit)
+    ).fetchall())
+    return [
+        {"id": row[0], "user_id": row[1], "text": row[2], "done": bool(row[3]), "due_at": row[4]}
+        for row in rows
+    ]
+
+
+@_timed
+def count_pending_reminders():
+    """Сколько напоминаний ждет отправки"""
+    return get_connection().execute('SELECT COUNT(*) FROM tasks WHERE remind_at IS NOT NULL').fetchone()[0]
@@ -0,0 +1,83 @@
+"""Потоковая отрисовка длинных списков задач: сообщения по частям и выгрузка в файл"""
+
+import csv
+import io
+import tempfile
+
+# Ограничение Telegram на длину текста сообщения
+MESSAGE_LIMIT = 4096
+
+# До этого размера файл выгрузки держится в памяти, дальше сбрасывается на диск
+SPOOL_MAX_SIZE = 1024 * 1024
+
+
+def format_task_line(task):
+    return f"{'✅' if task['done'] else '🔘'} {task['text']}\n"
+
+
+def message_length(text):
+    """Длина текста так, как ее считает Telegram (в кодовых единицах UTF-16)"""
+    return len(text.encode("utf-16-le")) // 2
+
+
+def split_long_line(line, limit):
+    """Нарезка одной строки на куски не длиннее limit"""
+    piece = ""
+    size = 0
+    for char in line:
+        char_size = message_length(char)
+        if size + char_size > limit:
+            yield piece
+            piece = ""
+            size = 0
+        piece += char
+        size += char_size
+    if piece:
+        yield piece
+
+
+def iter_message_chunks(lines, header="", limit=MESSAGE_LIMIT):
+    """Склейка строк в сообщения не длиннее limit
+
+    В памяти держится только текущее сообщение. Строка длиннее limit
+    режется на несколько сообщений.
+    """
+    chunk = header
+    size = message_length(header)
+    for line in lines:
+        line_size = message_length(line)
+        if line_size > limit:
+            if chunk:
+                yield chunk
+            pieces = list(split_long_line(line, limit))
+            yield from pieces[:-1]
+            chunk = pieces[-1]
+            size = message_length(chunk)
+            continue
+        if size + line_size > limit:
+            yield chunk
+            chunk = ""
+            size = 0
+        chunk += line
+        size += line_size
+    if chunk:
+        yield chunk
+
+
+def spool_tasks_document(tasks, fmt="csv"):
+    """Запись задач во временный файл (csv или txt), возвращает двоичный файл в начале"""
+    document = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+    # utf-8-sig, чтобы Excel правильно открыл кириллицу в CSV
+    text = io.TextIOWrapper(document, encoding="utf-8-sig", newline="")
+    if fmt == "csv":
+        writer = csv.writer(text)
+        writer.writerow(["task_id", "task_text", "is_done"])
+        for task in tasks:
+            writer.writerow([task["id"], task["text"], int(task["done"])])
+    else:
+        for task in tasks:
+            text.write(format_task_line(task))
+    text.flush()
+    text.detach()
+    document.seek(0)
+    return document
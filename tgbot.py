@@ -1,195 +1,84 @@
-import telebot
-from telebot import types
-import sqlite3
-import os
-from dotenv import load_dotenv
+if __name__ == "__main__":
+    # Запуск скриптом: среду выполнения выбирает launcher, до создания объектов этого модуля
+    import sys
+    import launcher
+    sys.exit(launcher.main())
 
-load_dotenv()
+import io
+import sqlite3
+import time
 
-BOT_TOKEN = os.getenv("BOT_TOKEN")
-GENESIS_ADMIN_ID = int(os.getenv("GENESIS_ADMIN_ID"))
+import telebot
+from telebot import types
 
-if not all([BOT_TOKEN, GENESIS_ADMIN_ID]):
-    raise ValueError("Не все необходимые переменные окружения установлены в .env файле")
+import callbacks
+import metrics
+import storage
+import streaming
+import views
+from callbacks import CallbackRouter
+from config import (BOT_TOKEN, GENESIS_ADMIN_ID,
+                    ADMIN_VIEW_DOCUMENT_THRESHOLD, ADMIN_VIEW_DOCUMENT_FORMAT,
+                    WEBHOOK_URL, WEBHOOK_SECRET, WEBHOOK_HOST, WEBHOOK_PORT, WEBHOOK_PATH,
+                    WEBHOOK_WORKERS, WEBHOOK_QUEUE_SIZE, STATE_STORE, STATE_TTL, STATE_MAX_SIZE,
+                    OUTBOX_GLOBAL_RATE, OUTBOX_CHAT_RATE, OUTBOX_CHAT_BURST, OUTBOX_WORKERS, OUTBOX_MAX_RETRIES,
+                    PROFILE_INTERVAL, PROFILE_DIR,
+                    DB_WRITE_MODE, DB_WRITE_WINDOW_MS, DB_WRITE_MAX_BATCH,
+                    SQLITE_BUSY_TIMEOUT_MS, SQLITE_LOCK_RETRIES, SQLITE_RETRY_DELAY_MS, SQLITE_RETRY_BUDGET,
+                    BACKUP_DIR, BACKUP_INTERVAL_HOURS, BACKUP_KEEP, BACKUP_STEP_PAGES, BACKUP_STEP_PAUSE_MS,
+                    CHANGES_COMPACT_INTERVAL_MINUTES, CHANGES_RETENTION_HOURS)
+from storage import (ensure_user_exists, get_user_tasks, add_user_task,
+                     update_task_status, delete_task)
+from backup import BackupScheduler
+from compaction import ChangeLogCompactor
+from outbox import BULK, Outbox
+from profiler import SamplingProfiler
+from reminders import ReminderScheduler
+from state_store import make_state_store
+from locking import is_locked_error
+from writer import WriteCoalescer
+from views import is_admin, add_admin, main_menu
+from webhook import WebhookServer
 
 bot = telebot.TeleBot(BOT_TOKEN)
 
-DB_NAME = "tasks_bot.db"
-
-def init_db():
-    """Инициализация базы данных"""
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-    
-    # Таблица пользователей
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS users (
-            user_id INTEGER PRIMARY KEY,
-            username TEXT,
-            first_name TEXT,
-            last_name TEXT,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-    
-    # Таблица задач
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS tasks (
-            task_id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER,
-            task_text TEXT NOT NULL,
-            is_done BOOLEAN DEFAULT FALSE,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (user_id) REFERENCES users (user_id)
-        )
-    ''')
-    
-    # Таблица администраторов
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS admins (
-            user_id INTEGER PRIMARY KEY,
-            added_by INTEGER,
-            added_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (user_id) REFERENCES users (user_id)
-        )
-    ''')
-    
-    conn.commit()
-    conn.close()
-
-def get_db_connection():
-    """Получение соединения с базой данных"""
-    return sqlite3.connect(DB_NAME)
-
-
-def ensure_user_exists(user_id, username=None, first_name=None, last_name=None):
-    """Создает запись пользователя если не существует"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    cursor.execute(
-        'INSERT OR IGNORE INTO users (user_id, username, first_name, last_name) VALUES (?, ?, ?, ?)',
-        (user_id, username, first_name, last_name)
-    )
-    
-    conn.commit()
-    conn.close()
-
-def get_user_tasks(user_id):
-    """Получение задач пользователя"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    cursor.execute(
-        'SELECT task_id, task_text, is_done FROM tasks WHERE user_id = ? ORDER BY created_at DESC',
-        (user_id,)
-    )
-    
-    tasks = cursor.fetchall()
-    conn.close()
-    
-    return [{"id": task[0], "text": task[1], "done": bool(task[2])} for task in tasks]
-
-def add_user_task(user_id, task_text):
-    """Добавление новой задачи"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    cursor.execute(
-        'INSERT INTO tasks (user_id, task_text) VALUES (?, ?)',
-        (user_id, task_text)
-    )
-    
-    task_id = cursor.lastrowid
-    conn.commit()
-    conn.close()
-    
-    return task_id
-
-def update_task_status(task_id, is_done):
-    """Обновление статуса задачи"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    cursor.execute(
-        'UPDATE tasks SET is_done = ? WHERE task_id = ?',
-        (is_done, task_id)
-    )
-    
-    conn.commit()
-    conn.close()
-
-def delete_task(task_id):
-    """Удаление задачи"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    cursor.execute('DELETE FROM tasks WHERE task_id = ?', (task_id,))
-    
-    conn.commit()
-    conn.close()
-
-def is_admin(user_id):
-    """Проверка является ли пользователь администратором"""
-    if user_id == GENESIS_ADMIN_ID:
-        return True
-    
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    cursor.execute('SELECT 1 FROM admins WHERE user_id = ?', (user_id,))
-    result = cursor.fetchone()
-    conn.close()
-    
-    return result is not None
-
-def add_admin(user_id, added_by=None):
-    """Добавление администратора"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    cursor.execute(
-        'INSERT OR REPLACE INTO admins (user_id, added_by) VALUES (?, ?)',
-        (user_id, added_by)
-    )
-    
-    conn.commit()
-    conn.close()
-
-def get_all_users():
-    """Получение списка всех пользователей"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    cursor.execute('SELECT user_id, username, first_name, last_name FROM users')
-    users = cursor.fetchall()
-    conn.close()
-    
-    return [{"id": user[0], "username": user[1], "first_name": user[2], "last_name": user[3]} for user in users]
+# Кэш экранов помнит, что показано в сообщениях, только в этом процессе. С общим хранилищем
+# состояний (sqlite) обновления одного чата могут обрабатывать несколько процессов бота, и
+# пропущенная правка оставила бы на экране ответ другого процесса — тогда правки уходят всегда
+render_cache = views.render_cache if STATE_STORE == "memory" else None
 
-def get_user_tasks_by_id(user_id):
-    """Получение задач конкретного пользователя (для админа)"""
-    return get_user_tasks(user_id)
+# Обработчики отправляют сообщения через очередь: лимиты Telegram и ответы 429
+# обрабатываются в ней, а не обрывают обработчик
+outbox = Outbox(bot, global_rate=OUTBOX_GLOBAL_RATE, chat_rate=OUTBOX_CHAT_RATE, chat_burst=OUTBOX_CHAT_BURST,
+                workers=OUTBOX_WORKERS, max_retries=OUTBOX_MAX_RETRIES, render_cache=render_cache).start()
 
+# База общая с Desktop-панелью: сколько ждать ее блокировку записи и сколько раз повторять транзакцию
+storage.configure_locking(SQLITE_BUSY_TIMEOUT_MS, SQLITE_LOCK_RETRIES, SQLITE_RETRY_DELAY_MS / 1000,
+                          SQLITE_RETRY_BUDGET)
 
-def main_menu(user_id):
-    kb = types.InlineKeyboardMarkup()
+# Записи обработчиков коммитятся пачками в одном потоке: меньше синхронизаций журнала и
+# ожидания блокировки записи, особенно пока базой пользуется Desktop-панель
+writer = storage.get_writer()
+if writer is None and DB_WRITE_MODE == "batch":
+    writer = WriteCoalescer(DB_WRITE_WINDOW_MS / 1000, DB_WRITE_MAX_BATCH).start()
+    storage.set_writer(writer)
 
-    my_tasks = types.InlineKeyboardButton("📋 Мои задачи", callback_data="my_tasks")
-    add_task = types.InlineKeyboardButton("➕ Добавить задачу", callback_data="add_task")
+# Снимки базы по расписанию: backup API небольшими шагами, обработчики не ждут копирования целиком
+backups = None
+if BACKUP_INTERVAL_HOURS > 0:
+    backups = BackupScheduler(BACKUP_DIR, BACKUP_INTERVAL_HOURS * 3600, BACKUP_KEEP,
+                              BACKUP_STEP_PAGES, BACKUP_STEP_PAUSE_MS / 1000)
 
-    kb.add(my_tasks)
-    kb.add(add_task)
+# Журнал изменений для Desktop-панели не должен расти бесконечно: старые записи удаляются по расписанию
+compactor = None
+if CHANGES_COMPACT_INTERVAL_MINUTES > 0:
+    compactor = ChangeLogCompactor(CHANGES_COMPACT_INTERVAL_MINUTES * 60, CHANGES_RETENTION_HOURS * 3600)
 
-    if is_admin(user_id):
-        admin_panel = types.InlineKeyboardButton("🛠 Админ-панель", callback_data="admin_panel")
-        kb.add(admin_panel)
 
-    if user_id == GENESIS_ADMIN_ID:
-        genesis_btn = types.InlineKeyboardButton("👑 Назначить админа", callback_data="genesis_add_admin")
-        kb.add(genesis_btn)
+def get_user_tasks_by_id(user_id):
+    """Получение задач конкретного пользователя (для админа)"""
+    return get_user_tasks(user_id)
 
-    return kb
 
 @bot.message_handler(commands=["start"])
 def start(msg):
@@ -200,126 +89,245 @@ def start(msg):
 
     ensure_user_exists(user_id, username, first_name, last_name)
 
-    bot.send_message(
+    outbox.send_message(
         msg.chat.id,
         "Добро пожаловать! Выберите действие:",
         reply_markup=main_menu(user_id)
     )
 
+@bot.message_handler(commands=["cachestats"])
+def cache_stats(msg):
+    if not is_admin(msg.from_user.id):
+        outbox.send_message(msg.chat.id, "Нет доступа")
+        return
+    outbox.send_message(msg.chat.id, views.cache_stats_text())
+
+@bot.message_handler(commands=["queuestats"])
+def queue_stats(msg):
+    if not is_admin(msg.from_user.id):
+        outbox.send_message(msg.chat.id, "Нет доступа")
+        return
+    outbox.send_message(msg.chat.id, views.outbox_stats_text(outbox.stats()))
+
+# Профилирование по требованию: /profile [секунд] запускает, повторная /profile останавливает раньше
+
+profiler = SamplingProfiler(PROFILE_INTERVAL, report_dir=PROFILE_DIR)
+
+def send_profile_report(chat_id, report):
+    document = io.BytesIO(report.encode())
+    outbox.send_document(chat_id, document, visible_file_name="profile.txt")
+
+@bot.message_handler(commands=["profile"])
+def profile(msg):
+    if not is_admin(msg.from_user.id):
+        outbox.send_message(msg.chat.id, "Нет доступа")
+        return
+    if profiler.running:
+        # Отчет получает тот, кто остановил профилирование
+        profiler.stop(on_done=lambda report: send_profile_report(msg.chat.id, report))
+        return
+    seconds = views.profile_seconds(msg.text)
+    profiler.start(seconds, on_done=lambda report: send_profile_report(msg.chat.id, report))
+    outbox.send_message(msg.chat.id, f"Профилирование на {seconds} с, отчет придет файлом. /profile — остановить раньше")
+
+@bot.message_handler(commands=["stats"])
+def user_stats(msg):
+    outbox.send_message(msg.chat.id, views.stats_text(msg.from_user.id))
+
+# Разбор нажатий: одна проверка callback_data и поиск обработчика в словаре
+
+def reject_callback(call):
+    outbox.answer_callback_query(call.id, "Кнопка устарела, откройте меню заново")
+
+router = CallbackRouter(reject_callback)
+
+@bot.callback_query_handler(func=lambda c: True)
+def on_callback(call):
+    try:
+        router.dispatch(call)
+    except sqlite3.OperationalError as e:
+        if not is_locked_error(e):
+            raise
+        # Повторы не помогли: база долго занята другим процессом, действие не выполнено
+        print(f"База занята, действие {call.data} не выполнено: {e}")
+        outbox.answer_callback_query(call.id, views.DB_BUSY_TEXT)
+
 # Добавление задач
 
-user_states = {}  # {user_id: "add_task"}
+# {user_id: "add_task"}; значение None сбрасывает состояние
+user_states = make_state_store(STATE_STORE, ttl=STATE_TTL, max_size=STATE_MAX_SIZE)
 
-@bot.callback_query_handler(func=lambda c: c.data == "add_task")
+@router.route(callbacks.ADD_TASK)
 def add_task_start(call):
     user_states[call.from_user.id] = "add_task"
-    back = types.ReplyKeyboardMarkup(resize_keyboard=True)
-    back.add("⬅ Назад")
-    bot.send_message(call.message.chat.id, "Напишите текст задачи:", reply_markup=back)
+    outbox.send_message(call.message.chat.id, "Напишите текст задачи:", reply_markup=views.back_keyboard())
 
-@bot.message_handler(func=lambda m: user_states.get(m.from_user.id) == "add_task")
 def process_task_text(msg):
-    if msg.text == "⬅ Назад":
+    if msg.text == views.BACK_TEXT:
         user_states[msg.from_user.id] = None
-        bot.send_message(msg.chat.id, "Меню:", reply_markup=types.ReplyKeyboardRemove())
-        bot.send_message(msg.chat.id, "Выберите действие:", reply_markup=main_menu(msg.from_user.id))
+        outbox.send_message(msg.chat.id, "Меню:", reply_markup=types.ReplyKeyboardRemove())
+        outbox.send_message(msg.chat.id, "Выберите действие:", reply_markup=main_menu(msg.from_user.id))
         return
 
-    task_text = msg.text
     user_id = msg.from_user.id
 
-    add_user_task(user_id, task_text)
+    # Несколько строк — несколько задач, записываются одной транзакцией
+    task_texts = views.split_task_lines(msg.text) or [msg.text]
+    storage.add_user_tasks(user_id, task_texts)
     user_states[user_id] = None
 
-    bot.send_message(msg.chat.id, "Задача добавлена!", reply_markup=types.ReplyKeyboardRemove())
-    bot.send_message(msg.chat.id, "Выберите действие:", reply_markup=main_menu(user_id))
+    outbox.send_message(msg.chat.id, views.added_tasks_text(len(task_texts)), reply_markup=types.ReplyKeyboardRemove())
+    outbox.send_message(msg.chat.id, "Выберите действие:", reply_markup=main_menu(user_id))
 
 # Кнопка мои задачи
 
-@bot.callback_query_handler(func=lambda c: c.data == "my_tasks")
-def my_tasks(call):
-    user_id = call.from_user.id
-    tasks = get_user_tasks(user_id)
-
-    kb = types.InlineKeyboardMarkup()
-
-    if not tasks:
-        kb.add(types.InlineKeyboardButton("⬅ Назад", callback_data="back_main"))
-        bot.edit_message_text(
-            "У вас пока нет задач",
-            chat_id=call.message.chat.id,
-            message_id=call.message.id,
-            reply_markup=kb
-        )
-        return
-
-    for task in tasks:
-        status = "✅" if task["done"] else "🔘"
-        task_text = task['text'][:30] + "..." if len(task['text']) > 30 else task['text']
-        btn = types.InlineKeyboardButton(
-            f"{status} {task_text}",
-            callback_data=f"task_{task['id']}"
-        )
-        kb.add(btn)
-
-    kb.add(types.InlineKeyboardButton("⬅ Назад", callback_data="back_main"))
-
-    bot.edit_message_text(
-        "Ваши задачи:",
+def show_tasks_page(call, cursor=None, backwards=False):
+    text, kb = views.tasks_page(call.from_user.id, cursor, backwards)
+    outbox.edit_message_text(
+        text,
         chat_id=call.message.chat.id,
         message_id=call.message.id,
         reply_markup=kb
     )
 
-@bot.callback_query_handler(func=lambda c: c.data.startswith("task_"))
-def task_options(call):
-    task_id = int(call.data.split("_")[1])
-    user_id = call.from_user.id
+@router.route(callbacks.MY_TASKS)
+def my_tasks(call):
+    show_tasks_page(call)
 
-    # Получаем задачу из базы
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute('SELECT task_text, is_done FROM tasks WHERE task_id = ?', (task_id,))
-    task_data = cursor.fetchone()
-    conn.close()
-
-    if not task_data:
-        bot.answer_callback_query(call.id, "Задача не найдена")
-        return
+@router.route(callbacks.TASKS_NEXT)
+def my_tasks_next(call, created_at, task_id):
+    show_tasks_page(call, (created_at, task_id))
 
-    task_text, is_done = task_data
-    task = {"text": task_text, "done": bool(is_done)}
+@router.route(callbacks.TASKS_PREV)
+def my_tasks_prev(call, created_at, task_id):
+    show_tasks_page(call, (created_at, task_id), backwards=True)
 
-    kb = types.InlineKeyboardMarkup()
-    if not task["done"]:
-        kb.add(types.InlineKeyboardButton("✔ Выполнено", callback_data=f"done_{task_id}"))
-    kb.add(types.InlineKeyboardButton("🗑 Удалить", callback_data=f"del_{task_id}"))
-    kb.add(types.InlineKeyboardButton("⬅ Назад", callback_data="my_tasks"))
+@router.route(callbacks.TASK)
+def task_options(call, task_id):
+    # Получаем задачу из базы
+    card = views.task_card(task_id)
+
+    if not card:
+        outbox.answer_callback_query(call.id, "Задача не найдена")
+        return
 
-    bot.edit_message_text(
-        f"Задача:\n{task['text']}\nСтатус: {'Выполнено' if task['done'] else 'Не выполнено'}",
+    text, kb = card
+    outbox.edit_message_text(
+        text,
         call.message.chat.id,
         call.message.id,
         reply_markup=kb
     )
 
-@bot.callback_query_handler(func=lambda c: c.data.startswith("done_"))
-def mark_done(call):
-    task_id = int(call.data.split("_")[1])
+@router.route(callbacks.DONE)
+def mark_done(call, task_id):
     update_task_status(task_id, True)
     my_tasks(call)
 
-@bot.callback_query_handler(func=lambda c: c.data.startswith("del_"))
-def delete_task_handler(call):
-    task_id = int(call.data.split("_")[1])
+@router.route(callbacks.DELETE)
+def delete_task_handler(call, task_id):
     delete_task(task_id)
     my_tasks(call)
 
+# Сроки и напоминания
+
+def send_reminder(task):
+    text, kb = views.reminder_message(task)
+    # Напоминания — рассылка: ответы на нажатия пользователей уходят раньше
+    outbox.send_message(task["user_id"], text, priority=BULK, reply_markup=kb)
+
+reminders = ReminderScheduler(send_reminder)
+
+@router.route(callbacks.REMIND)
+def remind_options(call, task_id):
+    page = views.remind_options(task_id, call.from_user.id)
+    if page is None:
+        outbox.answer_callback_query(call.id, "Задача не найдена")
+        return
+    text, kb = page
+    outbox.edit_message_text(text, call.message.chat.id, call.message.id, reply_markup=kb)
+
+@router.route(callbacks.REMIND_SET)
+def remind_set(call, task_id, minutes):
+    remind_at = int(time.time()) + minutes * 60 if minutes else None
+    if not storage.set_task_reminder(task_id, call.from_user.id, remind_at):
+        outbox.answer_callback_query(call.id, "Задача не найдена")
+        return
+    reminders.schedule(remind_at)
+    task_options(call, task_id)
+
+@router.route(callbacks.DUE)
+def due_start(call, task_id):
+    if storage.get_task(task_id, call.from_user.id) is None:
+        outbox.answer_callback_query(call.id, "Задача не найдена")
+        return
+    user_states[call.from_user.id] = views.make_state(views.DUE_DATE, task_id)
+    outbox.send_message(call.message.chat.id, views.due_prompt_text(), reply_markup=views.back_keyboard())
+
+def process_due_date(msg):
+    user_id = msg.from_user.id
+    # Состояние без id задачи осталось от версии, хранившей его в памяти процесса
+    _, task_id = views.parse_state(user_states.get(user_id))
+    if msg.text == views.BACK_TEXT or task_id is None:
+        user_states[user_id] = None
+        outbox.send_message(msg.chat.id, "Отменено", reply_markup=types.ReplyKeyboardRemove())
+        outbox.send_message(msg.chat.id, "Выберите действие:", reply_markup=main_menu(user_id))
+        return
+
+    task_id = int(task_id)
+    due_at = views.parse_due(msg.text)
+    if due_at is None or due_at <= time.time():
+        outbox.send_message(msg.chat.id, "Не удалось разобрать дату или она уже прошла. " + views.due_prompt_text())
+        return
+
+    user_states[user_id] = None
+    if not storage.set_task_due(task_id, user_id, due_at):
+        outbox.send_message(msg.chat.id, "Задача не найдена", reply_markup=types.ReplyKeyboardRemove())
+        outbox.send_message(msg.chat.id, "Выберите действие:", reply_markup=main_menu(user_id))
+        return
+    reminders.schedule(due_at)
+
+    outbox.send_message(msg.chat.id, f"Срок: {views.format_time(due_at)}, в это время придет напоминание.",
+                        reply_markup=types.ReplyKeyboardRemove())
+    card = views.task_card(task_id)
+    if card:
+        text, kb = card
+        outbox.send_message(msg.chat.id, text, reply_markup=kb)
+
+# Поиск по задачам
+
+@router.route(callbacks.SEARCH)
+def search_start(call):
+    user_states[call.from_user.id] = "search"
+    outbox.send_message(call.message.chat.id, "Напишите слова для поиска:", reply_markup=views.back_keyboard())
+
+def process_search(msg):
+    user_id = msg.from_user.id
+    if msg.text == views.BACK_TEXT:
+        user_states[user_id] = None
+        outbox.send_message(msg.chat.id, "Меню:", reply_markup=types.ReplyKeyboardRemove())
+        outbox.send_message(msg.chat.id, "Выберите действие:", reply_markup=main_menu(user_id))
+        return
+
+    user_states[user_id] = views.make_state(views.SEARCH_RESULTS, msg.text)
+    outbox.send_message(msg.chat.id, "Ищу...", reply_markup=types.ReplyKeyboardRemove())
+    text, kb = views.search_page(user_id, msg.text)
+    outbox.send_message(msg.chat.id, text, reply_markup=kb)
+
+@router.route(callbacks.SEARCH_PAGE)
+def search_results_page(call, offset):
+    state, query = views.parse_state(user_states.get(call.from_user.id))
+    if state != views.SEARCH_RESULTS:
+        outbox.answer_callback_query(call.id, "Поиск устарел, начните новый")
+        return
+    text, kb = views.search_page(call.from_user.id, query, offset)
+    outbox.edit_message_text(text, call.message.chat.id, call.message.id, reply_markup=kb)
+
 # Кнопка назад
 
-@bot.callback_query_handler(func=lambda c: c.data == "back_main")
+@router.route(callbacks.BACK_MAIN)
 def back_main(call):
-    bot.edit_message_text(
+    outbox.edit_message_text(
         "Выберите действие:",
         call.message.chat.id,
         call.message.id,
@@ -327,85 +335,100 @@ def back_main(call):
     )
 
 # Админ-панель
-@bot.callback_query_handler(func=lambda c: c.data == "admin_panel")
-def admin_panel(call):
-    user_id = call.from_user.id
-    if not is_admin(user_id):
-        bot.answer_callback_query(call.id, "Нет доступа")
-        return
 
-    kb = types.InlineKeyboardMarkup()
-
-    all_users = get_all_users()
-    
-    if not all_users:
-        kb.add(types.InlineKeyboardButton("⬅ Назад", callback_data="back_main"))
-        bot.edit_message_text(
-            "Нет зарегистрированных пользователей",
-            call.message.chat.id,
-            call.message.id,
-            reply_markup=kb
-        )
+def show_users_page(call, cursor=None, backwards=False):
+    if not is_admin(call.from_user.id):
+        outbox.answer_callback_query(call.id, "Нет доступа")
         return
 
-    for user in all_users:
-        display_name = user['username'] or f"{user['first_name'] or ''} {user['last_name'] or ''}".strip() or f"User {user['id']}"
-        btn_text = f"👤 {display_name}"
-        kb.add(types.InlineKeyboardButton(btn_text, callback_data=f"admin_view_{user['id']}"))
-
-    kb.add(types.InlineKeyboardButton("⬅ Назад", callback_data="back_main"))
-
-    bot.edit_message_text(
-        "Список сотрудников:",
+    text, kb = views.users_page(cursor, backwards)
+    outbox.edit_message_text(
+        text,
         call.message.chat.id,
         call.message.id,
         reply_markup=kb
     )
 
-@bot.callback_query_handler(func=lambda c: c.data.startswith("admin_view_"))
-def admin_view(call):
-    user_id = int(call.data.split("_")[2])
+@router.route(callbacks.ADMIN_PANEL)
+def admin_panel(call):
+    show_users_page(call)
 
-    tasks = get_user_tasks_by_id(user_id)
+@router.route(callbacks.USERS_NEXT)
+def admin_panel_next(call, user_id):
+    show_users_page(call, user_id)
 
-    text = f"Задачи пользователя {user_id}:\n\n"
-    if not tasks:
-        text += "Нет задач."
-    else:
-        for task in tasks:
-            text += f"{'✅' if task['done'] else '🔘'} {task['text']}\n"
+@router.route(callbacks.USERS_PREV)
+def admin_panel_prev(call, user_id):
+    show_users_page(call, user_id, backwards=True)
 
-    kb = types.InlineKeyboardMarkup()
-    kb.add(types.InlineKeyboardButton("⬅ Назад", callback_data="admin_panel"))
+@router.route(callbacks.ADMIN_VIEW)
+def admin_view(call, user_id):
+    if not is_admin(call.from_user.id):
+        outbox.answer_callback_query(call.id, "Нет доступа")
+        return
 
-    bot.edit_message_text(
-        text,
-        call.message.chat.id,
-        call.message.id,
-        reply_markup=kb
-    )
+    chat_id = call.message.chat.id
+    kb = views.admin_view_keyboard()
+
+    header = f"Задачи пользователя {user_id}:\n\n"
+    total = storage.count_user_tasks(user_id)
+
+    if total == 0:
+        outbox.edit_message_text(header + "Нет задач.", chat_id, call.message.id, reply_markup=kb)
+        return
+
+    # Большой список отдаем файлом: текст в чате все равно пришлось бы листать десятками сообщений
+    if total > ADMIN_VIEW_DOCUMENT_THRESHOLD:
+        fmt = ADMIN_VIEW_DOCUMENT_FORMAT
+        document = streaming.spool_tasks_document(storage.iter_user_tasks(user_id), fmt)
+        # Файл закрывается, когда очередь его отправит (или откажется от отправки)
+        sent = outbox.send_document(chat_id, document, visible_file_name=f"tasks_{user_id}.{fmt}")
+        sent.add_done_callback(lambda _: document.close())
+        outbox.edit_message_text(
+            f"Задачи пользователя {user_id}: {total} шт., отправлены файлом.",
+            chat_id,
+            call.message.id,
+            reply_markup=kb
+        )
+        return
+
+    lines = (streaming.format_task_line(task) for task in storage.iter_user_tasks(user_id))
+    chunks = streaming.iter_message_chunks(lines, header)
+
+    # Первая часть заменяет текущее сообщение, остальные досылаются; кнопка "Назад" — на последней
+    current = next(chunks)
+    first = True
+    for upcoming in chunks:
+        if first:
+            outbox.edit_message_text(current, chat_id, call.message.id)
+            first = False
+        else:
+            outbox.send_message(chat_id, current)
+        current = upcoming
+
+    if first:
+        outbox.edit_message_text(current, chat_id, call.message.id, reply_markup=kb)
+    else:
+        outbox.send_message(chat_id, current, reply_markup=kb)
 
 # Главный админ
 
-@bot.callback_query_handler(func=lambda c: c.data == "genesis_add_admin")
+@router.route(callbacks.GENESIS_ADD_ADMIN)
 def genesis_add_admin(call):
     if call.from_user.id != GENESIS_ADMIN_ID:
-        bot.answer_callback_query(call.id, "Нет доступа")
+        outbox.answer_callback_query(call.id, "Нет доступа")
         return
 
     user_states[call.from_user.id] = "add_admin"
-    back = types.ReplyKeyboardMarkup(resize_keyboard=True)
-    back.add("⬅ Назад")
-    bot.send_message(call.message.chat.id, "Отправьте ID пользователя, которого хотите сделать админом:", reply_markup=back)
+    outbox.send_message(call.message.chat.id, "Отправьте ID пользователя, которого хотите сделать админом:", reply_markup=views.back_keyboard())
 
-@bot.message_handler(func=lambda m: user_states.get(m.from_user.id) == "add_admin")
 def process_add_admin(msg):
-    if msg.text == "⬅ Назад":
+    if msg.text == views.BACK_TEXT:
         user_states[msg.from_user.id] = None
-        bot.send_message(msg.chat.id, "Отменено", reply_markup=types.ReplyKeyboardRemove())
-        bot.send_message(msg.chat.id, "Выберите действие:", reply_markup=main_menu(msg.from_user.id))
+        outbox.send_message(msg.chat.id, "Отменено", reply_markup=types.ReplyKeyboardRemove())
+        outbox.send_message(msg.chat.id, "Выберите действие:", reply_markup=main_menu(msg.from_user.id))
         return
-        
+
     try:
         new_admin_id = int(msg.text)
         # Создаем запись пользователя если не существует
@@ -413,24 +436,101 @@ def process_add_admin(msg):
         add_admin(new_admin_id, added_by=msg.from_user.id)
 
         user_states[msg.from_user.id] = None
-        bot.send_message(msg.chat.id, f"Пользователь {new_admin_id} назначен админом.", reply_markup=types.ReplyKeyboardRemove())
+        outbox.send_message(msg.chat.id, f"Пользователь {new_admin_id} назначен админом.", reply_markup=types.ReplyKeyboardRemove())
     except ValueError:
-        bot.send_message(msg.chat.id, "Некорректный ID. Введите число.")
+        outbox.send_message(msg.chat.id, "Некорректный ID. Введите число.")
 
 # ОБРАБОТКА НЕИЗВЕСТНЫХ СООБЩЕНИЙ
 
-@bot.message_handler(func=lambda message: True)
 def handle_other_messages(message):
     user_id = message.from_user.id
     ensure_user_exists(user_id, message.from_user.username, message.from_user.first_name, message.from_user.last_name)
-    bot.send_message(message.chat.id, "Используйте меню для навигации", reply_markup=main_menu(user_id))
+    outbox.send_message(message.chat.id, "Используйте меню для навигации", reply_markup=main_menu(user_id))
+
+# Текстовые сообщения: обработчик выбирается по имени состояния пользователя одним поиском в словаре
+state_handlers = {
+    "add_task": process_task_text,
+    "add_admin": process_add_admin,
+    "search": process_search,
+    views.DUE_DATE: process_due_date,
+}
+
+@bot.message_handler(func=lambda message: True)
+def on_message(message):
+    try:
+        state, _ = views.parse_state(user_states.get(message.from_user.id))
+        handler = state_handlers.get(state, handle_other_messages)
+        handler(message)
+    except sqlite3.OperationalError as e:
+        if not is_locked_error(e):
+            raise
+        print(f"База занята, сообщение от {message.from_user.id} не обработано: {e}")
+        outbox.send_message(message.chat.id, views.DB_BUSY_TEXT)
+
+# Метрики: время каждого обработчика и снимки stats() очереди, планировщика и роутера
+
+metrics.instrument_bot(bot, router, state_handlers)
+metrics.REGISTRY.register_collector("outbox", outbox.stats)
+metrics.REGISTRY.register_collector("reminders", reminders.stats)
+metrics.REGISTRY.register_collector("callbacks", router.stats)
+if writer is not None:
+    metrics.REGISTRY.register_collector("db_writer", writer.stats)
+if backups is not None:
+    metrics.REGISTRY.register_collector("backup", backups.stats)
+if compactor is not None:
+    metrics.REGISTRY.register_collector("changes_compact", compactor.stats)
 
 # ---------------------------------------------------------
 # START BOT
 # ---------------------------------------------------------
 
-if __name__ == "__main__":
-    init_db()
-    print("База данных инициализирована")
-    print("Бот запущен...")
-    bot.infinity_polling()
+def make_webhook_server():
+    """Webhook-сервер, обрабатывающий обновления синхронным ботом в своих потоках"""
+    # Очередь webhook уже ограничивает параллелизм, собственный пул TeleBot не нужен
+    bot.threaded = False
+    server = WebhookServer(
+        lambda update: bot.process_new_updates([update]),
+        WEBHOOK_SECRET,
+        host=WEBHOOK_HOST,
+        port=WEBHOOK_PORT,
+        path=WEBHOOK_PATH,
+        workers=WEBHOOK_WORKERS,
+        queue_size=WEBHOOK_QUEUE_SIZE
+    )
+    metrics.REGISTRY.register_collector("webhook", server.stats)
+    return server
+
+
+def run_webhook():
+    server = make_webhook_server()
+    if WEBHOOK_URL:
+        bot.remove_webhook()
+        bot.set_webhook(url=WEBHOOK_URL, secret_token=WEBHOOK_SECRET)
+    host, port = server.address
+    print(f"Webhook слушает http://{host}:{port}{WEBHOOK_PATH}")
+    server.serve_forever()
+
+
+def run(mode="polling"):
+    """Запуск синхронной среды: long polling или webhook"""
+    profiler.install_signal()
+    reminders.start()
+    if backups is not None:
+        backups.start()
+    if compactor is not None:
+        compactor.start()
+    try:
+        if mode == "webhook":
+            run_webhook()
+        else:
+            bot.infinity_polling()
+    finally:
+        # Досылаем то, что обработчики и планировщик успели поставить в очередь
+        reminders.stop()
+        if backups is not None:
+            backups.stop()
+        if compactor is not None:
+            compactor.stop()
+        outbox.stop()
+        if writer is not None:
+            writer.stop()
@@ -0,0 +1,519 @@
+"""Асинхронная среда выполнения бота на AsyncTeleBot
+
+Те же экраны и тот же протокол callback_data, что и в tgbot.py. Обработчики
+не блокируют цикл событий: все обращения к SQLite уходят в ограниченный пул
+потоков, а сообщения ставятся в исходящую очередь (outbox.py), которая
+отправляет их конкурентно из своих потоков с учетом лимитов Telegram.
+
+Запуск: python tgbot.py --runtime async (или BOT_RUNTIME=async в .env)
+"""
+
+import asyncio
+import io
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import telebot
+from telebot import types
+from telebot.async_telebot import AsyncTeleBot
+
+import callbacks
+import metrics
+import storage
+import streaming
+import views
+from callbacks import CallbackRouter
+from config import (BOT_TOKEN, GENESIS_ADMIN_ID, DB_WORKERS, DB_MAX_PENDING,
+                    ADMIN_VIEW_DOCUMENT_THRESHOLD, ADMIN_VIEW_DOCUMENT_FORMAT,
+                    STATE_STORE, STATE_TTL, STATE_MAX_SIZE,
+                    OUTBOX_GLOBAL_RATE, OUTBOX_CHAT_RATE, OUTBOX_CHAT_BURST, OUTBOX_WORKERS, OUTBOX_MAX_RETRIES,
+                    PROFILE_INTERVAL, PROFILE_DIR, DB_WRITE_MODE, DB_WRITE_WINDOW_MS, DB_WRITE_MAX_BATCH,
+                    SQLITE_BUSY_TIMEOUT_MS, SQLITE_LOCK_RETRIES, SQLITE_RETRY_DELAY_MS, SQLITE_RETRY_BUDGET,
+                    BACKUP_DIR, BACKUP_INTERVAL_HOURS, BACKUP_KEEP, BACKUP_STEP_PAGES, BACKUP_STEP_PAUSE_MS,
+                    CHANGES_COMPACT_INTERVAL_MINUTES, CHANGES_RETENTION_HOURS)
+from backup import BackupScheduler
+from compaction import ChangeLogCompactor
+from outbox import BULK, Outbox
+from profiler import SamplingProfiler
+from reminders import ReminderScheduler
+from state_store import make_state_store
+from locking import is_locked_error
+from writer import WriteCoalescer
+
+bot = AsyncTeleBot(BOT_TOKEN)
+
+# Кэш экранов помнит, что показано в сообщениях, только в этом процессе. С общим хранилищем
+# состояний (sqlite) обновления одного чата могут обрабатывать несколько процессов бота, и
+# пропущенная правка оставила бы на экране ответ другого процесса — тогда правки уходят всегда
+render_cache = views.render_cache if STATE_STORE == "memory" else None
+
+# Очередь отправляет вызовы из своих потоков, поэтому ей нужен синхронный клиент Bot API
+outbox = Outbox(telebot.TeleBot(BOT_TOKEN, threaded=False), global_rate=OUTBOX_GLOBAL_RATE,
+                chat_rate=OUTBOX_CHAT_RATE, chat_burst=OUTBOX_CHAT_BURST, workers=OUTBOX_WORKERS,
+                max_retries=OUTBOX_MAX_RETRIES, render_cache=render_cache).start()
+
+# База общая с Desktop-панелью: сколько ждать ее блокировку записи и сколько раз повторять транзакцию
+storage.configure_locking(SQLITE_BUSY_TIMEOUT_MS, SQLITE_LOCK_RETRIES, SQLITE_RETRY_DELAY_MS / 1000,
+                          SQLITE_RETRY_BUDGET)
+
+# Записи обработчиков коммитятся пачками в одном потоке (см. writer.py)
+writer = storage.get_writer()
+if writer is None and DB_WRITE_MODE == "batch":
+    writer = WriteCoalescer(DB_WRITE_WINDOW_MS / 1000, DB_WRITE_MAX_BATCH).start()
+    storage.set_writer(writer)
+
+# Снимки базы по расписанию: backup API небольшими шагами, обработчики не ждут копирования целиком
+backups = None
+if BACKUP_INTERVAL_HOURS > 0:
+    backups = BackupScheduler(BACKUP_DIR, BACKUP_INTERVAL_HOURS * 3600, BACKUP_KEEP,
+                              BACKUP_STEP_PAGES, BACKUP_STEP_PAUSE_MS / 1000)
+
+# Журнал изменений для Desktop-панели не должен расти бесконечно: старые записи удаляются по расписанию
+compactor = None
+if CHANGES_COMPACT_INTERVAL_MINUTES > 0:
+    compactor = ChangeLogCompactor(CHANGES_COMPACT_INTERVAL_MINUTES * 60, CHANGES_RETENTION_HOURS * 3600)
+
+db_executor = ThreadPoolExecutor(max_workers=DB_WORKERS, thread_name_prefix="db")
+_db_slots = None
+
+
+async def run_db(fn, *args, **kwargs):
+    """Вызов функции работы с БД в пуле потоков
+
+    Не больше DB_MAX_PENDING вызовов одновременно ждут пул, остальные
+    обработчики ждут здесь, не разрастая очередь исполнителя.
+    """
+    global _db_slots
+    if _db_slots is None:
+        _db_slots = asyncio.Semaphore(DB_MAX_PENDING)
+    queued = time.perf_counter()
+
+    def call():
+        # Ожидание места и свободного потока — отдельно от времени самого запроса
+        metrics.DB_POOL_WAIT_SECONDS.observe(time.perf_counter() - queued)
+        return fn(*args, **kwargs)
+
+    async with _db_slots:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(db_executor, call)
+
+
+async def run_write(op, *args, **kwargs):
+    """Вызов функции записи storage: ждем commit пачки, не занимая поток пула
+
+    Иначе каждая ожидающая запись держала бы поток пула, и в пачку попадало бы
+    не больше DB_WORKERS записей.
+    """
+    if storage.get_writer() is None:
+        return await run_db(op, *args, **kwargs)
+    return await asyncio.wrap_future(op.submit(*args, **kwargs))
+
+
+@bot.message_handler(commands=["start"])
+async def start(msg):
+    user_id = msg.from_user.id
+    await run_write(storage.ensure_user_exists, user_id, msg.from_user.username,
+                    msg.from_user.first_name, msg.from_user.last_name)
+    outbox.send_message(
+        msg.chat.id,
+        "Добро пожаловать! Выберите действие:",
+        reply_markup=await run_db(views.main_menu, user_id)
+    )
+
+@bot.message_handler(commands=["cachestats"])
+async def cache_stats(msg):
+    if not await run_db(views.is_admin, msg.from_user.id):
+        outbox.send_message(msg.chat.id, "Нет доступа")
+        return
+    outbox.send_message(msg.chat.id, views.cache_stats_text())
+
+@bot.message_handler(commands=["queuestats"])
+async def queue_stats(msg):
+    if not await run_db(views.is_admin, msg.from_user.id):
+        outbox.send_message(msg.chat.id, "Нет доступа")
+        return
+    outbox.send_message(msg.chat.id, views.outbox_stats_text(outbox.stats()))
+
+# Профилирование по требованию: /profile [секунд] запускает, повторная /profile останавливает раньше
+
+profiler = SamplingProfiler(PROFILE_INTERVAL, report_dir=PROFILE_DIR)
+
+def send_profile_report(chat_id, report):
+    document = io.BytesIO(report.encode())
+    outbox.send_document(chat_id, document, visible_file_name="profile.txt")
+
+@bot.message_handler(commands=["profile"])
+async def profile(msg):
+    if not await run_db(views.is_admin, msg.from_user.id):
+        outbox.send_message(msg.chat.id, "Нет доступа")
+        return
+    if profiler.running:
+        # Остановка ждет поток выборки и снимок памяти — не в цикле событий
+        await asyncio.to_thread(profiler.stop, lambda report: send_profile_report(msg.chat.id, report))
+        return
+    seconds = views.profile_seconds(msg.text)
+    profiler.start(seconds, on_done=lambda report: send_profile_report(msg.chat.id, report))
+    outbox.send_message(msg.chat.id, f"Профилирование на {seconds} с, отчет придет файлом. /profile — остановить раньше")
+
+@bot.message_handler(commands=["stats"])
+async def user_stats(msg):
+    outbox.send_message(msg.chat.id, await run_db(views.stats_text, msg.from_user.id))
+
+# Разбор нажатий: одна проверка callback_data и поиск обработчика в словаре
+
+async def reject_callback(call):
+    outbox.answer_callback_query(call.id, "Кнопка устарела, откройте меню заново")
+
+router = CallbackRouter(reject_callback)
+
+@bot.callback_query_handler(func=lambda c: True)
+async def on_callback(call):
+    try:
+        await router.dispatch(call)
+    except sqlite3.OperationalError as e:
+        if not is_locked_error(e):
+            raise
+        # Повторы не помогли: база долго занята другим процессом, действие не выполнено
+        print(f"База занята, действие {call.data} не выполнено: {e}")
+        outbox.answer_callback_query(call.id, views.DB_BUSY_TEXT)
+
+# Добавление задач
+
+# {user_id: "add_task"}; значение None сбрасывает состояние
+user_states = make_state_store(STATE_STORE, ttl=STATE_TTL, max_size=STATE_MAX_SIZE)
+
+@router.route(callbacks.ADD_TASK)
+async def add_task_start(call):
+    user_states[call.from_user.id] = "add_task"
+    outbox.send_message(call.message.chat.id, "Напишите текст задачи:", reply_markup=views.back_keyboard())
+
+async def process_task_text(msg):
+    user_id = msg.from_user.id
+    if msg.text == views.BACK_TEXT:
+        user_states[user_id] = None
+        outbox.send_message(msg.chat.id, "Меню:", reply_markup=types.ReplyKeyboardRemove())
+        outbox.send_message(msg.chat.id, "Выберите действие:", reply_markup=await run_db(views.main_menu, user_id))
+        return
+
+    # Несколько строк — несколько задач, записываются одной транзакцией
+    task_texts = views.split_task_lines(msg.text) or [msg.text]
+    await run_write(storage.add_user_tasks, user_id, task_texts)
+    user_states[user_id] = None
+
+    outbox.send_message(msg.chat.id, views.added_tasks_text(len(task_texts)), reply_markup=types.ReplyKeyboardRemove())
+    outbox.send_message(msg.chat.id, "Выберите действие:", reply_markup=await run_db(views.main_menu, user_id))
+
+# Кнопка мои задачи
+
+async def show_tasks_page(call, cursor=None, backwards=False):
+    text, kb = await run_db(views.tasks_page, call.from_user.id, cursor, backwards)
+    outbox.edit_message_text(text, call.message.chat.id, call.message.id, reply_markup=kb)
+
+@router.route(callbacks.MY_TASKS)
+async def my_tasks(call):
+    await show_tasks_page(call)
+
+@router.route(callbacks.TASKS_NEXT)
+async def my_tasks_next(call, created_at, task_id):
+    await show_tasks_page(call, (created_at, task_id))
+
+@router.route(callbacks.TASKS_PREV)
+async def my_tasks_prev(call, created_at, task_id):
+    await show_tasks_page(call, (created_at, task_id), backwards=True)
+
+@router.route(callbacks.TASK)
+async def task_options(call, task_id):
+    card = await run_db(views.task_card, task_id)
+    if not card:
+        outbox.answer_callback_query(call.id, "Задача не найдена")
+        return
+    text, kb = card
+    outbox.edit_message_text(text, call.message.chat.id, call.message.id, reply_markup=kb)
+
+@router.route(callbacks.DONE)
+async def mark_done(call, task_id):
+    await run_write(storage.update_task_status, task_id, True)
+    await my_tasks(call)
+
+@router.route(callbacks.DELETE)
+async def delete_task_handler(call, task_id):
+    await run_write(storage.delete_task, task_id)
+    await my_tasks(call)
+
+# Сроки и напоминания
+
+def send_reminder(task):
+    # Вызывается из потока планировщика: очередь потокобезопасна, цикл событий не нужен
+    text, kb = views.reminder_message(task)
+    outbox.send_message(task["user_id"], text, priority=BULK, reply_markup=kb)
+
+reminders = ReminderScheduler(send_reminder)
+
+@router.route(callbacks.REMIND)
+async def remind_options(call, task_id):
+    page = await run_db(views.remind_options, task_id, call.from_user.id)
+    if page is None:
+        outbox.answer_callback_query(call.id, "Задача не найдена")
+        return
+    text, kb = page
+    outbox.edit_message_text(text, call.message.chat.id, call.message.id, reply_markup=kb)
+
+@router.route(callbacks.REMIND_SET)
+async def remind_set(call, task_id, minutes):
+    remind_at = int(time.time()) + minutes * 60 if minutes else None
+    if not await run_write(storage.set_task_reminder, task_id, call.from_user.id, remind_at):
+        outbox.answer_callback_query(call.id, "Задача не найдена")
+        return
+    reminders.schedule(remind_at)
+    await task_options(call, task_id)
+
+@router.route(callbacks.DUE)
+async def due_start(call, task_id):
+    if await run_db(storage.get_task, task_id, call.from_user.id) is None:
+        outbox.answer_callback_query(call.id, "Задача не найдена")
+        return
+    user_states[call.from_user.id] = views.make_state(views.DUE_DATE, task_id)
+    outbox.send_message(call.message.chat.id, views.due_prompt_text(), reply_markup=views.back_keyboard())
+
+async def process_due_date(msg):
+    user_id = msg.from_user.id
+    # Состояние без id задачи осталось от версии, хранившей его в памяти процесса
+    _, task_id = views.parse_state(await run_db(user_states.get, user_id))
+    if msg.text == views.BACK_TEXT or task_id is None:
+        user_states[user_id] = None
+        outbox.send_message(msg.chat.id, "Отменено", reply_markup=types.ReplyKeyboardRemove())
+        outbox.send_message(msg.chat.id, "Выберите действие:", reply_markup=await run_db(views.main_menu, user_id))
+        return
+
+    task_id = int(task_id)
+    due_at = views.parse_due(msg.text)
+    if due_at is None or due_at <= time.time():
+        outbox.send_message(msg.chat.id, "Не удалось разобрать дату или она уже прошла. " + views.due_prompt_text())
+        return
+
+    user_states[user_id] = None
+    if not await run_write(storage.set_task_due, task_id, user_id, due_at):
+        outbox.send_message(msg.chat.id, "Задача не найдена", reply_markup=types.ReplyKeyboardRemove())
+        outbox.send_message(msg.chat.id, "Выберите действие:", reply_markup=await run_db(views.main_menu, user_id))
+        return
+    reminders.schedule(due_at)
+
+    outbox.send_message(msg.chat.id, f"Срок: {views.format_time(due_at)}, в это время придет напоминание.",
+                        reply_markup=types.ReplyKeyboardRemove())
+    card = await run_db(views.task_card, task_id)
+    if card:
+        text, kb = card
+        outbox.send_message(msg.chat.id, text, reply_markup=kb)
+
+# Поиск по задачам
+
+@router.route(callbacks.SEARCH)
+async def search_start(call):
+    user_states[call.from_user.id] = "search"
+    outbox.send_message(call.message.chat.id, "Напишите слова для поиска:", reply_markup=views.back_keyboard())
+
+async def process_search(msg):
+    user_id = msg.from_user.id
+    if msg.text == views.BACK_TEXT:
+        user_states[user_id] = None
+        outbox.send_message(msg.chat.id, "Меню:", reply_markup=types.ReplyKeyboardRemove())
+        outbox.send_message(msg.chat.id, "Выберите действие:", reply_markup=await run_db(views.main_menu, user_id))
+        return
+
+    user_states[user_id] = views.make_state(views.SEARCH_RESULTS, msg.text)
+    outbox.send_message(msg.chat.id, "Ищу...", reply_markup=types.ReplyKeyboardRemove())
+    text, kb = await run_db(views.search_page, user_id, msg.text)
+    outbox.send_message(msg.chat.id, text, reply_markup=kb)
+
+@router.route(callbacks.SEARCH_PAGE)
+async def search_results_page(call, offset):
+    state, query = views.parse_state(await run_db(user_states.get, call.from_user.id))
+    if state != views.SEARCH_RESULTS:
+        outbox.answer_callback_query(call.id, "Поиск устарел, начните новый")
+        return
+    text, kb = await run_db(views.search_page, call.from_user.id, query, offset)
+    outbox.edit_message_text(text, call.message.chat.id, call.message.id, reply_markup=kb)
+
+# Кнопка назад
+
+@router.route(callbacks.BACK_MAIN)
+async def back_main(call):
+    outbox.edit_message_text(
+        "Выберите действие:",
+        call.message.chat.id,
+        call.message.id,
+        reply_markup=await run_db(views.main_menu, call.from_user.id)
+    )
+
+# Админ-панель
+
+async def show_users_page(call, cursor=None, backwards=False):
+    if not await run_db(views.is_admin, call.from_user.id):
+        outbox.answer_callback_query(call.id, "Нет доступа")
+        return
+    text, kb = await run_db(views.users_page, cursor, backwards)
+    outbox.edit_message_text(text, call.message.chat.id, call.message.id, reply_markup=kb)
+
+@router.route(callbacks.ADMIN_PANEL)
+async def admin_panel(call):
+    await show_users_page(call)
+
+@router.route(callbacks.USERS_NEXT)
+async def admin_panel_next(call, user_id):
+    await show_users_page(call, user_id)
+
+@router.route(callbacks.USERS_PREV)
+async def admin_panel_prev(call, user_id):
+    await show_users_page(call, user_id, backwards=True)
+
+@router.route(callbacks.ADMIN_VIEW)
+async def admin_view(call, user_id):
+    if not await run_db(views.is_admin, call.from_user.id):
+        outbox.answer_callback_query(call.id, "Нет доступа")
+        return
+
+    chat_id = call.message.chat.id
+
+    kb = views.admin_view_keyboard()
+
+    header = f"Задачи пользователя {user_id}:\n\n"
+    total = await run_db(storage.count_user_tasks, user_id)
+
+    if total == 0:
+        outbox.edit_message_text(header + "Нет задач.", chat_id, call.message.id, reply_markup=kb)
+        return
+
+    if total > ADMIN_VIEW_DOCUMENT_THRESHOLD:
+        fmt = ADMIN_VIEW_DOCUMENT_FORMAT
+        document = await run_db(streaming.spool_tasks_document, storage.iter_user_tasks(user_id), fmt)
+        # Файл закрывается, когда очередь его отправит (или откажется от отправки)
+        sent = outbox.send_document(chat_id, document, visible_file_name=f"tasks_{user_id}.{fmt}")
+        sent.add_done_callback(lambda _: document.close())
+        outbox.edit_message_text(
+            f"Задачи пользователя {user_id}: {total} шт., отправлены файлом.",
+            chat_id,
+            call.message.id,
+            reply_markup=kb
+        )
+        return
+
+    lines = (streaming.format_task_line(task) for task in storage.iter_user_tasks(user_id))
+    chunks = streaming.iter_message_chunks(lines, header)
+
+    # Каждая следующая часть читается из базы в пуле потоков, пока предыдущая уходит в Telegram
+    current = await run_db(next, chunks)
+    first = True
+    while True:
+        upcoming = await run_db(next, chunks, None)
+        if upcoming is None:
+            break
+        if first:
+            outbox.edit_message_text(current, chat_id, call.message.id)
+            first = False
+        else:
+            outbox.send_message(chat_id, current)
+        current = upcoming
+
+    if first:
+        outbox.edit_message_text(current, chat_id, call.message.id, reply_markup=kb)
+    else:
+        outbox.send_message(chat_id, current, reply_markup=kb)
+
+# Главный админ
+
+@router.route(callbacks.GENESIS_ADD_ADMIN)
+async def genesis_add_admin(call):
+    if call.from_user.id != GENESIS_ADMIN_ID:
+        outbox.answer_callback_query(call.id, "Нет доступа")
+        return
+
+    user_states[call.from_user.id] = "add_admin"
+    outbox.send_message(call.message.chat.id, "Отправьте ID пользователя, которого хотите сделать админом:",
+                        reply_markup=views.back_keyboard())
+
+async def process_add_admin(msg):
+    if msg.text == views.BACK_TEXT:
+        user_states[msg.from_user.id] = None
+        outbox.send_message(msg.chat.id, "Отменено", reply_markup=types.ReplyKeyboardRemove())
+        outbox.send_message(msg.chat.id, "Выберите действие:",
+                            reply_markup=await run_db(views.main_menu, msg.from_user.id))
+        return
+
+    try:
+        new_admin_id = int(msg.text)
+    except ValueError:
+        outbox.send_message(msg.chat.id, "Некорректный ID. Введите число.")
+        return
+
+    await run_write(storage.ensure_user_exists, new_admin_id)
+    await run_write(views.add_admin, new_admin_id, added_by=msg.from_user.id)
+
+    user_states[msg.from_user.id] = None
+    outbox.send_message(msg.chat.id, f"Пользователь {new_admin_id} назначен админом.",
+                        reply_markup=types.ReplyKeyboardRemove())
+
+# ОБРАБОТКА НЕИЗВЕСТНЫХ СООБЩЕНИЙ
+
+async def handle_other_messages(message):
+    user_id = message.from_user.id
+    await run_write(storage.ensure_user_exists, user_id, message.from_user.username,
+                    message.from_user.first_name, message.from_user.last_name)
+    outbox.send_message(message.chat.id, "Используйте меню для навигации",
+                        reply_markup=await run_db(views.main_menu, user_id))
+
+# Текстовые сообщения: обработчик выбирается по имени состояния пользователя одним поиском в словаре
+state_handlers = {
+    "add_task": process_task_text,
+    "add_admin": process_add_admin,
+    "search": process_search,
+    views.DUE_DATE: process_due_date,
+}
+
+@bot.message_handler(func=lambda message: True)
+async def on_message(message):
+    # Хранилище sqlite может читать из базы, поэтому чтение состояния тоже в пуле потоков
+    try:
+        state, _ = views.parse_state(await run_db(user_states.get, message.from_user.id))
+        handler = state_handlers.get(state, handle_other_messages)
+        await handler(message)
+    except sqlite3.OperationalError as e:
+        if not is_locked_error(e):
+            raise
+        print(f"База занята, сообщение от {message.from_user.id} не обработано: {e}")
+        outbox.send_message(message.chat.id, views.DB_BUSY_TEXT)
+
+# Метрики: время каждого обработчика и снимки stats() очереди, планировщика и роутера
+
+metrics.instrument_bot(bot, router, state_handlers)
+metrics.REGISTRY.register_collector("outbox", outbox.stats)
+metrics.REGISTRY.register_collector("reminders", reminders.stats)
+metrics.REGISTRY.register_collector("callbacks", router.stats)
+if writer is not None:
+    metrics.REGISTRY.register_collector("db_writer", writer.stats)
+if backups is not None:
+    metrics.REGISTRY.register_collector("backup", backups.stats)
+if compactor is not None:
+    metrics.REGISTRY.register_collector("changes_compact", compactor.stats)
+
+
+def run():
+    """Запуск long polling в цикле событий"""
+    profiler.install_signal()
+    reminders.start()
+    if backups is not None:
+        backups.start()
+    if compactor is not None:
+        compactor.start()
+    try:
+        asyncio.run(bot.infinity_polling())
+    finally:
+        reminders.stop()
+        if backups is not None:
+            backups.stop()
+        if compactor is not None:
+            compactor.stop()
+        outbox.stop()
+        db_executor.shutdown(wait=True)
+        if writer is not None:
+            writer.stop()
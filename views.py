@@ -0,0 +1,388 @@
+"""Экраны бота: текст и клавиатуры, общие для sync и async среды выполнения
+
+Функции здесь только читают базу и строят (текст, клавиатура); отправкой
+занимается среда выполнения (tgbot.py или tgbot_async.py).
+"""
+
+import re
+from datetime import datetime, timedelta, timezone
+
+from telebot import types
+
+import callbacks
+import metrics
+import storage
+from cache import Memo, RenderCache, RoleCache
+from config import (GENESIS_ADMIN_ID, TASKS_PAGE_SIZE, USERS_PAGE_SIZE, ROLE_CACHE_TTL,
+                    RENDER_CACHE_SIZE, TIMEZONE_OFFSET)
+
+BACK_TEXT = "⬅ Назад"
+
+role_cache = RoleCache(
+    storage.is_admin,
+    lambda: storage.get_counter("admins"),
+    ttl=ROLE_CACHE_TTL
+)
+
+
+def is_admin(user_id):
+    """Проверка является ли пользователь администратором"""
+    if user_id == GENESIS_ADMIN_ID:
+        return True
+    return role_cache.get(user_id)
+
+
+def add_admin(user_id, added_by=None):
+    """Добавление администратора со сбросом кэша ролей"""
+    storage.add_admin(user_id, added_by)
+    role_cache.invalidate(user_id)
+
+
+def _submit_add_admin(user_id, added_by=None):
+    """add_admin без ожидания: Future, готовый после commit"""
+    future = storage.add_admin.submit(user_id, added_by)
+    # Колбэк выполнится раньше, чем о записи узнает обработчик, ожидающий Future в цикле событий
+    future.add_done_callback(lambda done: role_cache.invalidate(user_id))
+    return future
+
+
+add_admin.submit = _submit_add_admin
+
+
+def get_user_role(user_id):
+    if user_id == GENESIS_ADMIN_ID:
+        return "genesis"
+    return "admin" if is_admin(user_id) else "user"
+
+
+def build_main_menu(role):
+    kb = types.InlineKeyboardMarkup()
+
+    my_tasks = types.InlineKeyboardButton("📋 Мои задачи", callback_data=callbacks.encode(callbacks.MY_TASKS))
+    add_task = types.InlineKeyboardButton("➕ Добавить задачу", callback_data=callbacks.encode(callbacks.ADD_TASK))
+
+    search = types.InlineKeyboardButton("🔍 Поиск", callback_data=callbacks.encode(callbacks.SEARCH))
+
+    kb.add(my_tasks)
+    kb.add(add_task)
+    kb.add(search)
+
+    if role in ("admin", "genesis"):
+        admin_panel = types.InlineKeyboardButton("🛠 Админ-панель", callback_data=callbacks.encode(callbacks.ADMIN_PANEL))
+        kb.add(admin_panel)
+
+    if role == "genesis":
+        genesis_btn = types.InlineKeyboardButton("👑 Назначить админа", callback_data=callbacks.encode(callbacks.GENESIS_ADD_ADMIN))
+        kb.add(genesis_btn)
+
+    return kb
+
+
+# Клавиатура главного меню зависит только от роли, поэтому строится один раз на роль
+main_menus = Memo(build_main_menu)
+
+# Последние отправленные экраны по (chat_id, message_id): повторный показ того же
+# экрана (назад в меню, перерисовка списка) не уходит в Telegram
+render_cache = RenderCache(max_size=RENDER_CACHE_SIZE)
+
+# Счетчики кэшей в /metrics
+metrics.REGISTRY.register_collector("role_cache", role_cache.stats)
+metrics.REGISTRY.register_collector("menu_cache", main_menus.stats)
+metrics.REGISTRY.register_collector("render_cache", render_cache.stats)
+
+
+def main_menu(user_id):
+    return main_menus.get(get_user_role(user_id))
+
+
+# Ответ, когда запись не удалась даже после повторов: база занята другим процессом
+DB_BUSY_TEXT = "База данных занята, повторите действие через несколько секунд"
+
+
+def back_keyboard():
+    """Обычная клавиатура с одной кнопкой "Назад" для текстового ввода"""
+    back = types.ReplyKeyboardMarkup(resize_keyboard=True)
+    back.add(BACK_TEXT)
+    return back
+
+
+def cache_stats_text():
+    roles = role_cache.stats()
+    menus = main_menus.stats()
+    renders = render_cache.stats()
+    return (
+        f"Кэш ролей: попаданий {roles['hits']}, промахов {roles['misses']}, "
+        f"сбросов {roles['invalidations']}, записей {roles['size']}\n"
+        f"Клавиатуры меню: попаданий {menus['hits']}, промахов {menus['misses']}\n"
+        f"Правки без изменений: пропущено {renders['hits']} из {renders['hits'] + renders['misses']} "
+        f"({renders['hit_ratio']:.0%}), сообщений {renders['size']}"
+    )
+
+
+# Длительность профилирования по /profile: по умолчанию и наибольшая
+PROFILE_DEFAULT_SECONDS = 30
+PROFILE_MAX_SECONDS = 600
+
+
+def profile_seconds(text):
+    """Число секунд из "/profile 60" в пределах PROFILE_MAX_SECONDS"""
+    parts = (text or "").split()
+    if len(parts) > 1 and parts[1].isdigit():
+        return max(1, min(int(parts[1]), PROFILE_MAX_SECONDS))
+    return PROFILE_DEFAULT_SECONDS
+
+
+def outbox_stats_text(stats):
+    return (
+        f"Очередь: ответов {stats['interactive']}, рассылок {stats['bulk']}, в полете {stats['in_flight']}\n"
+        f"Отправлено {stats['sent']}, ошибок {stats['failed']}, повторов {stats['retried']} "
+        f"(из них 429: {stats['rate_limited']}), склеено правок {stats['coalesced']}\n"
+        f"Задержка отправки: p50 {stats['p50'] * 1000:.0f} мс, p95 {stats['p95'] * 1000:.0f} мс, "
+        f"макс {stats['max'] * 1000:.0f} мс"
+    )
+
+
+# Мои задачи
+
+def split_task_lines(text):
+    """Каждая непустая строка сообщения — отдельная задача"""
+    return [line.strip() for line in text.splitlines() if line.strip()]
+
+
+def added_tasks_text(count):
+    return "Задача добавлена!" if count == 1 else f"Добавлено задач: {count}"
+
+
+def stats_text(user_id):
+    """Счетчики задач пользователя (одно чтение user_task_stats по ключу)"""
+    stats = storage.get_user_task_stats(user_id)
+    total, done = stats["total"], stats["done"]
+    if total == 0:
+        return "У вас пока нет задач"
+    return (
+        f"Всего задач: {total}\n"
+        f"Выполнено: {done} ({done / total * 100:.0f}%)\n"
+        f"Осталось: {total - done}\n"
+        f"Последнее изменение: {stats['last_activity']} UTC"
+    )
+
+
+def tasks_page(user_id, cursor=None, backwards=False):
+    """Страница "Мои задачи" """
+    page = storage.get_user_tasks_page(user_id, cursor, backwards, limit=TASKS_PAGE_SIZE)
+    tasks = page["tasks"]
+
+    kb = types.InlineKeyboardMarkup()
+
+    if not tasks and cursor is None:
+        kb.add(types.InlineKeyboardButton(BACK_TEXT, callback_data=callbacks.encode(callbacks.BACK_MAIN)))
+        return "У вас пока нет задач", kb
+
+    for task in tasks:
+        status = "✅" if task["done"] else "🔘"
+        task_text = task['text'][:30] + "..." if len(task['text']) > 30 else task['text']
+        btn = types.InlineKeyboardButton(
+            f"{status} {task_text}",
+            callback_data=callbacks.encode(callbacks.TASK, task['id'])
+        )
+        kb.add(btn)
+
+    nav = []
+    if page["prev"]:
+        nav.append(types.InlineKeyboardButton("◀", callback_data=callbacks.encode(callbacks.TASKS_PREV, *page['prev'])))
+    if page["next"]:
+        nav.append(types.InlineKeyboardButton("▶", callback_data=callbacks.encode(callbacks.TASKS_NEXT, *page['next'])))
+    if nav:
+        kb.row(*nav)
+
+    kb.add(types.InlineKeyboardButton(BACK_TEXT, callback_data=callbacks.encode(callbacks.BACK_MAIN)))
+
+    stats = storage.get_user_task_stats(user_id)
+    return f"Ваши задачи (выполнено {stats['done']} из {stats['total']}):", kb
+
+
+# Состояния диалога
+
+# Данные диалога хранятся в самом состоянии строкой "имя:аргумент": общее хранилище user_states
+# отдает их любому процессу бота и после перезапуска вместе с состоянием
+
+
+def make_state(name, arg):
+    return f"{name}:{arg}"
+
+
+def parse_state(state):
+    """(имя, аргумент) состояния диалога; аргумент None, если его нет"""
+    if state is None:
+        return None, None
+    name, sep, arg = state.partition(":")
+    return name, arg if sep else None
+
+
+# Поиск
+
+# Состояние после поиска: в нем запрос для листания результатов (в callback_data — только смещение)
+SEARCH_RESULTS = "search_results"
+
+
+def search_page(user_id, query, offset=0):
+    """Страница результатов поиска"""
+    page = storage.search_user_tasks(user_id, query, offset, limit=TASKS_PAGE_SIZE)
+
+    kb = types.InlineKeyboardMarkup()
+    for task in page["tasks"]:
+        status = "✅" if task["done"] else "🔘"
+        task_text = task['text'][:30] + "..." if len(task['text']) > 30 else task['text']
+        kb.add(types.InlineKeyboardButton(f"{status} {task_text}", callback_data=callbacks.encode(callbacks.TASK, task['id'])))
+
+    nav = []
+    if page["prev"] is not None:
+        nav.append(types.InlineKeyboardButton("◀", callback_data=callbacks.encode(callbacks.SEARCH_PAGE, page['prev'])))
+    if page["next"] is not None:
+        nav.append(types.InlineKeyboardButton("▶", callback_data=callbacks.encode(callbacks.SEARCH_PAGE, page['next'])))
+    if nav:
+        kb.row(*nav)
+
+    kb.add(types.InlineKeyboardButton("🔍 Новый поиск", callback_data=callbacks.encode(callbacks.SEARCH)))
+    kb.add(types.InlineKeyboardButton(BACK_TEXT, callback_data=callbacks.encode(callbacks.BACK_MAIN)))
+
+    if not page["tasks"]:
+        return f"По запросу «{query}» ничего не найдено", kb
+    return f"Результаты поиска «{query}»:", kb
+
+
+def task_card(task_id):
+    """Карточка задачи или None, если задача не найдена"""
+    task = storage.get_task(task_id)
+    if not task:
+        return None
+
+    kb = types.InlineKeyboardMarkup()
+    if not task["done"]:
+        kb.add(types.InlineKeyboardButton("✔ Выполнено", callback_data=callbacks.encode(callbacks.DONE, task_id)))
+        kb.row(
+            types.InlineKeyboardButton("🔔 Напомнить", callback_data=callbacks.encode(callbacks.REMIND, task_id)),
+            types.InlineKeyboardButton("📅 Срок", callback_data=callbacks.encode(callbacks.DUE, task_id))
+        )
+    kb.add(types.InlineKeyboardButton("🗑 Удалить", callback_data=callbacks.encode(callbacks.DELETE, task_id)))
+    kb.add(types.InlineKeyboardButton(BACK_TEXT, callback_data=callbacks.encode(callbacks.MY_TASKS)))
+
+    text = f"Задача:\n{task['text']}\nСтатус: {'Выполнено' if task['done'] else 'Не выполнено'}"
+    if task["due_at"]:
+        text += f"\nСрок: {format_time(task['due_at'])}"
+    if task["remind_at"]:
+        text += f"\nНапоминание: {format_time(task['remind_at'])}"
+    return text, kb
+
+
+# Сроки и напоминания
+
+USER_TIMEZONE = timezone(timedelta(hours=TIMEZONE_OFFSET))
+
+# (через сколько минут, подпись кнопки)
+REMIND_OPTIONS = [(60, "Через час"), (180, "Через 3 часа"), (1440, "Через сутки"), (10080, "Через неделю")]
+
+_DUE_RE = re.compile(r"(\d{1,2})\.(\d{1,2})(?:\.(\d{4}))?(?:\s+(\d{1,2}):(\d{2}))?")
+
+# Ввод срока: в состоянии — id задачи, для которой пользователь его пишет
+DUE_DATE = "due_date"
+
+
+def timezone_label():
+    return "UTC" if not TIMEZONE_OFFSET else f"UTC{TIMEZONE_OFFSET:+g}"
+
+
+def format_time(timestamp):
+    return datetime.fromtimestamp(timestamp, USER_TIMEZONE).strftime("%d.%m.%Y %H:%M")
+
+
+def parse_due(text):
+    """unix-время из "ДД.ММ[.ГГГГ] [ЧЧ:ММ]" в часовом поясе пользователей или None
+
+    Без года — ближайшая такая дата (в этом году или следующем), без времени — 9:00.
+    """
+    match = _DUE_RE.fullmatch(text.strip())
+    if not match:
+        return None
+    day, month, year, hour, minute = match.groups()
+    now = datetime.now(USER_TIMEZONE)
+    for candidate in ([int(year)] if year else [now.year, now.year + 1]):
+        try:
+            due = datetime(candidate, int(month), int(day), int(hour) if hour else 9, int(minute) if minute else 0,
+                           tzinfo=USER_TIMEZONE)
+        except ValueError:
+            continue
+        if year or due > now:
+            return int(due.timestamp())
+    return None
+
+
+def due_prompt_text():
+    return f"Напишите срок в формате ДД.ММ.ГГГГ ЧЧ:ММ ({timezone_label()}); год и время можно не указывать, например 31.12 18:00:"
+
+
+def remind_options(task_id, user_id):
+    """Выбор времени напоминания или None, если у пользователя нет такой задачи"""
+    task = storage.get_task(task_id, user_id)
+    if not task:
+        return None
+
+    kb = types.InlineKeyboardMarkup()
+    for minutes, label in REMIND_OPTIONS:
+        kb.add(types.InlineKeyboardButton(label, callback_data=callbacks.encode(callbacks.REMIND_SET, task_id, minutes)))
+    if task["remind_at"]:
+        kb.add(types.InlineKeyboardButton("🔕 Не напоминать", callback_data=callbacks.encode(callbacks.REMIND_SET, task_id, 0)))
+    kb.add(types.InlineKeyboardButton(BACK_TEXT, callback_data=callbacks.encode(callbacks.TASK, task_id)))
+    return f"Когда напомнить о задаче?\n{task['text']}", kb
+
+
+def reminder_message(task):
+    """Напоминание, которое присылает планировщик"""
+    text = f"🔔 Напоминание:\n{task['text']}"
+    if task["due_at"]:
+        text += f"\nСрок: {format_time(task['due_at'])}"
+    kb = types.InlineKeyboardMarkup()
+    kb.row(
+        types.InlineKeyboardButton("✔ Выполнено", callback_data=callbacks.encode(callbacks.DONE, task["id"])),
+        types.InlineKeyboardButton("📋 Открыть", callback_data=callbacks.encode(callbacks.TASK, task["id"]))
+    )
+    return text, kb
+
+
+# Админ-панель
+
+def user_display_name(user):
+    return user['username'] or f"{user['first_name'] or ''} {user['last_name'] or ''}".strip() or f"User {user['id']}"
+
+
+def users_page(cursor=None, backwards=False):
+    """Страница списка сотрудников"""
+    page = storage.get_users_page(cursor, backwards, limit=USERS_PAGE_SIZE)
+
+    kb = types.InlineKeyboardMarkup()
+
+    if not page["users"] and cursor is None:
+        kb.add(types.InlineKeyboardButton(BACK_TEXT, callback_data=callbacks.encode(callbacks.BACK_MAIN)))
+        return "Нет зарегистрированных пользователей", kb
+
+    for user in page["users"]:
+        btn_text = f"👤 {user_display_name(user)}"
+        kb.add(types.InlineKeyboardButton(btn_text, callback_data=callbacks.encode(callbacks.ADMIN_VIEW, user['id'])))
+
+    nav = []
+    if page["prev"] is not None:
+        nav.append(types.InlineKeyboardButton("◀", callback_data=callbacks.encode(callbacks.USERS_PREV, page['prev'])))
+    if page["next"] is not None:
+        nav.append(types.InlineKeyboardButton("▶", callback_data=callbacks.encode(callbacks.USERS_NEXT, page['next'])))
+    if nav:
+        kb.row(*nav)
+
+    kb.add(types.InlineKeyboardButton(BACK_TEXT, callback_data=callbacks.encode(callbacks.BACK_MAIN)))
+
+    return "Список сотрудников:", kb
+
+
+def admin_view_keyboard():
+    kb = types.InlineKeyboardMarkup()
+    kb.add(types.InlineKeyboardButton(BACK_TEXT, callback_data=callbacks.encode(callbacks.ADMIN_PANEL)))
+    return kb
@@ -0,0 +1,171 @@
+"""Прием обновлений Telegram через webhook вместо long polling
+
+Легковесный HTTP-сервер за обратным прокси: проверяет секретный токен
+(заголовок X-Telegram-Bot-Api-Secret-Token), кладет обновление в ограниченную
+очередь и сразу отвечает 200. Если очередь заполнена, отвечает 503 с
+Retry-After — Telegram повторит доставку позже, а бот не захлебнется.
+
+Обновления одного пользователя всегда попадают в одну и ту же очередь и
+обрабатываются по порядку: иначе текст задачи мог бы обогнать нажатие
+"Добавить задачу".
+"""
+
+import hmac
+import json
+import queue
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from telebot import types
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+# Обновления Telegram маленькие; все, что больше, — мусор или атака
+MAX_BODY_SIZE = 1024 * 1024
+
+
+class WebhookServer:
+    """HTTP-сервер webhook с пулом обработчиков
+
+    process_update(update) вызывается в одном из workers потоков; у каждого
+    потока своя очередь на queue_size // workers обновлений.
+    """
+
+    def __init__(self, process_update, secret_token, host="127.0.0.1", port=8443,
+                 path="/webhook", workers=4, queue_size=100, retry_after=1):
+        self.process_update = process_update
+        self.secret_token = secret_token or ""
+        self.path = path
+        self.retry_after = retry_after
+        self.queues = [queue.Queue(maxsize=max(1, queue_size // workers)) for _ in range(workers)]
+        self.accepted = 0
+        self.rejected = 0
+        self.failed = 0
+        self._stats_lock = threading.Lock()
+        self._workers = [
+            threading.Thread(target=self._work, args=(updates,), name=f"webhook-worker-{n}", daemon=True)
+            for n, updates in enumerate(self.queues)
+        ]
+        self._server = ThreadingHTTPServer((host, port), self._make_handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def address(self):
+        return self._server.server_address[:2]
+
+    def start(self):
+        """Запуск в фоновых потоках"""
+        for worker in self._workers:
+            worker.start()
+        self._thread = threading.Thread(target=self._server.serve_forever, name="webhook-http", daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self):
+        for worker in self._workers:
+            worker.start()
+        try:
+            self._server.serve_forever()
+        finally:
+            self.stop()
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        for updates in self.queues:
+            updates.put(None)
+        for worker in self._workers:
+            if worker.is_alive():
+                worker.join(timeout=5)
+
+    def stats(self):
+        with self._stats_lock:
+            return {"accepted": self.accepted, "rejected": self.rejected,
+                    "failed": self.failed, "queued": sum(updates.qsize() for updates in self.queues)}
+
+    def _count(self, name):
+        with self._stats_lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def join(self):
+        """Ожидание обработки всех принятых обновлений"""
+        for updates in self.queues:
+            updates.join()
+
+    def queue_for(self, update):
+        """Очередь обновления: по отправителю, а для обновлений без него — по update_id"""
+        key = update.update_id
+        for kind in ("message", "edited_message", "callback_query", "inline_query"):
+            event = getattr(update, kind, None)
+            if event is not None and event.from_user is not None:
+                key = event.from_user.id
+                break
+        return self.queues[key % len(self.queues)]
+
+    def _work(self, updates):
+        while True:
+            update = updates.get()
+            if update is None:
+                updates.task_done()
+                return
+            try:
+                self.process_update(update)
+            except Exception as e:
+                self._count("failed")
+                print(f"Ошибка обработки обновления {update.update_id}: {e}")
+            finally:
+                updates.task_done()
+
+    def _check_secret(self, value):
+        return hmac.compare_digest((value or "").encode(), self.secret_token.encode())
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _reply(self, status, headers=None):
+                self.send_response(status)
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+            def do_POST(self):
+                if self.path != server.path:
+                    self._reply(404)
+                    return
+                if not server._check_secret(self.headers.get(SECRET_HEADER)):
+                    self._reply(403)
+                    return
+
+                try:
+                    length = int(self.headers.get("Content-Length") or 0)
+                except ValueError:
+                    # Нечисловой заголовок: ответ 400, а не оборванное исключением соединение
+                    self._reply(400)
+                    return
+                if length <= 0 or length > MAX_BODY_SIZE:
+                    self._reply(413 if length > 0 else 400)
+                    return
+
+                try:
+                    update = types.Update.de_json(json.loads(self.rfile.read(length)))
+                except (ValueError, KeyError, TypeError):
+                    self._reply(400)
+                    return
+
+                try:
+                    server.queue_for(update).put_nowait(update)
+                except queue.Full:
+                    server._count("rejected")
+                    self._reply(503, {"Retry-After": str(server.retry_after)})
+                    return
+
+                server._count("accepted")
+                self._reply(200)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
@@ -0,0 +1,142 @@
+"""Групповая запись в SQLite одним потоком
+
+Каждая запись бота раньше была отдельной транзакцией с commit, а в пике это
+сотни синхронизаций журнала в секунду и постоянная борьба за блокировку записи
+с Desktop-панелью. WriteCoalescer выполняет записи в одной транзакции своего
+потока пачками до max_batch: в пачку попадает все, что накопилось, пока шла
+предыдущая транзакция, и еще window секунд после первой записи. Пачки
+складываются сами собой: чем дольше commit, тем больше следующая пачка, поэтому
+по умолчанию окно нулевое и одиночная запись не ждет зря. Окно в несколько
+миллисекунд имеет смысл, если fsync очень дорог (synchronous = FULL на медленном диске).
+
+    coalescer = WriteCoalescer().start()
+    future = coalescer.submit(lambda conn: conn.execute(...).lastrowid)
+    task_id = future.result()   # строка уже закоммичена: ее видят все соединения
+
+Каждая запись выполняется под своей точкой сохранения: ошибка одной (например,
+нарушение ограничения) откатывает только ее и попадает в ее Future, остальные
+записи пачки коммитятся. Future завершается только после commit, поэтому тот,
+кто дождался результата, дальше читает уже свои данные.
+"""
+
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+import storage
+
+
+class WriteCoalescer:
+    """Поток, выполняющий fn(conn) пачками в общих транзакциях"""
+
+    def __init__(self, window=0.0, max_batch=500, clock=time.monotonic):
+        self.window = window
+        self.max_batch = max_batch
+        self.clock = clock
+        self.submitted = 0
+        self.committed = 0
+        self.failed = 0
+        self.batches = 0
+        self.largest_batch = 0
+        self._pending = deque()
+        self._cond = threading.Condition()
+        self._stopped = False
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="db-writer", daemon=True)
+        self._thread.start()
+        return self
+
+    def submit(self, fn):
+        """Постановка записи fn(conn) в очередь; Future получит ее результат после commit"""
+        future = Future()
+        with self._cond:
+            if self._stopped:
+                raise RuntimeError("Поток записи остановлен")
+            self._pending.append((fn, future))
+            self.submitted += 1
+            self._cond.notify_all()
+        return future
+
+    def _next_batch(self):
+        """Следующая пачка: первая запись и все, что придет за window секунд после нее"""
+        with self._cond:
+            while not self._pending:
+                if self._stopped:
+                    return None
+                self._cond.wait()
+            deadline = self.clock() + self.window
+            while len(self._pending) < self.max_batch and not self._stopped:
+                remaining = deadline - self.clock()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            count = min(len(self._pending), self.max_batch)
+            return [self._pending.popleft() for _ in range(count)]
+
+    @staticmethod
+    def _apply(conn, batch):
+        results = []
+        for fn, future in batch:
+            conn.execute("SAVEPOINT write")
+            try:
+                results.append((future, fn(conn), None))
+                conn.execute("RELEASE write")
+            except Exception as e:
+                if not conn.in_transaction:
+                    # SQLite уже откатил всю транзакцию (диск, память) — пачка не запишется
+                    raise
+                conn.execute("ROLLBACK TO write")
+                conn.execute("RELEASE write")
+                results.append((future, None, e))
+        return results
+
+    def _write(self, batch):
+        try:
+            # BEGIN IMMEDIATE и повторы при занятой базе — как у любой записи через storage
+            results = storage.run_transaction(self._apply, batch)
+        except Exception as e:
+            with self._cond:
+                self.failed += len(batch)
+            for _, future in batch:
+                future.set_exception(e)
+            return
+
+        with self._cond:
+            self.batches += 1
+            self.largest_batch = max(self.largest_batch, len(batch))
+            for _, _, error in results:
+                if error is None:
+                    self.committed += 1
+                else:
+                    self.failed += 1
+        for future, result, error in results:
+            if error is None:
+                future.set_result(result)
+            else:
+                future.set_exception(error)
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                storage.close_connection()
+                return
+            self._write(batch)
+
+    def stats(self):
+        with self._cond:
+            return {"submitted": self.submitted, "committed": self.committed, "failed": self.failed,
+                    "batches": self.batches, "largest_batch": self.largest_batch,
+                    "avg_batch": (self.committed + self.failed) / self.batches if self.batches else 0.0,
+                    "pending": len(self._pending)}
+
+    def stop(self, timeout=5.0):
+        """Остановка после записи всего, что уже поставлено в очередь"""
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)